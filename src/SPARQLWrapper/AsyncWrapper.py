@@ -0,0 +1,688 @@
+# -*- coding: utf-8 -*-
+
+"""
+Non-blocking counterparts of L{SPARQLWrapper<SPARQLWrapper.Wrapper.SPARQLWrapper>} and
+L{SPARQLWrapper2<SPARQLWrapper.SmartWrapper.SPARQLWrapper2>} for C{asyncio} event loops.
+
+The query is set up exactly as with the blocking classes (L{setQuery<SPARQLWrapper.Wrapper.SPARQLWrapper.setQuery>},
+L{setReturnFormat<SPARQLWrapper.Wrapper.SPARQLWrapper.setReturnFormat>},
+L{addCustomParameter<SPARQLWrapper.Wrapper.SPARQLWrapper.addCustomParameter>}, etc), but L{AsyncSPARQLWrapper.query}
+and L{AsyncSPARQLWrapper.queryAndConvert} return C{asyncio} futures instead of blocking the calling thread, so
+many queries can be in flight from a single event loop::
+
+ sparql = AsyncSPARQLWrapper("http://localhost:2020/sparql", returnFormat=JSON)
+ sparql.setQuery(queryString)
+ result = await sparql.queryAndConvert()
+
+The request is taken from the instance when L{AsyncSPARQLWrapper.query} is called: the instance can be set up
+for the next query right away, without waiting for the previous one to complete.
+
+The module requires C{asyncio} (ie, Python 3.4 or later); it can be imported without it, but the classes cannot
+be instantiated. Proxies and digest authentication are not supported.
+
+@authors: U{Ivan Herman<http://www.ivan-herman.net>}, U{Sergio Fernández<http://www.wikier.org>}, U{Carlos Tejo Alonso<http://www.dayures.net>}
+@organization: U{World Wide Web Consortium<http://www.w3.org>} and U{Foundation CTIC<http://www.fundacionctic.org/>}.
+@license: U{W3C® SOFTWARE NOTICE AND LICENSE<href="http://www.w3.org/Consortium/Legal/copyright-software">}
+"""
+
+import io
+import time
+import urllib2
+import urlparse
+try:
+    from urllib import addinfourl           # Python 2
+except ImportError:
+    from urllib.response import addinfourl  # Python 3
+from Wrapper import SPARQLWrapper, QueryResult, XML, JSON, GET, POST, SELECT
+from SmartWrapper import Bindings
+from KeyCaseInsensitiveDict import KeyCaseInsensitiveDict
+from SPARQLWrapper import __agent__
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+# the reading of the socket is paused when more than this many bytes are waiting to be consumed
+_HIGH_WATER = 256 * 1024
+_LOW_WATER = 64 * 1024
+_MAX_REDIRECTS = 5
+# the number of idle persistent connections kept per host, and for how many seconds, if L{setUseConnectionPool} was
+# not called (the defaults of the L{ConnectionPool<SPARQLWrapper.ConnectionPool.ConnectionPool>})
+_MAX_IDLE = 10
+_IDLE_TIMEOUT = 60.0
+
+def _newFuture(loop) :
+    """Create a future bound to C{loop}."""
+    if hasattr(loop, "create_future") :
+        return loop.create_future()
+    return asyncio.Future(loop=loop)
+
+def _chain(target, value) :
+    """Resolve the future C{target} with C{value}, or with the outcome of C{value} if it is a future itself."""
+    def forward(f) :
+        if target.done() :
+            return
+        if f.cancelled() :
+            target.cancel()
+        elif f.exception() is not None :
+            target.set_exception(f.exception())
+        else :
+            target.set_result(f.result())
+    if isinstance(value, asyncio.Future) :
+        value.add_done_callback(forward)
+    else :
+        target.set_result(value)
+
+def _then(loop, source, callback) :
+    """
+    Chain a callback on a future: the returned future is resolved with C{callback(result)}, or with the
+    exception of C{source} or C{callback}. If the callback returns a future itself, that one is waited for.
+    """
+    target = _newFuture(loop)
+
+    def done(f) :
+        if target.done() :
+            return
+        if f.cancelled() :
+            target.cancel()
+            return
+        if f.exception() is not None :
+            target.set_exception(f.exception())
+            return
+        try :
+            value = callback(f.result())
+        except Exception as e :
+            target.set_exception(e)
+            return
+        _chain(target, value)
+
+    source.add_done_callback(done)
+    return target
+
+def _recover(loop, source, handler) :
+    """
+    Chain an error handler on a future: the returned future is resolved with the result of C{source} or, if it
+    fails, with C{handler(exception)}, or the exception of the handler. If the handler returns a future itself, that
+    one is waited for.
+    """
+    target = _newFuture(loop)
+
+    def done(f) :
+        if target.done() :
+            return
+        if f.cancelled() :
+            target.cancel()
+        elif f.exception() is None :
+            target.set_result(f.result())
+        else :
+            try :
+                value = handler(f.exception())
+            except Exception as e :
+                target.set_exception(e)
+                return
+            _chain(target, value)
+
+    source.add_done_callback(done)
+    return target
+
+#######################################################################################################
+
+class _HTTPResponseReader(object) :
+    """
+    C{asyncio} protocol sending a single HTTP/1.1 request and parsing its response incrementally. The
+    C{headers} future is resolved with the instance as soon as the status line and the headers are in;
+    the body is then consumed via L{read} and L{readline}. Once the response is complete, a persistent
+    connection is handed to the C{release} callback (if any) instead of being closed.
+    """
+    def __init__(self, loop, method, requestBytes, url, release=None) :
+        self._loop = loop
+        self._method = method
+        self._request = requestBytes
+        self._release = release
+        self._keepAlive = False
+        self.url = url
+        self.headersReceived = _newFuture(loop)
+        self.status = None
+        self.reason = None
+        self.headers = {}
+        self._transport = None
+        self._raw = b""
+        self._state = "head"
+        self._remaining = None
+        self._body = bytearray()
+        self._eof = False
+        self._error = None
+        self._paused = False
+        self._waiters = []
+
+    # asyncio protocol interface
+
+    def connection_made(self, transport) :
+        self._transport = transport
+        transport.write(self._request)
+
+    def data_received(self, data) :
+        self._raw += data
+        try :
+            self._parse()
+        except Exception as e :
+            self._fail(e)
+            self._transport.close()
+
+    def eof_received(self) :
+        if self._state == "untilclose" :
+            self._finish()
+        elif self._state != "done" :
+            self._fail(urllib2.URLError("connection closed before the end of the response"))
+        return False
+
+    def connection_lost(self, exc) :
+        if self._state == "untilclose" and exc is None :
+            self._finish()
+        elif self._state != "done" :
+            self._fail(exc or urllib2.URLError("connection closed before the end of the response"))
+
+    def pause_writing(self) :
+        pass
+
+    def resume_writing(self) :
+        pass
+
+    # parsing
+
+    def _parse(self) :
+        while self._raw and self._state != "done" :
+            if self._state == "head" :
+                end = self._raw.find(b"\r\n\r\n")
+                if end < 0 :
+                    return
+                head, self._raw = self._raw[:end].decode("iso-8859-1"), self._raw[end + 4:]
+                self._parseHead(head)
+            elif self._state == "length" :
+                data, self._raw = self._raw[:self._remaining], self._raw[self._remaining:]
+                self._remaining -= len(data)
+                self._feed(data)
+                if self._remaining == 0 :
+                    self._finish()
+            elif self._state == "untilclose" :
+                data, self._raw = self._raw, b""
+                self._feed(data)
+            elif self._state == "chunksize" :
+                end = self._raw.find(b"\r\n")
+                if end < 0 :
+                    return
+                line, self._raw = self._raw[:end], self._raw[end + 2:]
+                self._remaining = int(line.split(b";")[0].strip(), 16)
+                self._state = "chunk" if self._remaining else "trailer"
+            elif self._state == "chunk" :
+                if self._remaining == 0 :
+                    if len(self._raw) < 2 :
+                        return
+                    self._raw = self._raw[2:]
+                    self._state = "chunksize"
+                    continue
+                data, self._raw = self._raw[:self._remaining], self._raw[self._remaining:]
+                self._remaining -= len(data)
+                self._feed(data)
+            elif self._state == "trailer" :
+                end = self._raw.find(b"\r\n")
+                if end < 0 :
+                    return
+                line, self._raw = self._raw[:end], self._raw[end + 2:]
+                if not line :
+                    self._finish()
+
+    def _parseHead(self, head) :
+        lines = head.split("\r\n")
+        version, status, reason = (lines[0].split(" ", 2) + [""])[:3]
+        status = int(status)
+        if 100 <= status < 200 :
+            # interim response, the real one follows
+            return
+        self.status = status
+        self.reason = reason
+        for line in lines[1:] :
+            name, sep, value = line.partition(":")
+            if not sep :
+                continue
+            name, value = name.strip(), value.strip()
+            if name in self.headers :
+                self.headers[name] = self.headers[name] + ", " + value
+            else :
+                self.headers[name] = value
+        lower = dict((k.lower(), v) for k, v in self.headers.items())
+        self._keepAlive = version == "HTTP/1.1" and "close" not in lower.get("connection", "").lower()
+        if self._method == "HEAD" or status in (204, 304) :
+            self._finish()
+        elif "chunked" in lower.get("transfer-encoding", "").lower() :
+            self._state = "chunksize"
+        elif "content-length" in lower :
+            self._remaining = int(lower["content-length"])
+            self._state = "length"
+            if self._remaining == 0 :
+                self._finish()
+        else :
+            self._state = "untilclose"
+            self._keepAlive = False
+        if not self.headersReceived.done() :
+            self.headersReceived.set_result(self)
+
+    def _feed(self, data) :
+        if data :
+            self._body.extend(data)
+            if len(self._body) > _HIGH_WATER and not self._paused :
+                self._paused = True
+                self._transport.pause_reading()
+            self._wakeup()
+
+    def _finish(self) :
+        self._state = "done"
+        self._eof = True
+        if self._transport is not None :
+            transport, self._transport = self._transport, None
+            if self._keepAlive and self._release is not None and not self._raw and not getattr(transport, "is_closing", lambda : True)() :
+                if self._paused :
+                    self._paused = False
+                    transport.resume_reading()
+                self._release(transport)
+            else :
+                transport.close()
+        self._wakeup()
+
+    def _fail(self, exc) :
+        self._state = "done"
+        self._error = exc
+        if not self.headersReceived.done() :
+            self.headersReceived.set_exception(exc)
+        self._wakeup()
+
+    def _wakeup(self) :
+        waiters, self._waiters = self._waiters, []
+        for w in waiters :
+            if not w.done() :
+                w.set_result(None)
+
+    def _wait(self) :
+        if self._paused and len(self._body) < _LOW_WATER and self._transport is not None :
+            self._paused = False
+            self._transport.resume_reading()
+        waiter = _newFuture(self._loop)
+        self._waiters.append(waiter)
+        return waiter
+
+    def _take(self, n) :
+        if n < 0 or n > len(self._body) :
+            n = len(self._body)
+        data = bytes(self._body[:n])
+        del self._body[:n]
+        if self._paused and len(self._body) < _LOW_WATER and self._transport is not None :
+            self._paused = False
+            self._transport.resume_reading()
+        return data
+
+    # consumer interface
+
+    def read(self, n=-1) :
+        """Return a future for (at most) C{n} bytes of the body, or all of it if C{n} is negative."""
+        result = _newFuture(self._loop)
+
+        def attempt(_=None) :
+            if result.done() :
+                return
+            if self._error is not None and not self._body :
+                result.set_exception(self._error)
+            elif self._eof or (n >= 0 and len(self._body) >= n) :
+                result.set_result(self._take(n))
+            else :
+                self._wait().add_done_callback(attempt)
+        attempt()
+        return result
+
+    def readline(self) :
+        """Return a future for the next line of the body; an empty string means the end of the body."""
+        result = _newFuture(self._loop)
+
+        def attempt(_=None) :
+            if result.done() :
+                return
+            end = self._body.find(b"\n")
+            if end >= 0 :
+                result.set_result(self._take(end + 1))
+            elif self._error is not None and not self._body :
+                result.set_exception(self._error)
+            elif self._eof :
+                result.set_result(self._take(-1))
+            else :
+                self._wait().add_done_callback(attempt)
+        attempt()
+        return result
+
+    def close(self) :
+        if self._transport is not None :
+            self._transport.close()
+        if self._state != "done" :
+            self._fail(urllib2.URLError("response closed"))
+
+#######################################################################################################
+
+class AsyncQueryResult(object) :
+    """
+    Non-blocking counterpart of L{QueryResult<SPARQLWrapper.Wrapper.QueryResult>}, returned (via a future) by
+    L{AsyncSPARQLWrapper.query} as soon as the response headers are in. The body is consumed through
+    futures: L{read}, L{readline}, and asynchronous iteration over the lines of the body::
+
+     result = await sparql.query()
+     async for line in result :
+         do_something_with_line(line)
+
+    L{convert} reads the full body and converts it like L{QueryResult.convert<SPARQLWrapper.Wrapper.QueryResult.convert>} does.
+
+    @ivar requestedFormat: the return format requested from the endpoint
+    """
+    def __init__(self, reader, requestedFormat) :
+        self._reader = reader
+        self._loop = reader._loop
+        self.requestedFormat = requestedFormat
+
+    def geturl(self) :
+        """Return the URI of the original call.
+        @return: URI
+        @rtype: string
+        """
+        return self._reader.url
+
+    def info(self) :
+        """Return the meta-information of the HTTP result.
+        @return: meta information
+        @rtype: dictionary
+        """
+        return KeyCaseInsensitiveDict(self._reader.headers)
+
+    def read(self, n=-1) :
+        """Read (at most) C{n} bytes of the body, or all of it.
+        @return: future of the data
+        """
+        return self._reader.read(n)
+
+    def readline(self) :
+        """Read the next line of the body; the empty string means the end of the body.
+        @return: future of the line
+        """
+        return self._reader.readline()
+
+    def close(self) :
+        """Close the connection; the rest of the body is discarded."""
+        self._reader.close()
+
+    def __aiter__(self) :
+        return self
+
+    def __anext__(self) :
+        def check(line) :
+            if not line :
+                raise StopAsyncIteration
+            return line
+        return _then(self._loop, self._reader.readline(), check)
+
+    def toQueryResult(self) :
+        """Read the full body and wrap it into a (blocking) L{QueryResult<SPARQLWrapper.Wrapper.QueryResult>}, eg,
+        to use its conversion methods or the L{Bindings<SPARQLWrapper.SmartWrapper.Bindings>} class.
+        @return: future of the L{QueryResult<SPARQLWrapper.Wrapper.QueryResult>}
+        """
+        def wrap(data) :
+            response = addinfourl(io.BytesIO(data), self._reader.headers, self._reader.url)
+            response.code = self._reader.status
+            return QueryResult((response, self.requestedFormat))
+        return _then(self._loop, self._reader.read(), wrap)
+
+    def convert(self) :
+        """Read the full body and convert it; see L{QueryResult.convert<SPARQLWrapper.Wrapper.QueryResult.convert>}.
+        @return: future of the converted query result
+        """
+        return _then(self._loop, self.toQueryResult(), lambda result : result.convert())
+
+#######################################################################################################
+
+class AsyncSPARQLWrapper(SPARQLWrapper) :
+    """
+    Subclass of L{SPARQLWrapper<SPARQLWrapper.Wrapper.SPARQLWrapper>} executing the queries on an C{asyncio} event loop.
+    L{query} and L{queryAndConvert} return futures, which can be C{await}-ed, instead of blocking.
+
+    The connections are kept open once a response is read to its end, and reused by the next queries to the same
+    host (with Python 3.7 or later); at most C{maxConnections} idle connections are kept per host, for
+    C{idleTimeout} seconds, as set by L{setUseConnectionPool<SPARQLWrapper.Wrapper.SPARQLWrapper.setUseConnectionPool>}
+    (by default, 10 connections for 60 seconds). The requests are sent by a client of this module rather than by C{urllib2}, and
+    only part of the settings of the blocking class apply to them: the query, return format, method, custom
+    parameters, basic authentication, URI length limit and minification, and the choice of the replica by the load
+    balancer. On the other hand, the following settings are I{ignored}:
+     - L{setRetryPolicy<SPARQLWrapper.Wrapper.SPARQLWrapper.setRetryPolicy>} and
+     L{setCircuitBreaker<SPARQLWrapper.Wrapper.SPARQLWrapper.setCircuitBreaker>}: a failed query is not retried, and
+     a stale persistent connection is only replaced for the C{GET} requests;
+     - the failover to another replica, and L{setHedging<SPARQLWrapper.Wrapper.SPARQLWrapper.setHedging>}; the load
+     balancer gets no latency figures either;
+     - L{setTimeout<SPARQLWrapper.Wrapper.SPARQLWrapper.setTimeout>} (but for the timeout parameter sent to the
+     endpoint) and the connection and read timeouts: use C{asyncio.wait_for} instead;
+     - L{setCache<SPARQLWrapper.Wrapper.SPARQLWrapper.setCache>} and
+     L{setCoalescing<SPARQLWrapper.Wrapper.SPARQLWrapper.setCoalescing>};
+     - L{setUseCompression<SPARQLWrapper.Wrapper.SPARQLWrapper.setUseCompression>}: responses are not compressed;
+     - L{setTransport<SPARQLWrapper.Wrapper.SPARQLWrapper.setTransport>}, the other connection pool settings, the
+     keep-alive setting, proxies and digest authentication.
+    """
+    def __init__(self, endpoint, updateEndpoint=None, returnFormat=XML, defaultGraph=None, agent=__agent__, loop=None) :
+        """
+        See L{SPARQLWrapper<SPARQLWrapper.Wrapper.SPARQLWrapper>} for the parameters.
+        @keyword loop: the event loop to run the queries on; by default, the current event loop at the time of the query.
+        @raise ImportError: if C{asyncio} is not available
+        """
+        if asyncio is None :
+            raise ImportError("asyncio is required for %s" % self.__class__.__name__)
+        SPARQLWrapper.__init__(self, endpoint, updateEndpoint, returnFormat, defaultGraph, agent)
+        self._loop = loop
+        # (scheme, host, port) -> list of (asyncio transport, time it was released) of the idle persistent
+        # connections, the most recently used one at the end
+        self._idle = {}
+
+    def _getLoop(self) :
+        if self._loop is not None :
+            return self._loop
+        return asyncio.get_event_loop()
+
+    def close(self) :
+        """Close the idle persistent connections. The instance can still be used afterwards."""
+        idle, self._idle = self._idle, {}
+        for transports in idle.values() :
+            for transport, since in transports :
+                transport.close()
+        SPARQLWrapper.close(self)
+
+    def _idleLimits(self) :
+        """Return the maximum number of idle connections per host, and the number of seconds they are kept."""
+        if self._pool is None :
+            return _MAX_IDLE, _IDLE_TIMEOUT
+        return self._pool.maxConnections, self._pool.idleTimeout
+
+    def _evictExpired(self, transports) :
+        """Close the idle connections of a host not used for more than the idle timeout."""
+        limit = time.time() - self._idleLimits()[1]
+        while transports and transports[0][1] < limit :
+            transports.pop(0)[0].close()
+
+    def _reuse(self, key) :
+        """Return an idle persistent connection to a host, or C{None}."""
+        transports = self._idle.get(key)
+        if transports :
+            self._evictExpired(transports)
+        while transports :
+            transport, since = transports.pop()
+            if not transport.is_closing() :
+                return transport
+        return None
+
+    def _open(self, loop, method, url, headers, data, redirects=0, reuse=True) :
+        """Send a request; return a future of the L{_HTTPResponseReader} once the headers are in."""
+        parts = urlparse.urlsplit(url)
+        secure = parts.scheme == "https"
+        port = parts.port or (443 if secure else 80)
+        path = parts.path or "/"
+        if parts.query :
+            path = path + "?" + parts.query
+
+        lines = ["%s %s HTTP/1.1" % (method, path), "Host: %s" % parts.netloc]
+        for name, value in headers :
+            if name.lower() not in ("host", "connection", "content-length") :
+                lines.append("%s: %s" % (name, value.strip()))
+        if data is not None :
+            lines.append("Content-Length: %d" % len(data))
+        requestBytes = ("\r\n".join(lines) + "\r\n\r\n").encode("iso-8859-1")
+        if data is not None :
+            requestBytes += data
+
+        key = (parts.scheme, parts.hostname, port)
+        def release(transport) :
+            transports = self._idle.setdefault(key, [])
+            self._evictExpired(transports)
+            # with Python 3.6 and earlier, the protocol of a connection cannot be replaced
+            if hasattr(transport, "set_protocol") and len(transports) < self._idleLimits()[0] :
+                transports.append((transport, time.time()))
+            else :
+                transport.close()
+        reader = _HTTPResponseReader(loop, method, requestBytes, url, release)
+        transport = None
+        if reuse :
+            transport = self._reuse(key)
+        if transport is not None :
+            transport.set_protocol(reader)
+            reader.connection_made(transport)
+            connecting = _newFuture(loop)
+            connecting.set_result(None)
+        elif secure :
+            import ssl
+            connecting = loop.create_connection(lambda : reader, parts.hostname, port, ssl=ssl.create_default_context(), server_hostname=parts.hostname)
+        else :
+            connecting = loop.create_connection(lambda : reader, parts.hostname, port)
+        connecting = asyncio.ensure_future(connecting, loop=loop)
+
+        def connected(_) :
+            if transport is not None and method == "GET" :
+                # the server may have closed the connection while it was idle: once more with a new one
+                def retry(error) :
+                    if reader.status is not None :
+                        raise error
+                    return self._open(loop, method, url, headers, data, redirects, False)
+                return _recover(loop, reader.headersReceived, retry)
+            return reader.headersReceived
+
+        def received(reader) :
+            if reader.status in (301, 302, 303, 307, 308) and "Location" in reader.headers and redirects < _MAX_REDIRECTS :
+                reader.close()
+                location = urlparse.urljoin(url, reader.headers["Location"])
+                if reader.status in (307, 308) :
+                    return self._open(loop, method, location, headers, data, redirects + 1)
+                return self._open(loop, "GET", location, [h for h in headers if h[0].lower() != "content-type"], None, redirects + 1)
+            return reader
+
+        return _then(loop, _then(loop, connecting, connected), received)
+
+    def query(self) :
+        """
+            Execute the query, without blocking.
+            Errors are reported through the future, like the exceptions of
+            L{SPARQLWrapper.query<SPARQLWrapper.Wrapper.SPARQLWrapper.query>}.
+
+            @return: future of the query result, resolved as soon as the response headers have been received
+            @rtype: future of an L{AsyncQueryResult} instance
+        """
+        return self._send(self.createQueryRequest())
+
+    def execute(self, request) :
+        """
+            Execute a L{QueryRequest<SPARQLWrapper.Wrapper.QueryRequest>}, without blocking; see L{query}.
+
+            @param request: the request to execute
+            @type request: L{QueryRequest<SPARQLWrapper.Wrapper.QueryRequest>}
+            @return: future of the query result
+            @rtype: future of an L{AsyncQueryResult} instance
+        """
+        return self._send(request)
+
+    def _send(self, request) :
+        """Send a request; return a future of the L{AsyncQueryResult}."""
+        loop = self._getLoop()
+        httpRequest = self._createRequest(request, self._chooseEndpoint(request))
+        opened = self._open(loop, httpRequest.get_method(), httpRequest.get_full_url(), httpRequest.header_items(), httpRequest.data)
+
+        def check(reader) :
+            if reader.status >= 400 :
+                def fail(body) :
+                    error = urllib2.HTTPError(reader.url, reader.status, reader.reason, reader.headers, io.BytesIO(body))
+                    self._handleHTTPError(error)
+                return _then(loop, reader.read(), fail)
+            return AsyncQueryResult(reader, request.returnFormat)
+
+        return _then(loop, opened, check)
+
+    def queryAndConvert(self) :
+        """Macro like method: issue a query and return the converted results.
+        @return: future of the converted query result. See the conversion methods of L{QueryResult<SPARQLWrapper.Wrapper.QueryResult>} for more details.
+        """
+        return _then(self._getLoop(), self.query(), lambda result : result.convert())
+
+class AsyncSPARQLWrapper2(AsyncSPARQLWrapper) :
+    """Non-blocking counterpart of L{SPARQLWrapper2<SPARQLWrapper.SmartWrapper.SPARQLWrapper2>}: works with a JSON return
+    result only, and the result of a SELECT query is a L{Bindings<SPARQLWrapper.SmartWrapper.Bindings>} instance."""
+    def __init__(self, baseURI, defaultGraph=None, loop=None) :
+        """
+        @param baseURI: string of the SPARQL endpoint's URI
+        @type baseURI: string
+        @keyword defaultGraph: URI for the default graph. Default is None, can be set via an explicit call, too
+        @type defaultGraph: string
+        @keyword loop: the event loop to run the queries on; by default, the current event loop at the time of the query.
+        """
+        AsyncSPARQLWrapper.__init__(self, baseURI, returnFormat=JSON, defaultGraph=defaultGraph, loop=loop)
+
+    def setReturnFormat(self, format) :
+        """This method does nothing; this class instance should work with JSON only.
+        @param format: return format
+        """
+        pass
+
+    def query(self) :
+        """
+            Execute the query, without blocking, and do an automatic conversion.
+
+            If the query type is I{not} SELECT, the method falls back to the
+            L{corresponding method in the superclass<AsyncSPARQLWrapper.query>}.
+
+            @return: future of the query result
+            @rtype: future of a L{Bindings<SPARQLWrapper.SmartWrapper.Bindings>} instance
+        """
+        return self.execute(self.createQueryRequest())
+
+    def execute(self, request) :
+        """
+            Execute a L{QueryRequest<SPARQLWrapper.Wrapper.QueryRequest>}, without blocking, and do an automatic conversion; see L{query}.
+
+            @param request: the request to execute
+            @type request: L{QueryRequest<SPARQLWrapper.Wrapper.QueryRequest>}
+            @return: future of the query result
+        """
+        res = self._send(request)
+        if request.queryType == SELECT :
+            loop = self._getLoop()
+            return _then(loop, res, lambda result : _then(loop, result.toQueryResult(), Bindings))
+        else :
+            return res
+
+    def queryAndConvert(self) :
+        """This is here to override the inherited method; it is equivalent to L{query}.
+
+        If the query type is I{not} SELECT, the method falls back to the
+        L{corresponding method in the superclass<AsyncSPARQLWrapper.queryAndConvert>}.
+
+        @return: future of the converted query result.
+        """
+        if self.queryType == SELECT :
+            return self.query()
+        else :
+            return AsyncSPARQLWrapper.queryAndConvert(self)
@@ -0,0 +1,519 @@
+# -*- coding: utf-8 -*-
+
+"""
+Caches of query results.
+
+A cache stores the raw responses of the queries (body, headers, status), so that a cached result goes through the usual
+L{QueryResult<SPARQLWrapper.Wrapper.QueryResult>} path: it can be read directly or converted to any format. Caches are
+set on a wrapper via L{SPARQLWrapper.setCache<SPARQLWrapper.Wrapper.SPARQLWrapper.setCache>}; a cache can be shared by
+several wrappers (and threads). Only the successful responses of queries are cached, updates never are.
+
+The wrapper gives each query a key made of the endpoint, the normalized (minified) query text, the return format, the
+HTTP method, the custom parameters (eg, the default and named graphs) and the user; a cache maps keys to
+L{CachedResponse} instances. Any object with the C{get} and C{put} methods of L{ResultCache} can be used as a cache.
+
+The time to live of an entry is given by the C{Cache-Control} (C{max-age}, C{no-cache}, C{no-store}) or C{Expires}
+header of the response, if any; otherwise it is the default time to live of the cache (see L{freshness}). Caches
+keeping the expired entries, like L{DiskCache}, also have the C{stale} and C{refresh} methods: if the expired response
+has an C{ETag} or C{Last-Modified} header, the wrapper sends a conditional request (C{If-None-Match},
+C{If-Modified-Since}), and a C{304 Not Modified} answer renews the stored response, without transferring it again.
+
+@authors: U{Ivan Herman<http://www.ivan-herman.net>}, U{Sergio Fernández<http://www.wikier.org>}, U{Carlos Tejo Alonso<http://www.dayures.net>}
+@organization: U{World Wide Web Consortium<http://www.w3.org>} and U{Foundation CTIC<http://www.fundacionctic.org/>}.
+@license: U{W3C® SOFTWARE NOTICE AND LICENSE<href="http://www.w3.org/Consortium/Legal/copyright-software">}
+"""
+
+import io
+import time
+import zlib
+import email
+import email.utils
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+try:
+    from urllib import addinfourl           # Python 2
+except ImportError:
+    from urllib.response import addinfourl  # Python 3
+
+class CachedResponse :
+    """
+    A response, as stored in a cache.
+
+    @ivar body: the body of the response
+    @type body: bytes
+    @ivar headers: the headers, as a list of C{(name, value)} pairs
+    @ivar url: the URL of the response
+    @ivar code: the HTTP status
+    @type code: int
+    @ivar msg: the HTTP reason phrase
+    """
+    def __init__(self, body, headers, url, code=200, msg="OK") :
+        self.body = body
+        self.headers = list(headers)
+        self.url = url
+        self.code = code
+        self.msg = msg
+
+    def size(self) :
+        """The approximate number of bytes of memory used by the response."""
+        return len(self.body) + sum(len(name) + len(value) for name, value in self.headers) + len(self.url)
+
+    def response(self) :
+        """A new response object, as returned by C{urllib2.urlopen}, reading the stored body."""
+        message = email.message_from_string("".join("%s: %s\n" % header for header in self.headers) + "\n")
+        response = addinfourl(io.BytesIO(self.body), message, self.url)
+        response.code = self.code
+        response.msg = self.msg
+        return response
+
+    @classmethod
+    def fromResponse(cls, response, body) :
+        """
+        Create the L{CachedResponse} of a response object.
+        @param response: file-like object as returned by C{urllib2.urlopen}
+        @param body: the body of the response, read already
+        """
+        return cls(body, response.info().items(), response.geturl(), getattr(response, "code", None) or 200, getattr(response, "msg", None) or "OK")
+
+def freshness(headers, default) :
+    """
+    Return the time to live of a response, from its C{Cache-Control} or C{Expires} header.
+    @param headers: the headers of the response (eg, the result of C{info()})
+    @param default: the time to live of a response without such headers, in seconds
+    @return: the time to live, in seconds (0 for a response to be revalidated before any use), or C{None} if the
+    response must not be stored
+    """
+    cacheControl = headers.get("Cache-Control")
+    if cacheControl :
+        directives = dict((part.split("=", 1) + [None])[:2] for part in cacheControl.lower().replace(" ", "").split(","))
+        if "no-store" in directives :
+            return None
+        if "no-cache" in directives :
+            return 0
+        for directive in ("s-maxage", "max-age") :
+            try :
+                return max(0, int(directives[directive].strip('"')))
+            except (KeyError, AttributeError, ValueError) :
+                pass
+    expires = headers.get("Expires")
+    if expires :
+        expires = email.utils.parsedate_tz(expires)
+        if expires is None :
+            # an invalid date means "already expired"
+            return 0
+        date = headers.get("Date") and email.utils.parsedate_tz(headers.get("Date"))
+        now = email.utils.mktime_tz(date) if date else time.time()
+        return max(0, email.utils.mktime_tz(expires) - now)
+    return default
+
+class ResultCache :
+    """
+    In-memory cache of query results, bounded by a number of entries and a number of bytes, the least recently used
+    entries being evicted first; entries also expire after a time to live. The cache is thread safe.
+
+    @ivar maxEntries: the maximum number of entries
+    @type maxEntries: int
+    @ivar maxBytes: the maximum number of bytes of the stored responses; a single response larger than this is not stored
+    @type maxBytes: int
+    @ivar ttl: the default time to live of the entries, in seconds
+    @type ttl: float
+    @ivar hits: number of successful lookups
+    @ivar misses: number of failed lookups (including the lookups of expired entries)
+    @ivar evictions: number of entries evicted to make room for new ones
+    @ivar expirations: number of entries dropped because they expired
+    """
+    def __init__(self, maxEntries=1000, maxBytes=64 * 1024 * 1024, ttl=300.0) :
+        """
+        @param maxEntries: the maximum number of entries
+        @param maxBytes: the maximum number of bytes of the stored responses
+        @param ttl: the default time to live of the entries, in seconds
+        """
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key) :
+        """
+        Return the response stored for a key.
+        @param key: the key of the query
+        @return: the response, or C{None} if there is none (or it expired)
+        @rtype: L{CachedResponse}
+        """
+        self._lock.acquire()
+        try :
+            entry = self._entries.pop(key, None)
+            if entry is None :
+                self.misses += 1
+                return None
+            expires, response = entry
+            if expires <= time.time() :
+                self._bytes -= response.size()
+                self.expirations += 1
+                self.misses += 1
+                return None
+            # most recently used last
+            self._entries[key] = entry
+            self.hits += 1
+            return response
+        finally :
+            self._lock.release()
+
+    def put(self, key, response, ttl=None) :
+        """
+        Store the response of a query.
+        @param key: the key of the query
+        @param response: the response
+        @type response: L{CachedResponse}
+        @param ttl: the time to live of the entry, in seconds; by default, the one of the cache
+        """
+        if ttl is None :
+            ttl = self.ttl
+        size = response.size()
+        if ttl <= 0 or size > self.maxBytes :
+            return
+        self._lock.acquire()
+        try :
+            previous = self._entries.pop(key, None)
+            if previous is not None :
+                self._bytes -= previous[1].size()
+            self._entries[key] = (time.time() + ttl, response)
+            self._bytes += size
+            while len(self._entries) > self.maxEntries or self._bytes > self.maxBytes :
+                evicted, (expires, evictedResponse) = self._entries.popitem(last=False)
+                self._bytes -= evictedResponse.size()
+                self.evictions += 1
+        finally :
+            self._lock.release()
+
+    def clear(self) :
+        """Remove all the entries (the statistics are kept)."""
+        self._lock.acquire()
+        try :
+            self._entries.clear()
+            self._bytes = 0
+        finally :
+            self._lock.release()
+
+    def stats(self) :
+        """
+        Return the statistics of the cache.
+        @return: dictionary with the C{hits}, C{misses}, C{evictions}, C{expirations}, C{entries} and C{bytes} keys
+        @rtype: dict
+        """
+        self._lock.acquire()
+        try :
+            return { "hits" : self.hits, "misses" : self.misses, "evictions" : self.evictions, "expirations" : self.expirations,
+                     "entries" : len(self._entries), "bytes" : self._bytes }
+        finally :
+            self._lock.release()
+
+    def __len__(self) :
+        return len(self._entries)
+
+#######################################################################################################
+
+class DiskCache :
+    """
+    Cache of query results in an SQLite database, which can be shared by several processes. The bodies are stored
+    compressed; the entries are evicted, least recently used first, once their total (compressed) size exceeds
+    C{maxBytes}. Expired entries are kept (until evicted) so that they can be revalidated with a conditional request.
+
+    The statistics are those of the current process.
+
+    @ivar path: the path of the database file
+    @ivar maxBytes: the maximum number of bytes of the stored (compressed) responses
+    @type maxBytes: int
+    @ivar ttl: the default time to live of the entries, in seconds
+    @type ttl: float
+    @ivar hits: number of successful lookups
+    @ivar misses: number of failed lookups (including the lookups of expired entries)
+    @ivar revalidations: number of expired entries renewed by a C{304 Not Modified} response
+    @ivar evictions: number of entries evicted to make room for new ones
+    """
+    def __init__(self, path, maxBytes=256 * 1024 * 1024, ttl=3600.0, compressLevel=6, timeout=30.0) :
+        """
+        @param path: the path of the database file, created if needed
+        @param maxBytes: the maximum number of bytes of the stored (compressed) responses
+        @param ttl: the default time to live of the entries, in seconds
+        @param compressLevel: the C{zlib} compression level of the bodies
+        @param timeout: the number of seconds to wait for a lock held by another process
+        """
+        self.path = path
+        self.maxBytes = maxBytes
+        self.ttl = ttl
+        self.compressLevel = compressLevel
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                  key TEXT PRIMARY KEY, expires REAL, accessed REAL, size INTEGER,
+                                  body BLOB, headers TEXT, url TEXT, code INTEGER, msg TEXT)""")
+        connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        connection.commit()
+
+    def _connection(self) :
+        # sqlite3 connections cannot be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None :
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=self.timeout)
+            try :
+                # readers do not block the writer, and conversely
+                connection.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.DatabaseError :
+                pass
+        return connection
+
+    def _key(self, key) :
+        return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+    def _load(self, key, fresh) :
+        connection = self._connection()
+        now = time.time()
+        row = connection.execute("SELECT expires, body, headers, url, code, msg FROM responses WHERE key = ?", (self._key(key),)).fetchone()
+        if row is None or (fresh and row[0] <= now) :
+            return None
+        expires, body, headers, url, code, msg = row
+        headers = [tuple(line.split(": ", 1)) for line in headers.split("\n") if line]
+        return CachedResponse(zlib.decompress(bytes(body)), headers, url, code, msg)
+
+    def get(self, key) :
+        """
+        Return the response stored for a key, if not expired.
+        @param key: the key of the query
+        @return: the response, or C{None}
+        @rtype: L{CachedResponse}
+        """
+        response = self._load(key, True)
+        if response is None :
+            self.misses += 1
+            return None
+        self.hits += 1
+        connection = self._connection()
+        connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), self._key(key)))
+        connection.commit()
+        return response
+
+    def stale(self, key) :
+        """
+        Return the response stored for a key, even if expired, provided it can be revalidated (ie, it has an C{ETag}
+        or C{Last-Modified} header).
+        @param key: the key of the query
+        @return: the response, or C{None}
+        @rtype: L{CachedResponse}
+        """
+        response = self._load(key, False)
+        if response is None or not [name for name, value in response.headers if name.lower() in ("etag", "last-modified")] :
+            return None
+        return response
+
+    def refresh(self, key, ttl=None) :
+        """
+        Renew an entry, after the endpoint told that it is still valid.
+        @param key: the key of the query
+        @param ttl: the new time to live of the entry, in seconds; by default, the one of the cache
+        """
+        if ttl is None :
+            ttl = self.ttl
+        now = time.time()
+        connection = self._connection()
+        connection.execute("UPDATE responses SET expires = ?, accessed = ? WHERE key = ?", (now + ttl, now, self._key(key)))
+        connection.commit()
+        self.revalidations += 1
+
+    def put(self, key, response, ttl=None) :
+        """
+        Store the response of a query.
+        @param key: the key of the query
+        @param response: the response
+        @type response: L{CachedResponse}
+        @param ttl: the time to live of the entry, in seconds; by default, the one of the cache
+        """
+        if ttl is None :
+            ttl = self.ttl
+        if ttl <= 0 and not [name for name, value in response.headers if name.lower() in ("etag", "last-modified")] :
+            # could never be used
+            return
+        body = zlib.compress(response.body, self.compressLevel)
+        headers = u"\n".join(u"%s: %s" % header for header in response.headers)
+        size = len(body) + len(headers) + len(response.url)
+        if size > self.maxBytes :
+            return
+        now = time.time()
+        connection = self._connection()
+        try :
+            connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               (self._key(key), now + ttl, now, size, sqlite3.Binary(body), headers, response.url, response.code, response.msg))
+            total = connection.execute("SELECT SUM(size) FROM responses").fetchone()[0] or 0
+            while total > self.maxBytes :
+                oldest = connection.execute("SELECT key, size FROM responses ORDER BY accessed LIMIT 100").fetchall()
+                for oldKey, oldSize in oldest :
+                    if total <= self.maxBytes :
+                        break
+                    connection.execute("DELETE FROM responses WHERE key = ?", (oldKey,))
+                    total -= oldSize
+                    self.evictions += 1
+            connection.commit()
+        except :
+            connection.rollback()
+            raise
+
+    def clear(self) :
+        """Remove all the entries (the statistics are kept)."""
+        connection = self._connection()
+        connection.execute("DELETE FROM responses")
+        connection.commit()
+
+    def stats(self) :
+        """
+        Return the statistics of the cache.
+        @return: dictionary with the C{hits}, C{misses}, C{revalidations}, C{evictions}, C{entries} and C{bytes} keys
+        @rtype: dict
+        """
+        entries, size = self._connection().execute("SELECT COUNT(*), SUM(size) FROM responses").fetchone()
+        return { "hits" : self.hits, "misses" : self.misses, "revalidations" : self.revalidations, "evictions" : self.evictions,
+                 "entries" : entries, "bytes" : size or 0 }
+
+    def __len__(self) :
+        return self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+#######################################################################################################
+
+class CachingResponse :
+    """
+    File-like view on a response, keeping a copy of what is read; once the response is read to its end, the copy is
+    passed to a function (typically storing it in a cache). Responses larger than a limit are not kept.
+    """
+    def __init__(self, response, store, maxBytes=None) :
+        """
+        @param response: the response, a file-like object
+        @param store: function called with the whole body, once read
+        @param maxBytes: the largest body kept, or C{None}
+        """
+        self._response = response
+        self._store = store
+        self._maxBytes = maxBytes
+        self._chunks = []
+        self._size = 0
+
+    def _keep(self, data, end=False) :
+        if self._chunks is None :
+            return data
+        if data :
+            self._chunks.append(data)
+            self._size += len(data)
+            if self._maxBytes is not None and self._size > self._maxBytes :
+                self._chunks = None
+                return data
+        if end or not data :
+            body = b"".join(self._chunks)
+            self._chunks = None
+            self._store(body)
+        return data
+
+    def read(self, amt=None) :
+        if amt is None or amt < 0 :
+            return self._keep(self._response.read(), True)
+        return self._keep(self._response.read(amt))
+
+    def readline(self, limit=-1) :
+        return self._keep(self._response.readline(limit))
+
+    def readlines(self, hint=None) :
+        return list(iter(self.readline, b""))
+
+    def __iter__(self) :
+        return iter(self.readline, b"")
+
+    def next(self) :
+        line = self.readline()
+        if not line :
+            raise StopIteration
+        return line
+
+    def fileno(self) :
+        return self._response.fileno()
+
+    def close(self) :
+        # a response closed before its end is not kept
+        self._chunks = None
+        self._response.close()
+
+#######################################################################################################
+
+class SingleFlight :
+    """
+    Coalescing of identical concurrent requests: while a function is computing the value of a key, the other callers
+    asking for the same key wait for its result (or exception) instead of computing it again. Once the computation
+    is over, the key is forgotten: this is not a cache.
+
+    The wrapper uses it (see L{SPARQLWrapper.setCoalescing<SPARQLWrapper.Wrapper.SPARQLWrapper.setCoalescing>}) with
+    the keys of the result caches, and functions returning L{CachedResponse} instances, so that concurrent callers
+    each get their own response object, reading the same bytes.
+
+    @ivar calls: number of computations
+    @ivar shared: number of calls that waited for the computation of another caller
+    """
+    def __init__(self) :
+        self.calls = 0
+        self.shared = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function) :
+        """
+        Return the result of C{function()}, unless another thread is computing it already for the same key, in
+        which case its result is returned (or its exception raised) once available.
+        @param key: the key of the computation
+        @param function: function without arguments
+        @return: the result of the function
+        """
+        self._lock.acquire()
+        try :
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader :
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+            else :
+                self.shared += 1
+        finally :
+            self._lock.release()
+
+        if not leader :
+            flight.done.wait()
+            if flight.error is not None :
+                raise flight.error
+            return flight.result
+        try :
+            flight.result = function()
+        except Exception, e :
+            flight.error = e
+            raise
+        finally :
+            self._lock.acquire()
+            try :
+                del self._flights[key]
+            finally :
+                self._lock.release()
+            flight.done.set()
+        return flight.result
+
+class _Flight :
+    """A computation in progress, for L{SingleFlight}."""
+    def __init__(self) :
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+"""
+Columnar materialization of the results of C{SELECT} queries, for analytics: a column per variable, built from the
+solutions of a L{Streaming<SPARQLWrapper.Streaming>} reader while they are parsed, without a dictionary of
+L{Value<SPARQLWrapper.SmartWrapper.Value>} instances per solution.
+
+While the solutions are read, each column is dictionary encoded: the distinct RDF terms of the variable are kept
+once, and an integer code per solution. Once all the solutions are read, the type of each column is chosen from its
+distinct terms, and only these are converted:
+
+ - integers (C{xsd:integer}, C{xsd:int}...) become an C{int64} NumPy array, or a C{float64} one (with C{NaN}) if the
+ variable is unbound in some solutions;
+ - other numbers (C{xsd:decimal}, C{xsd:double}, C{xsd:float}) become a C{float64} array;
+ - booleans become a C{bool} array, or an C{object} one (with C{None}) if the variable is unbound in some solutions;
+ - dates and date-times become C{datetime64} arrays (in days, or in microseconds, in UTC if there is a time zone),
+ with C{NaT} for unbound values;
+ - all the others (IRIs, strings, blank nodes, mixed types) become a L{DictionaryColumn}, ie, codes and categories
+ (the values of the terms).
+
+Requires U{NumPy<http://www.numpy.org>}; L{dataFrame} requires U{pandas<http://pandas.pydata.org>}.
+
+@authors: U{Ivan Herman<http://www.ivan-herman.net>}, U{Sergio Fernández<http://www.wikier.org>}, U{Carlos Tejo Alonso<http://www.dayures.net>}
+@organization: U{World Wide Web Consortium<http://www.w3.org>} and U{Foundation CTIC<http://www.fundacionctic.org/>}.
+@license: U{W3C® SOFTWARE NOTICE AND LICENSE<href="http://www.w3.org/Consortium/Legal/copyright-software">}
+"""
+
+import re
+import array
+from collections import OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+_XSD = "http://www.w3.org/2001/XMLSchema#"
+
+_INTEGERS = frozenset(_XSD + datatype for datatype in ("integer", "int", "long", "short", "byte", "nonNegativeInteger",
+                      "nonPositiveInteger", "positiveInteger", "negativeInteger", "unsignedLong", "unsignedInt",
+                      "unsignedShort", "unsignedByte"))
+_NUMBERS = _INTEGERS | frozenset(_XSD + datatype for datatype in ("decimal", "double", "float"))
+_BOOLEAN = _XSD + "boolean"
+_DATE = _XSD + "date"
+_DATETIME = _XSD + "dateTime"
+
+class DictionaryColumn :
+    """
+    A dictionary encoded column: the distinct values, and the code of the value of each solution.
+
+    @ivar codes: the index in C{categories} of the value of each solution, C{-1} if the variable is unbound
+    @type codes: C{int32} NumPy array
+    @ivar categories: the distinct values
+    @type categories: list
+    """
+    def __init__(self, codes, categories) :
+        self.codes = codes
+        self.categories = categories
+
+    def __len__(self) :
+        return len(self.codes)
+
+    def __getitem__(self, index) :
+        """The value of a solution, or C{None} if the variable is unbound."""
+        code = self.codes[index]
+        if code < 0 :
+            return None
+        return self.categories[code]
+
+    def __iter__(self) :
+        for code in self.codes :
+            yield self.categories[code] if code >= 0 else None
+
+    def toPandas(self) :
+        """
+        Return the column as a pandas categorical.
+        @rtype: C{pandas.Categorical}
+        @raise ImportError: if pandas is not installed
+        """
+        if pandas is None :
+            raise ImportError("pandas is needed to build a categorical")
+        return pandas.Categorical.from_codes(self.codes, self.categories)
+
+    def __repr__(self) :
+        return "<DictionaryColumn of %d values, %d distinct>" % (len(self.codes), len(self.categories))
+
+def columns(solutions, variables=None) :
+    """
+    Build the columns of results; see the module description for the types of the columns.
+    @param solutions: iterable of the solutions, in the structure of the JSON format (eg, a reader of the
+    L{Streaming<SPARQLWrapper.Streaming>} module)
+    @param variables: the variables, in order; by default, the C{variables} attribute of C{solutions} once read, or
+    the variables in the order they are found
+    @return: the columns, by variable
+    @rtype: C{OrderedDict}
+    @raise ImportError: if NumPy is not installed
+    """
+    if numpy is None :
+        raise ImportError("NumPy is needed to build columns")
+    # per variable: the code of each solution, the values and kinds (type, datatype and language) of the terms, in
+    # the order of their codes, the code of each value (of the first term with that value), and the code of the
+    # other terms with the same value as a previous one
+    codes = {}
+    states = {}
+    # a single tuple per kind
+    allKinds = {}
+    count = 0
+    for solution in solutions :
+        for variable, term in solution.items() :
+            state = states.get(variable)
+            if state is None :
+                # unbound in the previous solutions
+                codes[variable] = array.array("i", [-1]) * count
+                state = states[variable] = (codes[variable], [], [], {}, {})
+            column, values, kinds, byValue, byTerm = state
+            value = term.get("value")
+            kind = (term.get("type"), term.get("datatype"), term.get("xml:lang"))
+            code = byValue.get(value)
+            if code is None :
+                code = byValue[value] = len(values)
+                values.append(value)
+                kinds.append(allKinds.setdefault(kind, kind))
+            elif kinds[code] != kind :
+                # rare: the same value as another term (eg, a literal with another language)
+                code = byTerm.get((value, kind))
+                if code is None :
+                    code = byTerm[(value, kind)] = len(values)
+                    values.append(value)
+                    kinds.append(allKinds.setdefault(kind, kind))
+            column.append(code)
+        count += 1
+        if len(solution) < len(codes) :
+            for column in codes.values() :
+                if len(column) < count :
+                    column.append(-1)
+
+    if variables is None :
+        variables = getattr(solutions, "variables", None) or list(codes)
+    result = OrderedDict()
+    for variable in variables :
+        if variable in codes :
+            column, values, kinds, byValue, byTerm = states[variable]
+            result[variable] = _column(numpy.frombuffer(column, dtype=numpy.int32).copy() if count else numpy.zeros(0, numpy.int32), values, kinds, not byTerm)
+        else :
+            result[variable] = DictionaryColumn(numpy.zeros(count, numpy.int32) - 1, [])
+    return result
+
+def _column(codes, values, kinds, distinct) :
+    """The column of a variable, from the codes of the solutions and the values and kinds of the terms, in the order
+    of their codes (the values being C{distinct}, or not)."""
+    datatypes = set(datatype for kind, datatype, lang in set(kinds))
+    unbound = bool(len(codes)) and codes.min() < 0
+    if len(datatypes) == 1 :
+        datatype = datatypes.pop()
+        try :
+            # the value of index -1 is the one of the unbound variables
+            if datatype in _INTEGERS and not unbound :
+                return numpy.array([int(value) for value in values], numpy.int64)[codes]
+            if datatype in _NUMBERS :
+                return numpy.array([float(value) for value in values] + [numpy.nan], numpy.float64)[codes]
+            if datatype == _BOOLEAN :
+                converted = [value.strip() in ("true", "1") for value in values]
+                if unbound :
+                    return numpy.array(converted + [None], object)[codes]
+                return numpy.array(converted, bool)[codes]
+            if datatype == _DATE :
+                return numpy.array([_date(value) for value in values] + [numpy.datetime64("NaT")], "datetime64[D]")[codes]
+            if datatype == _DATETIME :
+                return numpy.array([_dateTime(value) for value in values] + [numpy.datetime64("NaT")], "datetime64[us]")[codes]
+        except ValueError :
+            # an invalid lexical form: the column is left as strings
+            pass
+    if distinct :
+        return DictionaryColumn(codes, values)
+    categories = []
+    index = {}
+    remap = []
+    for value in values :
+        code = index.get(value)
+        if code is None :
+            code = index[value] = len(categories)
+            categories.append(value)
+        remap.append(code)
+    return DictionaryColumn(numpy.array(remap + [-1], numpy.int32)[codes], categories)
+
+_DATE_LEXICAL = re.compile(r"^\s*(-?\d{4,}-\d\d-\d\d)(?:Z|[+-]\d\d:\d\d)?\s*$")
+_DATETIME_LEXICAL = re.compile(r"^\s*(-?\d{4,}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?)(Z|([+-])(\d\d):(\d\d))?\s*$")
+
+def _date(value) :
+    match = _DATE_LEXICAL.match(value)
+    if match is None :
+        raise ValueError("invalid xsd:date %r" % value)
+    return numpy.datetime64(match.group(1), "D")
+
+def _dateTime(value) :
+    match = _DATETIME_LEXICAL.match(value)
+    if match is None :
+        raise ValueError("invalid xsd:dateTime %r" % value)
+    result = numpy.datetime64(match.group(1), "us")
+    if match.group(3) :
+        # in UTC
+        offset = numpy.timedelta64(int(match.group(4)) * 60 + int(match.group(5)), "m")
+        result = result - offset if match.group(3) == "+" else result + offset
+    return result
+
+def dataFrame(columns) :
+    """
+    Build a pandas data frame from columns (see L{columns}), the L{DictionaryColumn}s becoming categoricals.
+    @param columns: the columns, by variable
+    @rtype: C{pandas.DataFrame}
+    @raise ImportError: if pandas is not installed
+    """
+    if pandas is None :
+        raise ImportError("pandas is needed to build a data frame")
+    return pandas.DataFrame(OrderedDict((variable, column.toPandas() if isinstance(column, DictionaryColumn) else column)
+                                        for variable, column in columns.items()))
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""
+Transparent compression of the HTTP responses of SPARQL endpoints.
+
+The L{HTTPCompressionProcessor} C{urllib2} handler announces the supported content codings (C{gzip}, C{deflate} and,
+if the C{brotli} package is installed, C{br}) in the C{Accept-Encoding} header of the requests, and wraps compressed
+responses into a L{DecompressingResponse}. The latter decompresses the body incrementally, while it is read by the
+converters, so the full compressed and decompressed bodies never have to be in memory at the same time.
+
+@authors: U{Ivan Herman<http://www.ivan-herman.net>}, U{Sergio Fernández<http://www.wikier.org>}, U{Carlos Tejo Alonso<http://www.dayures.net>}
+@organization: U{World Wide Web Consortium<http://www.w3.org>} and U{Foundation CTIC<http://www.fundacionctic.org/>}.
+@license: U{W3C® SOFTWARE NOTICE AND LICENSE<href="http://www.w3.org/Consortium/Legal/copyright-software">}
+"""
+
+import zlib
+import urllib2
+try:
+    from urllib import addinfourl           # Python 2
+except ImportError:
+    from urllib.response import addinfourl  # Python 3
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# size of the compressed blocks read from the network at a time
+_CHUNK_SIZE = 16 * 1024
+
+class _ZlibDecoder :
+    """Incremental decoder for the C{gzip} and C{deflate} content codings."""
+    def __init__(self, encoding) :
+        self._gzip = encoding in ("gzip", "x-gzip")
+        self._first = True
+        self._decompressor = self._new()
+
+    def _new(self) :
+        if self._gzip :
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        return zlib.decompressobj(zlib.MAX_WBITS)
+
+    def decompress(self, data) :
+        if self._first and not self._gzip :
+            # "deflate" should be zlib wrapped, but some servers send a raw deflate stream
+            self._first = False
+            try :
+                return self._decompress(data)
+            except zlib.error :
+                self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        self._first = False
+        return self._decompress(data)
+
+    def _decompress(self, data) :
+        output = [self._decompressor.decompress(data)]
+        # a gzip stream may consist of several members
+        while self._gzip and self._decompressor.unused_data :
+            rest = self._decompressor.unused_data
+            self._decompressor = self._new()
+            output.append(self._decompressor.decompress(rest))
+        return b"".join(output)
+
+    def flush(self) :
+        return self._decompressor.flush()
+
+class _BrotliDecoder :
+    """Incremental decoder for the C{br} content coding."""
+    def __init__(self, encoding) :
+        self._decompressor = brotli.Decompressor()
+
+    def decompress(self, data) :
+        if hasattr(self._decompressor, "process") :
+            return self._decompressor.process(data)
+        return self._decompressor.decompress(data)
+
+    def flush(self) :
+        return b""
+
+_decoders = {"gzip" : _ZlibDecoder, "x-gzip" : _ZlibDecoder, "deflate" : _ZlibDecoder}
+if brotli is not None :
+    _decoders["br"] = _BrotliDecoder
+
+def acceptedEncodings() :
+    """
+    Return the value of the C{Accept-Encoding} header for the content codings that can be decoded.
+    @rtype: string
+    """
+    if brotli is not None :
+        return "gzip, deflate, br"
+    return "gzip, deflate"
+
+#######################################################################################################
+
+class DecompressingResponse :
+    """
+    File-like object decompressing a compressed HTTP response on the fly: each read consumes only as much of
+    the compressed stream as is needed.
+    """
+    def __init__(self, raw, encoding) :
+        """
+        @param raw: the compressed response, a file-like object
+        @param encoding: the content coding of the response (C{gzip}, C{deflate}, C{br})
+        """
+        self._raw = raw
+        self._decoder = _decoders[encoding](encoding)
+        self._buffer = b""
+        self._eof = False
+
+    def _fill(self) :
+        """Decompress the next block of the raw stream into the buffer; return C{False} at the end of the stream."""
+        while not self._eof :
+            data = self._raw.read(_CHUNK_SIZE)
+            if data :
+                output = self._decoder.decompress(data)
+            else :
+                self._eof = True
+                output = self._decoder.flush()
+            if output :
+                self._buffer += output
+                return True
+        return False
+
+    def read(self, amt=None) :
+        if amt is None or amt < 0 :
+            chunks = [self._buffer]
+            self._buffer = b""
+            while self._fill() :
+                chunks.append(self._buffer)
+                self._buffer = b""
+            return b"".join(chunks)
+        while len(self._buffer) < amt and self._fill() :
+            pass
+        data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def readline(self, limit=-1) :
+        while b"\n" not in self._buffer and (limit < 0 or len(self._buffer) < limit) and self._fill() :
+            pass
+        end = self._buffer.find(b"\n") + 1
+        if end == 0 :
+            end = len(self._buffer)
+        if limit >= 0 :
+            end = min(end, limit)
+        data, self._buffer = self._buffer[:end], self._buffer[end:]
+        return data
+
+    def readlines(self, hint=None) :
+        return list(iter(self.readline, b""))
+
+    def __iter__(self) :
+        return iter(self.readline, b"")
+
+    def next(self) :
+        line = self.readline()
+        if not line :
+            raise StopIteration
+        return line
+
+    def fileno(self) :
+        return self._raw.fileno()
+
+    def close(self) :
+        self._buffer = b""
+        self._raw.close()
+
+#######################################################################################################
+
+class HTTPCompressionProcessor(urllib2.BaseHandler) :
+    """
+    C{urllib2} processor negotiating compressed responses. It adds the C{Accept-Encoding} header to the requests
+    (unless already set) and transparently decompresses the responses encoded with a supported content coding. The
+    C{Content-Encoding} and C{Content-Length} headers of a decompressed response are removed, as they do not
+    describe the decompressed body. The requests whose C{compression} attribute is C{False} are left alone, and so
+    are their responses.
+    """
+    def http_request(self, req) :
+        if getattr(req, "compression", True) and not req.has_header("Accept-encoding") :
+            req.add_unredirected_header("Accept-Encoding", acceptedEncodings())
+        return req
+
+    def http_response(self, req, response) :
+        if not getattr(req, "compression", True) :
+            return response
+        headers = response.info()
+        encoding = (headers.get("Content-Encoding") or "").strip().lower()
+        if encoding not in _decoders :
+            return response
+        del headers["Content-Encoding"]
+        del headers["Content-Length"]
+        decompressed = addinfourl(DecompressingResponse(response, encoding), headers, response.geturl())
+        decompressed.code = response.code
+        decompressed.msg = response.msg
+        return decompressed
+
+    https_request = http_request
+    https_response = http_response
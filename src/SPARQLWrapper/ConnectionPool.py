@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+
+"""
+Persistent HTTP connections for L{SPARQLWrapper<SPARQLWrapper.Wrapper.SPARQLWrapper>} instances.
+
+The L{ConnectionPool} keeps a bounded set of open C{httplib} connections per endpoint host, so
+subsequent queries to the same host can skip the TCP (and TLS) handshake. The pool is plugged into
+C{urllib2} via the L{PooledHTTPHandler} and L{PooledHTTPSHandler} handlers, so everything else (redirects,
+error processing, proxies) keeps working as with a plain C{urllib2.urlopen}.
+
+@authors: U{Ivan Herman<http://www.ivan-herman.net>}, U{Sergio Fernández<http://www.wikier.org>}, U{Carlos Tejo Alonso<http://www.dayures.net>}
+@organization: U{World Wide Web Consortium<http://www.w3.org>} and U{Foundation CTIC<http://www.fundacionctic.org/>}.
+@license: U{W3C® SOFTWARE NOTICE AND LICENSE<href="http://www.w3.org/Consortium/Legal/copyright-software">}
+"""
+
+import httplib
+import select
+import socket
+import threading
+import time
+import urllib2
+from Deadline import connect
+try:
+    from urllib import addinfourl           # Python 2
+except ImportError:
+    from urllib.response import addinfourl  # Python 3
+
+# size of the blocks read from the socket when the consumer asks for a line
+_CHUNK_SIZE = 8192
+
+class ConnectionPool :
+    """
+    Thread safe pool of persistent HTTP(S) connections, partitioned by scheme, host and port.
+
+    A connection is handed out by L{acquire} and given back by L{release} once its response has been
+    fully read; a response that is closed before its end is reached cannot be reused, and its
+    connection is simply dropped. Idle connections older than C{idleTimeout} seconds are evicted,
+    and idle connections are checked before reuse, so a connection closed by the server in the
+    meantime is never handed out.
+
+    @ivar maxConnections: maximum number of connections (idle or in use) per host
+    @type maxConnections: int
+    @ivar idleTimeout: number of seconds an unused connection is kept open
+    @type idleTimeout: float
+    @ivar blockTimeout: number of seconds L{acquire} waits for a free connection when C{maxConnections} is reached; C{None} means forever
+    @type blockTimeout: float
+    @ivar healthCheck: whether idle connections are checked for a server side close before they are reused
+    @type healthCheck: boolean
+    """
+    def __init__(self, maxConnections=10, idleTimeout=60.0, blockTimeout=None, healthCheck=True) :
+        """
+        @param maxConnections: maximum number of connections per host
+        @type maxConnections: int
+        @param idleTimeout: number of seconds an unused connection is kept open
+        @type idleTimeout: float
+        @param blockTimeout: number of seconds to wait for a free connection; C{None} means forever
+        @type blockTimeout: float
+        @param healthCheck: whether idle connections are checked before reuse
+        @type healthCheck: boolean
+        """
+        self.maxConnections = maxConnections
+        self.idleTimeout = idleTimeout
+        self.blockTimeout = blockTimeout
+        self.healthCheck = healthCheck
+        self._lock = threading.Condition()
+        # key -> list of (connection, time it was released), the most recently used one at the end
+        self._idle = {}
+        # key -> number of connections handed out
+        self._active = {}
+
+    def acquire(self, key, factory) :
+        """
+        Get a connection for a host, either an idle one or a new one created by C{factory}.
+        @param key: the host key, ie, a C{(scheme, host)} tuple
+        @param factory: callable returning a new, unconnected C{httplib} connection
+        @return: a C{(connection, reused)} tuple, C{reused} being C{True} if the connection was used before
+        @raise urllib2.URLError: if no connection becomes free within L{blockTimeout} seconds
+        """
+        deadline = None
+        if self.blockTimeout is not None :
+            deadline = time.time() + self.blockTimeout
+        self._lock.acquire()
+        try :
+            while True :
+                idle = self._idle.get(key, [])
+                self._evictExpired(idle)
+                while idle :
+                    conn, since = idle.pop()
+                    if self._isUsable(conn) :
+                        self._active[key] = self._active.get(key, 0) + 1
+                        return (conn, True)
+                    conn.close()
+                if self._active.get(key, 0) < self.maxConnections :
+                    self._active[key] = self._active.get(key, 0) + 1
+                    break
+                if deadline is None :
+                    self._lock.wait()
+                else :
+                    remaining = deadline - time.time()
+                    if remaining <= 0 :
+                        raise urllib2.URLError("connection pool for %s is exhausted" % key[1])
+                    self._lock.wait(remaining)
+        finally :
+            self._lock.release()
+        try :
+            return (factory(), False)
+        except :
+            self.release(key, None)
+            raise
+
+    def release(self, key, conn, reusable=True) :
+        """
+        Give a connection back to the pool.
+        @param key: the host key used to L{acquire} the connection
+        @param conn: the connection; C{None} just frees the slot
+        @param reusable: if C{False}, the connection is closed instead of being kept
+        """
+        self._lock.acquire()
+        try :
+            self._active[key] = max(0, self._active.get(key, 0) - 1)
+            if conn is not None :
+                if reusable and conn.sock is not None :
+                    self._idle.setdefault(key, []).append((conn, time.time()))
+                else :
+                    conn.close()
+            # the waiters of all the hosts share the condition: waking a single one may wake one of another host
+            self._lock.notify_all()
+        finally :
+            self._lock.release()
+
+    def close(self) :
+        """Close all idle connections. Connections in use are closed when they are released."""
+        self._lock.acquire()
+        try :
+            for idle in self._idle.values() :
+                for conn, since in idle :
+                    conn.close()
+            self._idle = {}
+        finally :
+            self._lock.release()
+
+    def _evictExpired(self, idle) :
+        """Close the idle connections not used for more than L{idleTimeout} seconds. The lock must be held."""
+        limit = time.time() - self.idleTimeout
+        while idle and idle[0][1] < limit :
+            idle.pop(0)[0].close()
+
+    def _isUsable(self, conn) :
+        """
+        Check whether an idle connection can be reused. A socket that is readable while no request is pending
+        has either been closed by the server or holds garbage; in both cases it should not be reused.
+        """
+        if conn.sock is None :
+            return False
+        if not self.healthCheck :
+            return True
+        try :
+            readable = select.select([conn.sock], [], [], 0)[0]
+        except (select.error, socket.error, ValueError) :
+            return False
+        return not readable
+
+#######################################################################################################
+
+class PooledResponse :
+    """
+    File-like view on a C{httplib} response whose connection belongs to a L{ConnectionPool}. The connection
+    is given back to the pool as soon as the response is read to its end, and dropped if the response is
+    closed earlier.
+    """
+    def __init__(self, pool, key, conn, response, watch=None) :
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self._watch = watch
+        self._buffer = b""
+
+    def _fill(self, amt=None) :
+        """Read a block from the underlying response, releasing the connection once the end is reached."""
+        if self._response is None :
+            return b""
+        try :
+            if amt is None :
+                data = self._response.read()
+            else :
+                data = self._response.read(amt)
+        except :
+            self._finish(False)
+            raise
+        if not data or self._response.isclosed() :
+            self._finish(not self._response.will_close)
+        return data
+
+    def _finish(self, reusable) :
+        """Hand the connection back to the pool; idempotent."""
+        if self._response is not None :
+            response, self._response = self._response, None
+            if not reusable :
+                response.close()
+            if self._watch is not None :
+                # the deadline of the query must not shut the connection down once back in the pool
+                self._watch.cancel()
+            self._pool.release(self._key, self._conn, reusable)
+            self._conn = None
+
+    def read(self, amt=None) :
+        if amt is None or amt < 0 :
+            data = self._buffer + self._fill()
+            self._buffer = b""
+            return data
+        while len(self._buffer) < amt :
+            data = self._fill(amt - len(self._buffer))
+            if not data :
+                break
+            self._buffer += data
+        data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def readline(self, limit=-1) :
+        chunks = [self._buffer]
+        while b"\n" not in chunks[-1] and (limit < 0 or sum(map(len, chunks)) < limit) :
+            data = self._fill(_CHUNK_SIZE)
+            if not data :
+                break
+            chunks.append(data)
+        data = b"".join(chunks)
+        end = data.find(b"\n") + 1
+        if end == 0 :
+            end = len(data)
+        if limit >= 0 :
+            end = min(end, limit)
+        data, self._buffer = data[:end], data[end:]
+        return data
+
+    def readlines(self, hint=None) :
+        return list(iter(self.readline, b""))
+
+    def __iter__(self) :
+        return iter(self.readline, b"")
+
+    def next(self) :
+        line = self.readline()
+        if not line :
+            raise StopIteration
+        return line
+
+    def fileno(self) :
+        if self._conn is not None and self._conn.sock is not None :
+            return self._conn.sock.fileno()
+        return None
+
+    def close(self) :
+        """Close the response. If it was not read to its end, its connection is not reused."""
+        self._buffer = b""
+        self._finish(False)
+
+    def __del__(self) :
+        # a response that is never read nor closed should not keep its pool slot forever
+        self.close()
+
+    def abort(self) :
+        """Forcibly close the underlying socket, making any pending read on it fail."""
+        conn = self._conn
+        if conn is not None and conn.sock is not None :
+            try :
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except socket.error :
+                pass
+        self.close()
+
+#######################################################################################################
+
+# the accessors of urllib2.Request are gone in Python 3.4
+def _host(req) :
+    if hasattr(req, "get_host") :
+        return req.get_host()
+    return req.host
+
+def _selector(req) :
+    if hasattr(req, "get_selector") :
+        return req.get_selector()
+    return req.selector
+
+class _PooledHandlerMixin :
+    """Common code of the pooled C{urllib2} handlers; modeled after C{urllib2.AbstractHTTPHandler.do_open}."""
+    def __init__(self, pool, debuglevel=0) :
+        self._pool = pool
+        self._debuglevel = debuglevel
+
+    def _pooledOpen(self, scheme, connectionClass, req) :
+        host = _host(req)
+        if not host :
+            raise urllib2.URLError("no host given")
+        key = (scheme, host)
+        timeout = getattr(req, "timeout", socket._GLOBAL_DEFAULT_TIMEOUT)
+        connectTimeout = getattr(req, "connectTimeout", None)
+        deadline = getattr(req, "deadline", None)
+        # a request that is not idempotent (eg, an update) may have been run by the server even if the connection failed
+        idempotent = getattr(req, "idempotent", req.get_method() in ("GET", "HEAD"))
+
+        def factory() :
+            conn = connectionClass(host, timeout=timeout)
+            conn.set_debuglevel(self._debuglevel)
+            return conn
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict((k, v) for k, v in req.headers.items() if k not in headers))
+        headers = dict((name.title(), val) for name, val in headers.items())
+
+        while True :
+            conn, reused = self._pool.acquire(key, factory)
+            watch = None
+            try :
+                if reused and conn.sock is not None and timeout is not socket._GLOBAL_DEFAULT_TIMEOUT :
+                    conn.sock.settimeout(timeout)
+                if conn.sock is None :
+                    connect(conn, connectTimeout)
+                if deadline is not None :
+                    watch = deadline.watch(conn.sock)
+                conn.request(req.get_method(), _selector(req), req.data, headers)
+                response = conn.getresponse()
+                break
+            except (socket.error, httplib.HTTPException), e :
+                self._pool.release(key, conn, False)
+                # a reused connection may have been closed by the server meanwhile: try once more with a new one
+                if reused and idempotent and not isinstance(e, socket.timeout) and (deadline is None or not deadline.expired()) :
+                    continue
+                if isinstance(e, socket.error) :
+                    raise urllib2.URLError(e)
+                raise
+            except :
+                self._pool.release(key, conn, False)
+                raise
+
+        fp = PooledResponse(self._pool, key, conn, response, watch)
+        if response.status >= 300 :
+            # error and redirect bodies are small and often never read by urllib2: free the connection right away
+            fp._buffer = fp.read()
+        resp = addinfourl(fp, response.msg, req.get_full_url())
+        resp.code = response.status
+        resp.msg = response.reason
+        return resp
+
+class PooledHTTPHandler(_PooledHandlerMixin, urllib2.HTTPHandler) :
+    """C{urllib2} handler for C{http} URIs using the connections of a L{ConnectionPool}."""
+    def __init__(self, pool, debuglevel=0) :
+        urllib2.HTTPHandler.__init__(self, debuglevel)
+        _PooledHandlerMixin.__init__(self, pool, debuglevel)
+
+    def http_open(self, req) :
+        return self._pooledOpen("http", httplib.HTTPConnection, req)
+
+class PooledHTTPSHandler(_PooledHandlerMixin, urllib2.HTTPSHandler) :
+    """C{urllib2} handler for C{https} URIs using the connections of a L{ConnectionPool}."""
+    def __init__(self, pool, debuglevel=0) :
+        urllib2.HTTPSHandler.__init__(self, debuglevel)
+        _PooledHandlerMixin.__init__(self, pool, debuglevel)
+
+    def https_open(self, req) :
+        if getattr(req, "_tunnel_host", None) :
+            # tunnelled (proxied) connections are not pooled
+            return urllib2.HTTPSHandler.https_open(self, req)
+        return self._pooledOpen("https", httplib.HTTPSConnection, req)
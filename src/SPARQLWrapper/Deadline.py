@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+
+"""
+Time limits of the queries.
+
+A L{Deadline} is the point in time by which a query, including the reading of its response by the converters, must be
+over. Socket timeouts alone cannot enforce it: a read only times out if I{nothing} arrives for the whole timeout, so an
+endpoint trickling its response byte by byte can keep a reader busy for ever. The sockets of a query are therefore
+registered with a watchdog thread, which shuts them down when the deadline expires; the pending read then fails, and
+the failure is reported as a L{QueryTimeout<SPARQLWrapper.SPARQLExceptions.QueryTimeout>}.
+
+The L{TimeoutHTTPHandler} and L{TimeoutHTTPSHandler} C{urllib2} handlers connect with the C{connectTimeout} of the
+request (if any), then use its C{timeout} for the reads, and register their socket with the C{deadline} of the request.
+
+@authors: U{Ivan Herman<http://www.ivan-herman.net>}, U{Sergio Fernández<http://www.wikier.org>}, U{Carlos Tejo Alonso<http://www.dayures.net>}
+@organization: U{World Wide Web Consortium<http://www.w3.org>} and U{Foundation CTIC<http://www.fundacionctic.org/>}.
+@license: U{W3C® SOFTWARE NOTICE AND LICENSE<href="http://www.w3.org/Consortium/Legal/copyright-software">}
+"""
+
+import heapq
+import httplib
+import socket
+import threading
+import time
+import urllib2
+from SPARQLExceptions import QueryTimeout
+
+class _Watch :
+    """A socket to be shut down at a given time, unless cancelled before."""
+    def __init__(self, expires, sock) :
+        self.expires = expires
+        self.sock = sock
+        self.fired = False
+        self.cancelled = False
+
+    def __lt__(self, other) :
+        return self.expires < other.expires
+
+    def cancel(self) :
+        """Leave the socket alone (eg, because it goes back to a connection pool)."""
+        _watchdog.cancel(self)
+
+class _Watchdog :
+    """Single daemon thread shutting down the sockets of the expired deadlines."""
+    def __init__(self) :
+        self._watches = []
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def watch(self, expires, sock) :
+        watch = _Watch(expires, sock)
+        self._condition.acquire()
+        try :
+            heapq.heappush(self._watches, watch)
+            if self._thread is None :
+                self._thread = threading.Thread(target=self._run, name="SPARQLWrapper deadline watchdog")
+                self._thread.daemon = True
+                self._thread.start()
+            elif self._watches[0] is watch :
+                self._condition.notify()
+        finally :
+            self._condition.release()
+        return watch
+
+    def cancel(self, watch) :
+        # cancelled watches stay in the heap until they expire; they are skipped then
+        self._condition.acquire()
+        try :
+            watch.cancelled = True
+            watch.sock = None
+        finally :
+            self._condition.release()
+
+    def fire(self, watch) :
+        # shut the socket down right away; the watch stays in the heap (if there) until it expires
+        self._condition.acquire()
+        try :
+            sock = None
+            if not watch.cancelled and not watch.fired :
+                watch.fired = True
+                sock, watch.sock = watch.sock, None
+        finally :
+            self._condition.release()
+        _shutdown(sock)
+
+    def _run(self) :
+        while True :
+            expired = []
+            self._condition.acquire()
+            try :
+                while not self._watches :
+                    self._condition.wait()
+                now = time.time()
+                while self._watches and self._watches[0].expires <= now :
+                    watch = heapq.heappop(self._watches)
+                    if not watch.cancelled and not watch.fired :
+                        watch.fired = True
+                        expired.append(watch.sock)
+                        watch.sock = None
+                if not expired and self._watches :
+                    self._condition.wait(self._watches[0].expires - now)
+            finally :
+                self._condition.release()
+            for sock in expired :
+                _shutdown(sock)
+
+def _shutdown(sock) :
+    if sock is not None :
+        try :
+            sock.shutdown(socket.SHUT_RDWR)
+        except (socket.error, ValueError) :
+            pass
+
+_watchdog = _Watchdog()
+
+#######################################################################################################
+
+class Deadline :
+    """
+    The point in time by which a query must be over.
+
+    A query can also be L{abort}ed before its deadline (eg, the loser of hedged requests): its sockets are shut down
+    right away, as if the deadline had expired.
+
+    @ivar timeout: the time granted to the query, in seconds; C{None} if the query has no time limit
+    @type timeout: float
+    @ivar expires: the deadline, as returned by C{time.time()}; C{None} if the query has no time limit
+    @type expires: float
+    @ivar aborted: whether the query has been aborted
+    @type aborted: boolean
+    """
+    def __init__(self, timeout) :
+        """
+        @param timeout: the time granted to the query, in seconds, from now on; C{None} for a query without time
+        limit, which can only be aborted
+        @type timeout: float
+        """
+        self.timeout = timeout
+        self.expires = None
+        if timeout is not None :
+            self.expires = time.time() + timeout
+        self.aborted = False
+        self._watches = []
+
+    def remaining(self) :
+        """Number of seconds left before the deadline (0 if expired), C{None} if the query has no time limit."""
+        if self.expires is None :
+            return None
+        return max(0.0, self.expires - time.time())
+
+    def expired(self) :
+        """Tell whether the deadline is passed, or a socket of the query has been shut down because of it."""
+        if self.aborted :
+            return True
+        return (self.expires is not None and time.time() >= self.expires) or any(watch.fired for watch in self._watches)
+
+    def check(self) :
+        """
+        Raise a L{QueryTimeout<SPARQLWrapper.SPARQLExceptions.QueryTimeout>} if the deadline is passed.
+        """
+        if self.aborted :
+            raise QueryTimeout("query aborted")
+        if self.expired() :
+            raise QueryTimeout("no complete response within %g seconds" % self.timeout)
+
+    def socketTimeout(self, timeout=None) :
+        """
+        Return the timeout for a blocking socket operation of the query: the smaller of C{timeout} and the time left.
+        @param timeout: the timeout set otherwise, in seconds, or C{None}
+        """
+        if self.expires is None :
+            return timeout
+        if timeout is None :
+            return self.remaining()
+        return min(timeout, self.remaining())
+
+    def watch(self, sock) :
+        """
+        Have a socket shut down when the deadline expires, or when the query is aborted.
+        @param sock: the socket
+        @return: a handle, whose C{cancel()} method withdraws the socket from the watch
+        """
+        if self.expires is None :
+            # nothing for the watchdog thread to do
+            watch = _Watch(None, sock)
+        else :
+            watch = _watchdog.watch(self.expires, sock)
+        self._watches.append(watch)
+        if self.aborted :
+            # aborted while the socket was being connected
+            _watchdog.fire(watch)
+        return watch
+
+    def abort(self) :
+        """Shut the sockets of the query down right away: any pending operation on them fails."""
+        self.aborted = True
+        for watch in list(self._watches) :
+            _watchdog.fire(watch)
+
+    def cancel(self) :
+        """Withdraw all the sockets of the query from the watch (the query is over)."""
+        for watch in self._watches :
+            watch.cancel()
+
+#######################################################################################################
+
+def connect(conn, connectTimeout=None, method=None) :
+    """
+    Connect a C{httplib} connection, using C{connectTimeout} (if not C{None}) instead of the timeout of the connection
+    for establishing it; the timeout of the connection applies to the operations on the socket afterwards.
+    @param conn: the connection
+    @type conn: C{httplib.HTTPConnection}
+    @param connectTimeout: timeout for establishing the connection, in seconds
+    @param method: the unbound C{connect} method to use; by default, the one of the connection
+    """
+    timeout = conn.timeout
+    if connectTimeout is not None :
+        conn.timeout = connectTimeout
+    try :
+        if method is None :
+            conn.connect()
+        else :
+            method(conn)
+    finally :
+        conn.timeout = timeout
+    if conn.sock is not None and timeout is not socket._GLOBAL_DEFAULT_TIMEOUT :
+        conn.sock.settimeout(timeout)
+
+class _TimeoutHTTPConnection(httplib.HTTPConnection) :
+    connectTimeout = None
+    deadline = None
+
+    def connect(self) :
+        connect(self, self.connectTimeout, httplib.HTTPConnection.connect)
+        if self.deadline is not None :
+            self.deadline.watch(self.sock)
+
+class _TimeoutHTTPSConnection(httplib.HTTPSConnection) :
+    connectTimeout = None
+    deadline = None
+
+    def connect(self) :
+        connect(self, self.connectTimeout, httplib.HTTPSConnection.connect)
+        if self.deadline is not None :
+            self.deadline.watch(self.sock)
+
+def _connectionFactory(connectionClass, req) :
+    def factory(host, **kwargs) :
+        conn = connectionClass(host, **kwargs)
+        conn.connectTimeout = getattr(req, "connectTimeout", None)
+        conn.deadline = getattr(req, "deadline", None)
+        return conn
+    return factory
+
+class TimeoutHTTPHandler(urllib2.HTTPHandler) :
+    """C{urllib2} handler for C{http} URIs honouring the C{connectTimeout} and C{deadline} attributes of the requests."""
+    def http_open(self, req) :
+        return self.do_open(_connectionFactory(_TimeoutHTTPConnection, req), req)
+
+class TimeoutHTTPSHandler(urllib2.HTTPSHandler) :
+    """C{urllib2} handler for C{https} URIs honouring the C{connectTimeout} and C{deadline} attributes of the requests."""
+    def https_open(self, req) :
+        # Python versions checking certificates pass their SSL context to the connection class
+        kwargs = {}
+        if getattr(self, "_context", None) is not None :
+            kwargs["context"] = self._context
+        if getattr(self, "_check_hostname", None) is not None :
+            kwargs["check_hostname"] = self._check_hostname
+        return self.do_open(_connectionFactory(_TimeoutHTTPSConnection, req), req, **kwargs)
+
+#######################################################################################################
+
+class DeadlineResponse :
+    """
+    File-like view on a response, raising a L{QueryTimeout<SPARQLWrapper.SPARQLExceptions.QueryTimeout>} instead of
+    returning data, or failing with a network error, once the deadline of the query has expired. The sockets of the
+    query are withdrawn from the watch once the response is read to its end or closed.
+    """
+    def __init__(self, response, deadline) :
+        """
+        @param response: the response, a file-like object
+        @param deadline: the deadline of the query
+        @type deadline: L{Deadline}
+        """
+        self._response = response
+        self._deadline = deadline
+
+    def _call(self, method, *args) :
+        self._deadline.check()
+        try :
+            data = method(*args)
+        except (socket.error, IOError, httplib.HTTPException, ValueError) :
+            self._deadline.check()
+            raise
+        # a socket shut down by the watchdog looks like the end of the response
+        self._deadline.check()
+        if not data :
+            self._deadline.cancel()
+        return data
+
+    def read(self, amt=None) :
+        if amt is None or amt < 0 :
+            data = self._call(self._response.read)
+            self._deadline.cancel()
+            return data
+        return self._call(self._response.read, amt)
+
+    def readline(self, limit=-1) :
+        return self._call(self._response.readline, limit)
+
+    def readlines(self, hint=None) :
+        return list(iter(self.readline, b""))
+
+    def __iter__(self) :
+        return iter(self.readline, b"")
+
+    def next(self) :
+        line = self.readline()
+        if not line :
+            raise StopIteration
+        return line
+
+    def fileno(self) :
+        return self._response.fileno()
+
+    def close(self) :
+        self._deadline.cancel()
+        self._response.close()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+"""
+Digest authentication without a challenge round trip per query.
+
+The standard C{urllib2.HTTPDigestAuthHandler} waits for the C{401} challenge of the server on every request, ie, each
+authenticated query costs two round trips. The L{PreemptiveDigestAuthHandler} remembers the last challenge of each
+host and computes the C{Authorization} header of the following requests right away, incrementing the nonce count as
+required by RFC 2617. If the server does not accept it anymore (eg, the nonce became stale), it answers with a new
+challenge, which is handled (and remembered) as usual.
+
+@authors: U{Ivan Herman<http://www.ivan-herman.net>}, U{Sergio Fernández<http://www.wikier.org>}, U{Carlos Tejo Alonso<http://www.dayures.net>}
+@organization: U{World Wide Web Consortium<http://www.w3.org>} and U{Foundation CTIC<http://www.fundacionctic.org/>}.
+@license: U{W3C® SOFTWARE NOTICE AND LICENSE<href="http://www.w3.org/Consortium/Legal/copyright-software">}
+"""
+
+import threading
+import urllib2
+try:
+    from urllib2 import parse_http_list, parse_keqv_list         # Python 2
+except ImportError:
+    from urllib.request import parse_http_list, parse_keqv_list  # Python 3
+
+def _host(req) :
+    """The host of a C{urllib2} request (C{get_host} is gone in Python 3.4)."""
+    if hasattr(req, "get_host") :
+        return req.get_host()
+    return req.host
+
+class PreemptiveDigestAuthHandler(urllib2.HTTPDigestAuthHandler) :
+    """
+    C{urllib2} digest authentication handler reusing the last challenge of a host for the next requests to it.
+    It is meant to be owned by a single L{SPARQLWrapper<SPARQLWrapper.Wrapper.SPARQLWrapper>} instance (so
+    several instances with different credentials do not interfere), and can be used by several threads.
+    """
+    def __init__(self, passwd=None) :
+        """
+        @param passwd: the password manager; by default, a new C{urllib2.HTTPPasswordMgrWithDefaultRealm}
+        """
+        if passwd is None :
+            passwd = urllib2.HTTPPasswordMgrWithDefaultRealm()
+        urllib2.HTTPDigestAuthHandler.__init__(self, passwd)
+        self._challenges = {}
+        self._lock = threading.RLock()
+
+    def addCredentials(self, realm, uri, user, passwd) :
+        """
+        Register credentials for a URI (and all the URIs below it), unless they are known already.
+        @param realm: realm; C{None} or empty for any realm
+        @param uri: URI of the endpoint
+        @param user: user name
+        @param passwd: password
+        """
+        realm = realm or None
+        self._lock.acquire()
+        try :
+            if self.passwd.find_user_password(realm, uri) != (user, passwd) :
+                self.passwd.add_password(realm, uri, user, passwd)
+        finally :
+            self._lock.release()
+
+    def retry_http_digest_auth(self, req, auth) :
+        token, challenge = auth.split(" ", 1)
+        chal = parse_keqv_list(filter(None, parse_http_list(challenge)))
+        self._challenges[_host(req)] = chal
+        return urllib2.HTTPDigestAuthHandler.retry_http_digest_auth(self, req, auth)
+
+    def get_authorization(self, req, chal) :
+        # the nonce count is shared by all requests of the handler
+        self._lock.acquire()
+        try :
+            return urllib2.HTTPDigestAuthHandler.get_authorization(self, req, chal)
+        finally :
+            self._lock.release()
+
+    def http_request(self, req) :
+        chal = self._challenges.get(_host(req))
+        if chal is not None and not req.has_header(self.auth_header) :
+            auth = self.get_authorization(req, chal)
+            if auth :
+                req.add_unredirected_header(self.auth_header, "Digest %s" % auth)
+        return req
+
+    https_request = http_request
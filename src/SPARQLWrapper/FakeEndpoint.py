@@ -0,0 +1,482 @@
+# -*- coding: utf-8 -*-
+
+"""
+Local stand-in for a SPARQL endpoint, for tests and benchmarks that should not depend on a remote service.
+
+A L{FakeEndpoint} answers the queries with canned responses (see L{FakeEndpoint.addResponse}) or, by default, with
+synthetic results of a configurable size, in the format asked for by the client, after a configurable latency. It can
+be used through real HTTP, by starting its threaded server on the loopback interface::
+
+ endpoint = FakeEndpoint(rows=1000, latency=0.01)
+ endpoint.start()
+ sparql = SPARQLWrapper(endpoint.url)
+ ...
+ endpoint.stop()
+
+or without any network at all, through its L{transport<FakeEndpoint.transport>}::
+
+ sparql = SPARQLWrapper("http://example.org/sparql")
+ sparql.setTransport(FakeEndpoint().transport())
+
+@authors: U{Ivan Herman<http://www.ivan-herman.net>}, U{Sergio Fernández<http://www.wikier.org>}, U{Carlos Tejo Alonso<http://www.dayures.net>}
+@organization: U{World Wide Web Consortium<http://www.w3.org>} and U{Foundation CTIC<http://www.fundacionctic.org/>}.
+@license: U{W3C® SOFTWARE NOTICE AND LICENSE<href="http://www.w3.org/Consortium/Legal/copyright-software">}
+"""
+
+import io
+import re
+import uuid
+import hashlib
+import socket
+import threading
+import time
+import email
+import urllib2
+import urlparse
+import BaseHTTPServer
+import SocketServer
+from xml.sax.saxutils import escape, quoteattr
+import jsonlayer
+from Transport import Transport
+from Wrapper import _parseQueryType, SELECT, ASK, CONSTRUCT, _updateQueryTypes
+try:
+    from urllib import addinfourl           # Python 2
+except ImportError:
+    from urllib.response import addinfourl  # Python 3
+try:
+    from urllib2 import parse_http_list, parse_keqv_list         # Python 2
+except ImportError:
+    from urllib.request import parse_http_list, parse_keqv_list  # Python 3
+
+_REASONS = BaseHTTPServer.BaseHTTPRequestHandler.responses
+
+class FakeRequest :
+    """
+    A request received by a L{FakeEndpoint}.
+
+    @ivar method: the HTTP method
+    @ivar path: the path of the request, with its query string
+    @ivar headers: the headers, as a dictionary with lower case keys
+    @ivar parameters: the query (and, for form posts, body) parameters, as a dictionary of lists
+    @ivar query: the query (or update) text
+    """
+    def __init__(self, method, path, headers, parameters, query) :
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.parameters = parameters
+        self.query = query
+
+class FakeEndpoint :
+    """
+    Fake SPARQL endpoint serving canned or synthetic responses; see the module documentation.
+
+    The synthetic result of a C{SELECT} query has C{rows} solutions binding the C{variables} (to URIs, and a literal
+    for the last variable), in the SPARQL XML, JSON, CSV or TSV format, sliced by the C{LIMIT} and C{OFFSET} of the query (if
+    any); an C{ASK} query is answered with C{true}; a C{CONSTRUCT} or C{DESCRIBE} query with C{rows} triples, in
+    RDF/XML or, if the client asks for Turtle or N3, in N-Triples (a subset of both); an update is acknowledged with an
+    empty response.
+
+    @ivar rows: the number of solutions (or triples) of the synthetic results
+    @type rows: int
+    @ivar variables: the variables of the synthetic C{SELECT} results
+    @ivar maxRows: the maximum number of solutions of the synthetic C{SELECT} results, whatever the C{LIMIT} of the
+    query, like the C{ResultSetMaxRows} of Virtuoso; C{None} for no maximum
+    @type maxRows: int
+    @ivar latency: the number of seconds before each response is sent
+    @type latency: float
+    @ivar chunked: whether the responses are sent with the chunked transfer coding (through HTTP only)
+    @type chunked: boolean
+    @ivar trickle: the number of seconds between the chunks of a chunked response, for responses trickling slowly
+    @type trickle: float
+    @ivar url: the URI of the endpoint, once L{started<start>}
+    @ivar requests: the L{requests<FakeRequest>} received so far
+    @ivar connections: the number of HTTP connections accepted so far
+    @type connections: int
+    """
+    def __init__(self, rows=10, variables=("s", "p", "o"), latency=0.0) :
+        """
+        @param rows: the number of solutions (or triples) of the synthetic results
+        @param variables: the variables of the synthetic C{SELECT} results
+        @param latency: the number of seconds before each response is sent
+        """
+        self.rows = rows
+        self.variables = tuple(variables)
+        self.latency = latency
+        self.maxRows = None
+        self.chunked = False
+        self.trickle = 0.0
+        self.url = None
+        self.requests = []
+        self.connections = 0
+        self._responses = []
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._digest = None
+        self._nonce = None
+        # the sockets of the open connections
+        self._connections = set()
+
+    def addResponse(self, pattern, body, contentType="application/sparql-results+json", status=200, headers=None, times=None) :
+        """
+        Answer the queries matching a regular expression with a canned response. The responses are tried in the
+        order they were added. A response with an C{ETag} header is answered with C{304 Not Modified} to the
+        requests whose C{If-None-Match} header has the same value. A response given C{times} times is dropped, so
+        that failures followed by a recovery can be scripted, eg, two C{503} responses and then the usual result.
+        @param pattern: the regular expression, searched for in the query text
+        @param body: the body of the response
+        @type body: string
+        @param contentType: the value of the C{Content-Type} header
+        @param status: the HTTP status
+        @type status: int
+        @param headers: further headers, as a dictionary
+        @param times: the number of requests the response answers; C{None} for all of them
+        @type times: int
+        """
+        if not isinstance(body, bytes) :
+            body = body.encode("utf-8")
+        allHeaders = [("Content-Type", contentType)]
+        allHeaders.extend((headers or {}).items())
+        self._responses.append([re.compile(pattern), status, allHeaders, body, times])
+
+    def setDigestAuth(self, user, passwd, realm="SPARQL") :
+        """
+        Require digest authentication (RFC 2617, with the C{auth} quality of protection) from the clients: the
+        requests without valid credentials are answered with a C{401} challenge.
+        @param user: user name
+        @param passwd: password
+        @param realm: realm
+        """
+        self._digest = (user, passwd, realm)
+        self.renewNonce()
+
+    def renewNonce(self) :
+        """Issue a new nonce: the requests using the previous one are answered with a new challenge, marked stale."""
+        self._nonce = uuid.uuid4().hex
+
+    def _authenticate(self, method, path, headers) :
+        """The challenge for a request without valid digest credentials, or C{None}."""
+        user, passwd, realm = self._digest
+        stale = False
+        authorization = headers.get("authorization", "")
+        if authorization[:7].lower() == "digest " :
+            fields = parse_keqv_list(parse_http_list(authorization[7:]))
+            ha1 = _md5("%s:%s:%s" % (user, realm, passwd))
+            ha2 = _md5("%s:%s" % (method, fields.get("uri")))
+            expected = _md5(":".join([ha1, fields.get("nonce", ""), fields.get("nc", ""), fields.get("cnonce", ""), fields.get("qop", ""), ha2]))
+            if fields.get("username") == user and fields.get("uri") == path and fields.get("response") == expected :
+                if fields.get("nonce") == self._nonce :
+                    return None
+                stale = True
+        challenge = 'Digest realm="%s", nonce="%s", qop="auth", algorithm="MD5"' % (realm, self._nonce)
+        if stale :
+            challenge += ", stale=true"
+        return 401, [("Content-Type", "text/plain"), ("WWW-Authenticate", challenge)], b"authentication required"
+
+    def respond(self, method, path, headers, body=None) :
+        """
+        Compute the response to a request, after the configured latency, and record the request.
+        @param method: the HTTP method
+        @param path: the path of the request, with its query string
+        @param headers: the headers of the request, as a dictionary
+        @param body: the body of the request, if any
+        @return: the status, the list of the headers and the body of the response
+        @rtype: tuple
+        """
+        headers = dict((name.lower(), value) for name, value in headers.items())
+        parameters = urlparse.parse_qs(urlparse.urlsplit(path).query)
+        contentType = headers.get("content-type", "")
+        if body and "form" in contentType :
+            if isinstance(body, bytes) :
+                body = body.decode("utf-8")
+            for name, values in urlparse.parse_qs(body).items() :
+                parameters.setdefault(name, []).extend(values)
+        elif body and "sparql-query" in contentType :
+            parameters["query"] = [body.decode("utf-8") if isinstance(body, bytes) else body]
+        query = (parameters.get("query") or parameters.get("update") or [None])[0]
+        self._lock.acquire()
+        try :
+            self.requests.append(FakeRequest(method, path, headers, parameters, query))
+        finally :
+            self._lock.release()
+
+        if self._digest is not None :
+            challenge = self._authenticate(method, path, headers)
+            if challenge is not None :
+                return challenge
+        if self.latency :
+            time.sleep(self.latency)
+        if query is None :
+            return 400, [("Content-Type", "text/plain")], b"no query given"
+        for response in self._responses :
+            pattern, status, responseHeaders, responseBody, times = response
+            if pattern.search(query) and self._use(response) :
+                etag = dict((name.lower(), value) for name, value in responseHeaders).get("etag")
+                if etag is not None and headers.get("if-none-match") == etag :
+                    return 304, [("ETag", etag)], b""
+                return status, responseHeaders, responseBody
+
+        if "update" in parameters :
+            return 200, [("Content-Type", "text/plain")], b""
+        queryType = _parseQueryType(query)
+        if queryType in _updateQueryTypes :
+            return 200, [("Content-Type", "text/plain")], b""
+        formats = set(values[0].lower() for name, values in parameters.items() if name in ("format", "output", "results"))
+        accept = headers.get("accept", "")
+        if queryType in (SELECT, ASK) :
+            if "json" in formats or "json" in accept :
+                kind = "json"
+            elif queryType == SELECT and ("csv" in formats or "text/csv" in accept) :
+                kind = "csv"
+            elif queryType == SELECT and ("tsv" in formats or "tab-separated-values" in accept) :
+                kind = "tsv"
+            else :
+                kind = "xml"
+        elif formats & set(["n3", "turtle"]) or "turtle" in accept or "n3" in accept :
+            kind = "nt"
+        else :
+            kind = "rdf"
+        solutions = (0, self.rows)
+        if queryType == SELECT :
+            solutions = _slice(query, self.rows)
+            if self.maxRows is not None :
+                solutions = (solutions[0], min(solutions[1], solutions[0] + self.maxRows))
+        return 200, [("Content-Type", _contentTypes[kind])], self._body(queryType, kind, solutions)
+
+    def _use(self, response) :
+        """Count a use of a canned response; return whether it was still available."""
+        self._lock.acquire()
+        try :
+            if response[4] is None :
+                return True
+            if response[4] <= 0 :
+                return False
+            response[4] -= 1
+            return True
+        finally :
+            self._lock.release()
+
+    def _body(self, queryType, kind, solutions) :
+        """The synthetic body for a query type, a format and a slice of the solutions, generated once."""
+        if queryType not in (SELECT, ASK) :
+            queryType = CONSTRUCT
+        key = (queryType, kind, solutions, self.rows, self.variables)
+        body = self._bodies.get(key)
+        if body is None :
+            if queryType == ASK :
+                body = _askBody(kind)
+            elif queryType == SELECT :
+                body = _selectBody(kind, solutions, self.variables)
+            else :
+                body = _graphBody(kind, self.rows)
+            body = self._bodies[key] = body.encode("utf-8")
+        return body
+
+    def start(self) :
+        """
+        Start the HTTP server, on a free port of the loopback interface, in a background thread.
+        @return: the URI of the endpoint
+        """
+        if self._server is None :
+            self._server = _Server(("127.0.0.1", 0), _Handler)
+            self._server.endpoint = self
+            # a short poll interval makes stop() quick
+            thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), name="FakeEndpoint")
+            thread.daemon = True
+            thread.start()
+            self.url = "http://127.0.0.1:%d/sparql" % self._server.server_address[1]
+        return self.url
+
+    def stop(self) :
+        """Stop the HTTP server."""
+        if self._server is not None :
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) :
+        self.start()
+        return self
+
+    def __exit__(self, *args) :
+        self.stop()
+
+    def closeConnections(self) :
+        """Close the open HTTP connections, as servers do with idle persistent connections, without notice."""
+        self._lock.acquire()
+        try :
+            connections = list(self._connections)
+        finally :
+            self._lock.release()
+        for connection in connections :
+            try :
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error :
+                pass
+
+    def transport(self) :
+        """
+        Return a L{Transport<SPARQLWrapper.Transport.Transport>} answering the requests in the current thread,
+        without any network communication (the server need not be started).
+        @rtype: L{Transport<SPARQLWrapper.Transport.Transport>}
+        """
+        return _InProcessTransport(self)
+
+#######################################################################################################
+
+_contentTypes = {
+    "json" : "application/sparql-results+json",
+    "xml"  : "application/sparql-results+xml",
+    "csv"  : "text/csv; charset=utf-8",
+    "tsv"  : "text/tab-separated-values; charset=utf-8",
+    "nt"   : "text/turtle",
+    "rdf"  : "application/rdf+xml",
+}
+
+_EX = "http://example.org/"
+
+def _md5(value) :
+    return hashlib.md5(value.encode("utf-8")).hexdigest()
+
+def _askBody(kind) :
+    if kind == "json" :
+        return jsonlayer.encode({"head" : {}, "boolean" : True})
+    return u'<?xml version="1.0"?>\n<sparql xmlns="http://www.w3.org/2005/sparql-results#"><head/><boolean>true</boolean></sparql>\n'
+
+_SLICE = re.compile(r"\b(LIMIT|OFFSET)\s+(\d+)", re.IGNORECASE)
+
+def _slice(query, rows) :
+    """The C{(start, stop)} range of the solutions asked for by the C{LIMIT} and C{OFFSET} of a query."""
+    limits = dict((keyword.upper(), int(number)) for keyword, number in _SLICE.findall(query[query.rfind("}") + 1:]))
+    start = min(limits.get("OFFSET", 0), rows)
+    return start, min(start + limits.get("LIMIT", rows), rows)
+
+def _selectBody(kind, solutions, variables) :
+    last = variables[-1] if variables else None
+    def value(variable, i) :
+        if variable == last :
+            return "literal", u"value %d" % i
+        return "uri", u"%s%s/%d" % (_EX, variable, i)
+    if kind == "json" :
+        bindings = []
+        for i in range(*solutions) :
+            solution = {}
+            for variable in variables :
+                valueType, v = value(variable, i)
+                solution[variable] = {"type" : valueType, "value" : v}
+            bindings.append(solution)
+        return jsonlayer.encode({"head" : {"vars" : list(variables)}, "results" : {"bindings" : bindings}})
+    if kind == "csv" :
+        return u"".join(u",".join(row) + u"\r\n" for row in [variables] + [[value(variable, i)[1] for variable in variables] for i in range(*solutions)])
+    if kind == "tsv" :
+        lines = [u"\t".join(u"?" + variable for variable in variables)]
+        for i in range(*solutions) :
+            lines.append(u"\t".join((valueType == "uri" and u"<%s>" or u'"%s"') % v for valueType, v in [value(variable, i) for variable in variables]))
+        return u"\n".join(lines) + u"\n"
+    lines = [u'<?xml version="1.0"?>', u'<sparql xmlns="http://www.w3.org/2005/sparql-results#">', u'<head>']
+    lines.extend(u'<variable name=%s/>' % quoteattr(variable) for variable in variables)
+    lines.append(u'</head><results>')
+    for i in range(*solutions) :
+        lines.append(u'<result>')
+        for variable in variables :
+            valueType, v = value(variable, i)
+            lines.append(u'<binding name=%s><%s>%s</%s></binding>' % (quoteattr(variable), valueType, escape(v), valueType))
+        lines.append(u'</result>')
+    lines.append(u'</results></sparql>')
+    return u"\n".join(lines) + u"\n"
+
+def _graphBody(kind, rows) :
+    if kind == "nt" :
+        return u"".join(u'<%ss/%d> <%svalue> "value %d" .\n' % (_EX, i, _EX, i) for i in range(rows))
+    lines = [u'<?xml version="1.0"?>',
+             u'<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns:ex="%s">' % _EX]
+    lines.extend(u'<rdf:Description rdf:about="%ss/%d"><ex:value>value %d</ex:value></rdf:Description>' % (_EX, i, i) for i in range(rows))
+    lines.append(u'</rdf:RDF>')
+    return u"\n".join(lines) + u"\n"
+
+#######################################################################################################
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler) :
+    protocol_version = "HTTP/1.1"
+    # headers and body in as few packets as possible
+    wbufsize = 64 * 1024
+    # size of the chunks of chunked responses
+    chunkSize = 1024
+
+    def setup(self) :
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        endpoint = self.server.endpoint
+        endpoint._lock.acquire()
+        try :
+            endpoint.connections += 1
+            endpoint._connections.add(self.connection)
+        finally :
+            endpoint._lock.release()
+
+    def finish(self) :
+        endpoint = self.server.endpoint
+        endpoint._lock.acquire()
+        try :
+            endpoint._connections.discard(self.connection)
+        finally :
+            endpoint._lock.release()
+        BaseHTTPServer.BaseHTTPRequestHandler.finish(self)
+
+    def _respond(self) :
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        endpoint = self.server.endpoint
+        status, headers, responseBody = endpoint.respond(self.command, self.path, dict(self.headers.items()), body)
+        self.send_response(status)
+        for name, value in headers :
+            self.send_header(name, value)
+        if endpoint.chunked :
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for start in range(0, len(responseBody), self.chunkSize) :
+                chunk = responseBody[start:start + self.chunkSize]
+                self.wfile.write(b"%x\r\n" % len(chunk) + chunk + b"\r\n")
+                if endpoint.trickle :
+                    self.wfile.flush()
+                    time.sleep(endpoint.trickle)
+            self.wfile.write(b"0\r\n\r\n")
+        else :
+            self.send_header("Content-Length", str(len(responseBody)))
+            self.end_headers()
+            self.wfile.write(responseBody)
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, format, *args) :
+        pass
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer) :
+    daemon_threads = True
+    allow_reuse_address = True
+    # bursts of concurrent clients should not see their connections dropped (and retried a second later)
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address) :
+        # clients closing their connection early (eg, the losers of hedged requests) are not errors
+        pass
+
+class _InProcessTransport(Transport) :
+    """Transport calling L{FakeEndpoint.respond} directly."""
+    def __init__(self, endpoint) :
+        self._endpoint = endpoint
+
+    def open(self, request, timeout=socket._GLOBAL_DEFAULT_TIMEOUT) :
+        url = request.get_full_url()
+        parts = urlparse.urlsplit(url)
+        path = parts.path + ("?" + parts.query if parts.query else "")
+        status, headers, body = self._endpoint.respond(request.get_method(), path, dict(request.header_items()), getattr(request, "data", None))
+        message = email.message_from_string("".join("%s: %s\n" % header for header in headers) + "\n")
+        reason = _REASONS.get(status, ("",))[0]
+        if not 200 <= status < 300 :
+            raise urllib2.HTTPError(url, status, reason, message, io.BytesIO(body))
+        response = addinfourl(io.BytesIO(body), message, url)
+        response.code = status
+        response.msg = reason
+        return response
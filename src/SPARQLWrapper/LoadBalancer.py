@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+"""
+Distribution of the queries over several (read) replicas of an endpoint.
+
+@authors: U{Ivan Herman<http://www.ivan-herman.net>}, U{Sergio Fernández<http://www.wikier.org>}, U{Carlos Tejo Alonso<http://www.dayures.net>}
+@organization: U{World Wide Web Consortium<http://www.w3.org>} and U{Foundation CTIC<http://www.fundacionctic.org/>}.
+@license: U{W3C® SOFTWARE NOTICE AND LICENSE<href="http://www.w3.org/Consortium/Legal/copyright-software">}
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+class EndpointStatistics :
+    """
+    Health and latency figures of a single endpoint, as seen by a L{LoadBalancer}.
+
+    @ivar latency: exponentially weighted moving average of the latency (time to the response headers), in seconds; C{None} before the first response
+    @type latency: float
+    @ivar outstanding: number of requests sent to the endpoint and not answered yet
+    @type outstanding: int
+    @ivar failures: number of consecutive failures
+    @type failures: int
+    @ivar ejectedUntil: time (as returned by C{time.time()}) until which the endpoint is not used
+    @type ejectedUntil: float
+    @ivar samples: the most recent latencies, in seconds
+    """
+    def __init__(self, window=100) :
+        self.latency = None
+        self.outstanding = 0
+        self.failures = 0
+        self.ejectedUntil = 0
+        self.samples = deque(maxlen=window)
+
+class LoadBalancer :
+    """
+    Chooses the endpoint of each query among several replicas.
+
+    Each endpoint is scored by the moving average of its latency multiplied by the number of its outstanding requests
+    plus one, and the endpoint with the lowest score is chosen (ties are broken at random). Fast replicas thus get
+    more queries, but not so many that they queue up; endpoints without any measurement yet are tried first.
+
+    After C{ejectAfter} consecutive failures, an endpoint is ejected for C{ejectionTime} seconds: it is only chosen
+    if no other endpoint is available. The balancer is thread safe.
+
+    @ivar endpoints: the URIs of the endpoints
+    @ivar decay: weight of the latest measurement in the moving average of the latency, between 0 and 1
+    @type decay: float
+    @ivar ejectAfter: number of consecutive failures ejecting an endpoint
+    @type ejectAfter: int
+    @ivar ejectionTime: number of seconds an ejected endpoint is not used
+    @type ejectionTime: float
+    """
+    def __init__(self, endpoints, decay=0.3, ejectAfter=3, ejectionTime=30.0) :
+        """
+        @param endpoints: list of endpoint URIs
+        @param decay: weight of the latest measurement in the moving average of the latency
+        @param ejectAfter: number of consecutive failures ejecting an endpoint
+        @param ejectionTime: number of seconds an ejected endpoint is not used
+        """
+        self.endpoints = list(endpoints)
+        self.decay = decay
+        self.ejectAfter = ejectAfter
+        self.ejectionTime = ejectionTime
+        self._stats = dict((uri, EndpointStatistics()) for uri in self.endpoints)
+        self._lock = threading.Lock()
+
+    def statistics(self, uri) :
+        """
+        Return the statistics of an endpoint.
+        @param uri: endpoint URI
+        @rtype: L{EndpointStatistics}
+        """
+        return self._stats[uri]
+
+    def percentile(self, uri, percent, minSamples=10) :
+        """
+        Return a percentile of the recent latencies of an endpoint.
+        @param uri: endpoint URI
+        @param percent: the percentile, between 0 and 100
+        @param minSamples: minimum number of latencies measured for the figure to be meaningful
+        @return: the latency, in seconds, or C{None} if fewer than C{minSamples} latencies are known
+        """
+        self._lock.acquire()
+        try :
+            samples = sorted(self._stats[uri].samples)
+        finally :
+            self._lock.release()
+        if not samples or len(samples) < minSamples :
+            return None
+        index = min(len(samples) - 1, int(round(percent / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+    def choose(self, exclude=()) :
+        """
+        Choose the endpoint for the next request.
+        @param exclude: endpoints that must not be chosen (eg, the ones that just failed)
+        @return: an endpoint URI, or C{None} if all endpoints are excluded
+        """
+        now = time.time()
+        self._lock.acquire()
+        try :
+            candidates = [uri for uri in self.endpoints if uri not in exclude]
+            if not candidates :
+                return None
+            healthy = [uri for uri in candidates if self._stats[uri].ejectedUntil <= now]
+            if healthy :
+                candidates = healthy
+            else :
+                # everything is ejected: better try the one coming back first than nothing
+                return min(candidates, key=lambda uri : self._stats[uri].ejectedUntil)
+            scores = [(self._score(self._stats[uri]), uri) for uri in candidates]
+            best = min(score for score, uri in scores)
+            return random.choice([uri for score, uri in scores if score == best])
+        finally :
+            self._lock.release()
+
+    def _score(self, stats) :
+        if stats.latency is None :
+            return 0.0
+        return stats.latency * (stats.outstanding + 1)
+
+    def begin(self, uri) :
+        """
+        Record the start of a request.
+        @param uri: endpoint URI
+        """
+        self._lock.acquire()
+        try :
+            self._stats[uri].outstanding += 1
+        finally :
+            self._lock.release()
+
+    def cancel(self, uri) :
+        """
+        Record the end of a request started with L{begin} that was aborted before the endpoint answered (eg, the
+        loser of hedged requests): neither its latency nor its failures are changed.
+        @param uri: endpoint URI
+        """
+        self._lock.acquire()
+        try :
+            stats = self._stats[uri]
+            stats.outstanding = max(0, stats.outstanding - 1)
+        finally :
+            self._lock.release()
+
+    def end(self, uri, latency=None, failed=False) :
+        """
+        Record the end of a request started with L{begin}.
+        @param uri: endpoint URI
+        @param latency: the time the endpoint took to answer, in seconds
+        @param failed: whether the endpoint failed
+        """
+        self._lock.acquire()
+        try :
+            stats = self._stats[uri]
+            stats.outstanding = max(0, stats.outstanding - 1)
+            if failed :
+                stats.failures += 1
+                if stats.failures >= self.ejectAfter :
+                    stats.ejectedUntil = time.time() + self.ejectionTime
+            else :
+                stats.failures = 0
+                stats.ejectedUntil = 0
+            if latency is not None and not failed :
+                stats.samples.append(latency)
+                if stats.latency is None :
+                    stats.latency = latency
+                else :
+                    stats.latency = self.decay * latency + (1 - self.decay) * stats.latency
+        finally :
+            self._lock.release()
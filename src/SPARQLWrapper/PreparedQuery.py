@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+
+"""
+Prepared queries: query templates analysed once, into which RDF terms are then bound safely.
+
+The placeholders of a template are its variables written with a C{$} (eg, C{$resource}); variables written with a
+C{?} are left alone. A value bound to a placeholder is serialized as a single RDF term, escaped as needed, so that it
+cannot change the structure of the query (as a string formatted into a query can, eg, with a quote in a label).
+
+The values can be:
+ - L{IRI} and L{Literal} instances;
+ - L{Value<SPARQLWrapper.SmartWrapper.Value>} instances, ie, values of the results of a previous query;
+ - Python values: strings (plain literals), integers, booleans, floats, C{decimal.Decimal}, C{datetime.date} and
+ C{datetime.datetime} (typed literals).
+
+Example::
+
+    prepared = sparql.prepare(\"\"\"
+        SELECT ?label WHERE { $resource rdfs:label ?label FILTER(lang(?label) = $lang) }
+    \"\"\")
+    for uri in uris :
+        result = sparql.execute(prepared.bind(resource=IRI(uri), lang="en"))
+
+@authors: U{Ivan Herman<http://www.ivan-herman.net>}, U{Sergio Fernández<http://www.wikier.org>}, U{Carlos Tejo Alonso<http://www.dayures.net>}
+@organization: U{World Wide Web Consortium<http://www.w3.org>} and U{Foundation CTIC<http://www.fundacionctic.org/>}.
+@license: U{W3C® SOFTWARE NOTICE AND LICENSE<href="http://www.w3.org/Consortium/Legal/copyright-software">}
+"""
+
+import re
+import datetime
+import decimal
+from Tokenizer import tokenize, minify, Minified, VAR
+
+_XSD = "http://www.w3.org/2001/XMLSchema#"
+
+class IRI :
+    """
+    An IRI to be bound in a L{PreparedQuery}.
+
+    @ivar value: the IRI
+    """
+    def __init__(self, value) :
+        """
+        @param value: the IRI
+        @type value: string
+        @raise ValueError: if the IRI contains characters not allowed in an IRI (spaces, C{<}, C{>}, quotes...)
+        """
+        self.value = _text(value)
+        _checkIRI(self.value)
+
+    def n3(self) :
+        """Serialization of the IRI in a query."""
+        return u"<" + self.value + u">"
+
+class Literal :
+    """
+    A literal to be bound in a L{PreparedQuery}, possibly with a language tag or a datatype.
+
+    @ivar value: the lexical form of the literal
+    @ivar lang: the language tag, or C{None}
+    @ivar datatype: the datatype IRI, or C{None}
+    """
+    def __init__(self, value, lang=None, datatype=None) :
+        """
+        @param value: the lexical form of the literal
+        @type value: string
+        @param lang: the language tag (eg, C{"en"})
+        @type lang: string
+        @param datatype: the datatype IRI (eg, C{"http://www.w3.org/2001/XMLSchema#date"})
+        @type datatype: string
+        @raise ValueError: if both a language and a datatype are given, or if either is invalid
+        """
+        if lang is not None and datatype is not None :
+            raise ValueError("a literal cannot have both a language tag and a datatype")
+        if lang is not None and not _LANGTAG.match(lang) :
+            raise ValueError("invalid language tag: %r" % lang)
+        if datatype is not None :
+            datatype = _text(datatype)
+            _checkIRI(datatype)
+        self.value = _text(value)
+        self.lang = lang
+        self.datatype = datatype
+
+    def n3(self) :
+        """Serialization of the literal in a query."""
+        literal = u'"' + _ESCAPE.sub(lambda match : _ESCAPES[match.group()], self.value) + u'"'
+        if self.lang is not None :
+            return literal + u"@" + self.lang
+        if self.datatype is not None :
+            return literal + u"^^<" + self.datatype + u">"
+        return literal
+
+_IRI_CHARACTERS = re.compile(r'^[^<>"{}|^`\\\x00-\x20]*$')
+_LANGTAG = re.compile(r"^[a-zA-Z]+(-[a-zA-Z0-9]+)*$")
+_ESCAPE = re.compile(r'["\\\n\r\t\b\f]')
+_ESCAPES = { '"' : r'\"', "\\" : r"\\", "\n" : r"\n", "\r" : r"\r", "\t" : r"\t", "\b" : r"\b", "\f" : r"\f" }
+
+def _text(value) :
+    # byte strings are taken as UTF-8
+    if isinstance(value, bytes) :
+        return value.decode("utf-8")
+    return value
+
+def _checkIRI(value) :
+    if not _IRI_CHARACTERS.match(value) :
+        raise ValueError("invalid IRI: %r" % value)
+
+def term(value) :
+    """
+    Serialize a value as an RDF term of a query; see the module description for the possible values.
+    @param value: the value
+    @rtype: string
+    @raise ValueError: if the value is not valid (eg, an IRI with a space)
+    @raise TypeError: if the value cannot be serialized as an RDF term
+    """
+    if isinstance(value, (IRI, Literal)) :
+        return value.n3()
+    if isinstance(value, bool) :
+        return value and u"true" or u"false"
+    if isinstance(value, (int, long)) :
+        return unicode(value)
+    if isinstance(value, float) :
+        if value != value :
+            lexical = u"NaN"
+        elif value in (float("inf"), float("-inf")) :
+            lexical = value > 0 and u"INF" or u"-INF"
+        else :
+            lexical = repr(value)
+        return Literal(lexical, datatype=_XSD + "double").n3()
+    if isinstance(value, decimal.Decimal) :
+        return Literal(unicode(value), datatype=_XSD + "decimal").n3()
+    # datetime is a subclass of date
+    if isinstance(value, datetime.datetime) :
+        return Literal(value.isoformat(), datatype=_XSD + "dateTime").n3()
+    if isinstance(value, datetime.date) :
+        return Literal(value.isoformat(), datatype=_XSD + "date").n3()
+    if isinstance(value, (bytes, unicode)) :
+        return Literal(value).n3()
+    # a Value of the results of a query
+    kind = getattr(value, "type", None)
+    if kind == "uri" :
+        return IRI(value.value).n3()
+    if kind in ("literal", "typed-literal") :
+        # language tagged literals may come with the rdf:langString datatype
+        return Literal(value.value, value.lang, None if value.lang else value.datatype).n3()
+    raise TypeError("cannot bind %r in a query" % (value,))
+
+#######################################################################################################
+
+class _Template :
+    """The result of the analysis of a query template: its text split around the placeholders."""
+    def __init__(self, template) :
+        self.segments, self.names = self._split(template)
+        # minifying keeps the variables (and their order)
+        self.minifiedSegments = self._split(minify(template))[0]
+        self.placeholders = frozenset(self.names)
+
+    def _split(self, template) :
+        segments = [[]]
+        names = []
+        for kind, text in tokenize(template) :
+            if kind == VAR and text.startswith("$") :
+                names.append(text[1:])
+                segments.append([])
+            else :
+                segments[-1].append(text)
+        return [u"".join(segment) for segment in segments], names
+
+def _analyse(template) :
+    result = _templates.get(template)
+    if result is None :
+        if len(_templates) >= _TEMPLATES_SIZE :
+            _templates.clear()
+        result = _templates[template] = _Template(template)
+    return result
+
+_templates = {}
+_TEMPLATES_SIZE = 1024
+
+class PreparedQuery :
+    """
+    A query template, analysed once, into which values are bound to get the L{QueryRequest<SPARQLWrapper.Wrapper.QueryRequest>}
+    of each query. Prepared queries are created via L{SPARQLWrapper.prepare<SPARQLWrapper.Wrapper.SPARQLWrapper.prepare>};
+    they are immutable, and can be shared between threads.
+
+    @ivar template: the query template
+    @ivar queryType: the query type (L{SELECT<SPARQLWrapper.Wrapper.SELECT>}, L{ASK<SPARQLWrapper.Wrapper.ASK>}, ...)
+    @ivar placeholders: the names of the placeholders
+    @type placeholders: frozenset
+    @ivar prototype: the request the bound requests are copies of, with the settings (return format, method, etc) of the wrapper
+    @type prototype: L{QueryRequest<SPARQLWrapper.Wrapper.QueryRequest>}
+    """
+    def __init__(self, template, prototype, minified=True) :
+        """
+        @param template: the query template
+        @type template: string
+        @param prototype: the request the bound requests are copies of; its query type is the one of the template
+        @type prototype: L{QueryRequest<SPARQLWrapper.Wrapper.QueryRequest>}
+        @param minified: whether the bound queries are minified (see
+        L{SPARQLWrapper.setMinifyQueries<SPARQLWrapper.Wrapper.SPARQLWrapper.setMinifyQueries>}); if so, the template
+        is minified once, instead of each query
+        """
+        self.template = template
+        self.prototype = prototype
+        self.queryType = prototype.queryType
+        self._analysis = _analyse(_text(template))
+        self.placeholders = self._analysis.placeholders
+        self._minified = minified
+
+    def text(self, **values) :
+        """
+        Return the query text, with the values bound to the placeholders.
+        @keyword values: the values, by placeholder name; see the module description for the possible values
+        @rtype: string
+        @raise ValueError: if a placeholder is not bound, if there is no placeholder of a given name, or if a value is not valid
+        @raise TypeError: if a value cannot be serialized as an RDF term
+        """
+        unknown = set(values) - self.placeholders
+        if unknown :
+            raise ValueError("no such placeholder: %s" % ", ".join(sorted(unknown)))
+        missing = self.placeholders - set(values)
+        if missing :
+            raise ValueError("unbound placeholder: %s" % ", ".join(sorted(missing)))
+        terms = dict((name, term(value)) for name, value in values.items())
+        analysis = self._analysis
+        if self._minified :
+            segments = analysis.minifiedSegments
+        else :
+            segments = analysis.segments
+        parts = [segments[0]]
+        for name, segment in zip(analysis.names, segments[1:]) :
+            parts.append(terms[name])
+            parts.append(segment)
+        if self._minified :
+            return Minified(u"".join(parts))
+        return u"".join(parts)
+
+    def bind(self, **values) :
+        """
+        Return the request of the query, with the values bound to the placeholders; it can be run via
+        L{SPARQLWrapper.execute<SPARQLWrapper.Wrapper.SPARQLWrapper.execute>}.
+        @keyword values: the values, by placeholder name; see the module description for the possible values
+        @rtype: L{QueryRequest<SPARQLWrapper.Wrapper.QueryRequest>}
+        @raise ValueError: if a placeholder is not bound, if there is no placeholder of a given name, or if a value is not valid
+        @raise TypeError: if a value cannot be serialized as an RDF term
+        """
+        return self.prototype.replace(queryString=self.text(**values), queryType=self.queryType)
+
+    def __repr__(self) :
+        return "<PreparedQuery %s %s>" % (self.queryType, ", ".join(sorted(self.placeholders)))
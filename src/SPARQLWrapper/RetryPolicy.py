@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+"""
+Handling of transient endpoint failures: retries with exponential backoff (L{RetryPolicy}) and fail fast
+protection of endpoints that are down (L{CircuitBreaker}).
+
+@authors: U{Ivan Herman<http://www.ivan-herman.net>}, U{Sergio Fernández<http://www.wikier.org>}, U{Carlos Tejo Alonso<http://www.dayures.net>}
+@organization: U{World Wide Web Consortium<http://www.w3.org>} and U{Foundation CTIC<http://www.fundacionctic.org/>}.
+@license: U{W3C® SOFTWARE NOTICE AND LICENSE<href="http://www.w3.org/Consortium/Legal/copyright-software">}
+"""
+
+import httplib
+import random
+import socket
+import threading
+import time
+import urllib2
+from email.utils import parsedate_tz, mktime_tz
+
+class RetryPolicy :
+    """
+    Decides whether, and after how long, a failed request is retried.
+
+    Transient failures are HTTP responses with one of the C{statusCodes}, connection errors (refused or reset
+    connections, incomplete responses) and timeouts. The delay before the n-th retry is drawn at random between 0
+    and C{min(maxBackoff, backoffFactor * 2**n)} ("full jitter"), so that many clients failing at the same time do
+    not retry in lock step. If the response carries a C{Retry-After} header, that delay is used instead; if it is
+    longer than C{maxBackoff}, the request is not retried at all.
+
+    @ivar maxRetries: maximum number of retries (not counting the first attempt)
+    @type maxRetries: int
+    @ivar backoffFactor: base delay, in seconds
+    @type backoffFactor: float
+    @ivar maxBackoff: maximum delay between two attempts, in seconds
+    @type maxBackoff: float
+    @ivar jitter: whether the delay is randomized
+    @type jitter: bool
+    @ivar statusCodes: HTTP status codes considered transient
+    @ivar retryUpdates: whether update operations (which may not be idempotent) are retried too
+    @type retryUpdates: bool
+    """
+    def __init__(self, maxRetries=3, backoffFactor=0.5, maxBackoff=30.0, jitter=True, statusCodes=(500, 502, 503, 504), retryUpdates=False) :
+        """
+        @param maxRetries: maximum number of retries
+        @param backoffFactor: base delay, in seconds
+        @param maxBackoff: maximum delay between two attempts, in seconds
+        @param jitter: whether the delay is randomized
+        @param statusCodes: HTTP status codes considered transient
+        @param retryUpdates: whether update operations are retried too
+        """
+        self.maxRetries = maxRetries
+        self.backoffFactor = backoffFactor
+        self.maxBackoff = maxBackoff
+        self.jitter = jitter
+        self.statusCodes = frozenset(statusCodes)
+        self.retryUpdates = retryUpdates
+
+    def isTransient(self, error) :
+        """
+        Tell whether an error is a transient failure of the endpoint.
+        @param error: the exception raised by the request
+        @rtype: bool
+        """
+        if isinstance(error, urllib2.HTTPError) :
+            return error.code in self.statusCodes
+        return isinstance(error, (urllib2.URLError, socket.error, socket.timeout, httplib.HTTPException))
+
+    def delay(self, attempt, error=None) :
+        """
+        Return the number of seconds to wait before the retry number C{attempt} (starting at 0), or C{None}
+        if the request should not be retried because of the C{Retry-After} header of the error.
+        @param attempt: number of the retry
+        @type attempt: int
+        @param error: the exception raised by the last attempt
+        @rtype: float
+        """
+        retryAfter = self._retryAfter(error)
+        if retryAfter is not None :
+            if retryAfter > self.maxBackoff :
+                return None
+            return retryAfter
+        backoff = min(self.maxBackoff, self.backoffFactor * (2 ** attempt))
+        if self.jitter :
+            return random.uniform(0, backoff)
+        return backoff
+
+    def _retryAfter(self, error) :
+        """The delay requested by the C{Retry-After} header of an HTTP error (in seconds or as a date), if any."""
+        headers = getattr(error, "hdrs", None)
+        if headers is None :
+            return None
+        value = headers.get("Retry-After")
+        if not value :
+            return None
+        value = value.strip()
+        if value.isdigit() :
+            return float(value)
+        date = parsedate_tz(value)
+        if date is None :
+            return None
+        return max(0.0, mktime_tz(date) - time.time())
+
+#######################################################################################################
+
+class CircuitBreaker :
+    """
+    Circuit breaker for a single endpoint. After C{failureThreshold} consecutive transient failures the circuit
+    "opens": requests are refused right away, without contacting the endpoint, for C{recoveryTimeout} seconds. Then
+    a single trial request is let through ("half open" state); its success closes the circuit again, its failure
+    opens it for another C{recoveryTimeout} seconds.
+
+    @ivar failureThreshold: number of consecutive failures opening the circuit
+    @type failureThreshold: int
+    @ivar recoveryTimeout: number of seconds the circuit stays open
+    @type recoveryTimeout: float
+    """
+    CLOSED    = "closed"
+    OPEN      = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failureThreshold=5, recoveryTimeout=30.0) :
+        """
+        @param failureThreshold: number of consecutive failures opening the circuit
+        @param recoveryTimeout: number of seconds the circuit stays open
+        """
+        self.failureThreshold = failureThreshold
+        self.recoveryTimeout = recoveryTimeout
+        self.state = CircuitBreaker.CLOSED
+        self._failures = 0
+        self._openedAt = 0
+        self._lock = threading.Lock()
+
+    def allow(self) :
+        """
+        Tell whether a request may be sent to the endpoint now.
+        @rtype: bool
+        """
+        self._lock.acquire()
+        try :
+            if self.state == CircuitBreaker.CLOSED :
+                return True
+            if self.state == CircuitBreaker.OPEN and time.time() - self._openedAt >= self.recoveryTimeout :
+                # let one trial request through
+                self.state = CircuitBreaker.HALF_OPEN
+                return True
+            return False
+        finally :
+            self._lock.release()
+
+    def retryIn(self) :
+        """Number of seconds before the next trial request is allowed."""
+        return max(0.0, self._openedAt + self.recoveryTimeout - time.time())
+
+    def recordSuccess(self) :
+        """Record a request answered by the endpoint; closes the circuit."""
+        self._lock.acquire()
+        try :
+            self._failures = 0
+            self.state = CircuitBreaker.CLOSED
+        finally :
+            self._lock.release()
+
+    def release(self) :
+        """Record a request aborted before the endpoint answered: if it was the trial request, the circuit opens
+        again, without a new C{recoveryTimeout}, so that the next request is the trial."""
+        self._lock.acquire()
+        try :
+            if self.state == CircuitBreaker.HALF_OPEN :
+                self.state = CircuitBreaker.OPEN
+        finally :
+            self._lock.release()
+
+    def recordFailure(self) :
+        """Record a transient failure of the endpoint; may open the circuit."""
+        self._lock.acquire()
+        try :
+            self._failures += 1
+            if self.state == CircuitBreaker.HALF_OPEN or self._failures >= self.failureThreshold :
+                self.state = CircuitBreaker.OPEN
+                self._openedAt = time.time()
+        finally :
+            self._lock.release()
@@ -44,3 +44,17 @@ class EndPointNotFound(SPARQLWrapperException):
 
     msg = "it was impossible to connect with the endpoint in that address, check if it is correct"
 
+
+class EndPointUnavailable(SPARQLWrapperException):
+    """
+    End Point Unavailable exceptions, raised without contacting an endpoint that failed repeatedly
+    """
+
+    msg = "the endpoint failed repeatedly and is not queried for the time being"
+
+class QueryTimeout(SPARQLWrapperException):
+    """
+    Query Timeout exceptions, raised when the response is not complete within the time limit of the query
+    """
+
+    msg = "the query did not complete within its time limit"
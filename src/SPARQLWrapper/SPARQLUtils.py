@@ -10,7 +10,10 @@ SPARQL Wrapper Utils
 
 """
 
+import sys
+import threading
 import warnings
+import Queue
 
 def deprecated(func):
     """
@@ -27,3 +30,77 @@ def deprecated(func):
     newFunc.__dict__.update(func.__dict__)
     return newFunc
 
+
+def threadedMap(function, items, maxWorkers=4, ordered=True):
+    """
+        Apply a function to each item on a bounded pool of threads, yielding C{(index, result)} pairs,
+        C{index} being the position of the item in C{items}. Items are taken from C{items} lazily, so
+        long (or endless) iterables are fine; at most C{2*maxWorkers} of them are in flight at a time.
+        If the function raises an exception for an item, the exception is re-raised by the generator.
+        Closing the generator early stops the threads after their current item.
+
+        @param function: callable with one argument
+        @param items: iterable of the arguments
+        @param maxWorkers: number of threads
+        @type maxWorkers: int
+        @param ordered: if C{True}, the results are yielded in the order of C{items}, otherwise as they are completed
+        @type ordered: bool
+    """
+    maxWorkers = max(1, maxWorkers)
+    tasks = Queue.Queue()
+    results = Queue.Queue()
+    stopped = threading.Event()
+
+    def worker():
+        while True:
+            task = tasks.get()
+            if task is None or stopped.is_set():
+                return
+            index, item = task
+            try:
+                results.put((index, True, function(item)))
+            except:
+                results.put((index, False, sys.exc_info()))
+
+    threads = []
+    for i in range(maxWorkers):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    items = iter(items)
+    exhausted = False
+    submitted = 0
+    pending = 0
+    nextIndex = 0
+    done = {}
+    try:
+        while True:
+            # in ordered mode the results waiting for a slower predecessor count as in flight, too
+            while not exhausted and (submitted - nextIndex if ordered else pending) < 2 * maxWorkers:
+                try:
+                    item = items.next()
+                except StopIteration:
+                    exhausted = True
+                    break
+                tasks.put((submitted, item))
+                submitted += 1
+                pending += 1
+            if pending == 0:
+                break
+            index, ok, value = results.get()
+            pending -= 1
+            if not ok:
+                raise value[0], value[1], value[2]
+            if ordered:
+                done[index] = value
+                while nextIndex in done:
+                    yield (nextIndex, done.pop(nextIndex))
+                    nextIndex += 1
+            else:
+                yield (index, value)
+    finally:
+        stopped.set()
+        for thread in threads:
+            tasks.put(None)
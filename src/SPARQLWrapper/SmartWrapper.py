@@ -10,6 +10,14 @@
 
 import SPARQLWrapper
 from SPARQLWrapper.Wrapper import JSON, SELECT
+from SPARQLWrapper.SPARQLUtils import threadedMap
+from SPARQLWrapper.Tokenizer import tokenize, minify, Minified, WS, COMMENT, VAR, PUNCT, NAME, NUMBER
+from SPARQLWrapper.PreparedQuery import term, IRI, Literal
+from SPARQLWrapper import Columns
+import sys
+import itertools
+import threading
+import Queue
 import urllib2
 from types import *
 
@@ -83,11 +91,27 @@ class Bindings :
     C{var in res.bindings[..]}, for example.)
     @ivar askResult: by default, set to False; in case of an ASK query, the result of the query
     @type askResult: Boolean
+
+    Lazy instances (see L{SPARQLWrapper2.streamQuery}) read the results while their C{bindings} are iterated over: the
+    C{bindings} attribute is then a generator, which can be consumed once only, and C{fullResult} is C{None}. The
+    operators (C{key in obj}, C{obj[key]}) and L{getValues} need the bindings as a list, hence a non lazy instance.
     """
-    def __init__(self,retval) :
+    def __init__(self,retval,lazy=False) :
         """
         @param retval: the query result, instance of a L{Wrapper.QueryResult}
+        @param lazy: whether the results are read incrementally, while the bindings are iterated over (see the
+        L{Streaming<SPARQLWrapper.Streaming>} module), instead of being read and converted at once
+        @type lazy: Boolean
         """
+        if lazy :
+            reader = retval.stream()
+            self._reader = reader
+            self.fullResult = None
+            self.head = reader.head
+            self.variables = reader.variables
+            self.bindings = self._lazyBindings(reader)
+            self.askResult = reader.boolean or False
+            return
         self.fullResult  = retval._convertJSON()
         self.head        = self.fullResult['head']
         self.variables   = None
@@ -116,6 +140,36 @@ class Bindings :
         except :
             pass
 
+    def _lazyBindings(self, reader) :
+        """Generator of the bindings of a lazy instance (see the class description)."""
+        for b in reader :
+            variables = self.variables
+            if variables is None :
+                # the head comes after the solutions
+                variables = b.keys()
+            yield dict((key, Value(key, b[key])) for key in variables if key in b)
+        self.head = reader.head
+        self.variables = reader.variables
+
+    def toColumns(self) :
+        """Return the bindings as a column per variable, eg, NumPy arrays for numbers and dates; see the
+        L{Columns<SPARQLWrapper.Columns>} module for the details. The columns of a lazy instance are built from the
+        solutions not iterated over yet, without creating their L{Value} instances. Requires NumPy.
+        @return: the columns, by variable
+        @rtype: C{OrderedDict}
+        @raise ImportError: if NumPy is not installed
+        """
+        if self.fullResult is None :
+            return Columns.columns(self._reader)
+        return Columns.columns(self.fullResult.get('results', {}).get('bindings', []), self.variables or [])
+
+    def toDataFrame(self) :
+        """Return the bindings as a pandas data frame, via L{toColumns}. Requires NumPy and pandas.
+        @rtype: C{pandas.DataFrame}
+        @raise ImportError: if NumPy or pandas is not installed
+        """
+        return Columns.dataFrame(self.toColumns())
+
     def getValues(self,key) :
         """A shorthand for the retrieval of all bindings for a single key. It is
         equivalent to "C{[b[key] for b in self[key]]}"
@@ -273,6 +327,44 @@ class SPARQLWrapper2(SPARQLWrapper.SPARQLWrapper) :
         else :
             return res
 
+    def execute(self, request) :
+        """
+            Execute a L{QueryRequest<SPARQLWrapper.Wrapper.QueryRequest>} and do an automatic conversion, like L{query}.
+            The return format of the request should be L{JSON<Wrapper.JSON>}.
+
+            @param request: the request to execute
+            @type request: L{QueryRequest<SPARQLWrapper.Wrapper.QueryRequest>}
+            @return: query result
+            @rtype: L{Bindings} instance for a SELECT query, L{QueryResult<SPARQLWrapper.Wrapper.QueryResult>} otherwise
+        """
+        res = SPARQLWrapper.SPARQLWrapper.execute(self, request)
+        if request.queryType == SELECT :
+            return Bindings(res)
+        else :
+            return res
+
+    def streamQuery(self, request=None) :
+        """
+            Execute a SELECT query and return lazy L{Bindings}: the results are read while the bindings are iterated
+            over, one solution at a time, so that the memory used does not depend on the number of results. Eg::
+
+                for binding in sparql.streamQuery().bindings :
+                    print binding["label"].value
+
+            @param request: the request to execute, by default the one of the current settings of this instance (see
+            L{createQueryRequest<SPARQLWrapper.Wrapper.SPARQLWrapper.createQueryRequest>}); the results of a request
+            asking for L{XML<Wrapper.XML>} (eg, for an endpoint without JSON support) are streamed as well
+            @type request: L{QueryRequest<SPARQLWrapper.Wrapper.QueryRequest>}
+            @return: query result
+            @rtype: L{Bindings} instance
+            @raise ValueError: if the query is not a SELECT query, or its results are not valid
+        """
+        if request is None :
+            request = self.createQueryRequest()
+        if request.queryType != SELECT :
+            raise ValueError("only the results of SELECT queries can be streamed")
+        return Bindings(SPARQLWrapper.SPARQLWrapper.execute(self, request), lazy=True)
+
     def queryAndConvert(self) :
         """This is here to override the inherited method; it is equivalent to L{query}.
 
@@ -286,3 +378,406 @@ class SPARQLWrapper2(SPARQLWrapper.SPARQLWrapper) :
         else :
             return SPARQLWrapper.SPARQLWrapper.queryAndConvert(self)
 
+    def batchLookup(self, template, variable, keys, batchSize=100, maxWorkers=1) :
+        """
+            Run a SELECT query for many values of one of its variables, C{batchSize} values at a time: the values are
+            put in a C{VALUES} block at the start of the C{WHERE} clause, and the results of each batch are
+            dispatched back to the values they are about. Eg::
+
+                labels = dict(sparql.batchLookup("SELECT ?item ?label WHERE { ?item rdfs:label ?label }", "item",
+                                                 [IRI(uri) for uri in uris]))
+
+            runs one query for each hundred URIs instead of one query per URI. The query must select the lookup
+            variable. The current settings of this instance (custom parameters, credentials, etc) are used.
+
+            @param template: the SELECT query
+            @type template: string
+            @param variable: the name of the lookup variable (without C{?})
+            @type variable: string
+            @param keys: iterable of the values of the variable; they can be anything that can be bound in a prepared
+            query (see the L{PreparedQuery<SPARQLWrapper.PreparedQuery>} module), eg, L{IRI<SPARQLWrapper.PreparedQuery.IRI>}
+            instances. A result is dispatched to a key if the value of the variable is the same RDF term (literals are
+            compared by lexical form).
+            @param batchSize: number of values per query
+            @type batchSize: int
+            @param maxWorkers: number of queries running at the same time
+            @type maxWorkers: int
+            @return: generator of C{(key, bindings)} pairs, once per distinct key, in the order of the keys; C{bindings}
+            being the list of the bindings (dictionaries mapping variables to L{Value} instances) of the key
+            @raise ValueError: if the query is not a SELECT query, or does not use the variable
+        """
+        prototype = self.createQueryRequest(template)
+        if prototype.queryType != SELECT :
+            raise ValueError("batch lookups need a SELECT query")
+        if self._minifyQueries :
+            head, tail = _splitWhereClause(minify(template), variable)
+        else :
+            head, tail = _splitWhereClause(template, variable)
+
+        def run(batch) :
+            values = u" ".join(term(key) for lookupTerm, key in batch)
+            query = u"%sVALUES ?%s{%s}%s" % (head, variable, values, tail)
+            if self._minifyQueries :
+                query = Minified(query)
+            results = self.execute(prototype.replace(queryString=query, queryType=SELECT))
+            if variable not in (results.variables or ()) :
+                raise ValueError("the query does not select ?%s" % variable)
+            dispatched = dict((lookupTerm, []) for lookupTerm, key in batch)
+            for binding in results.bindings :
+                if variable in binding :
+                    found = dispatched.get(_lookupTerm(binding[variable]))
+                    if found is not None :
+                        found.append(binding)
+            return [(key, dispatched[lookupTerm]) for lookupTerm, key in batch]
+
+        if maxWorkers > 1 :
+            batches = (results for index, results in threadedMap(run, _batches(keys, batchSize), maxWorkers))
+        else :
+            batches = (run(batch) for batch in _batches(keys, batchSize))
+        for results in batches :
+            for result in results :
+                yield result
+
+    def iterate(self, query, pageSize=1000, prefetch=True) :
+        """
+            Run a SELECT query page by page, with C{LIMIT} and C{OFFSET}, and yield the bindings of its results one by
+            one; endpoints capping the number of results of a query (eg, the C{ResultSetMaxRows} of Virtuoso) can
+            thus be read completely. Eg::
+
+                for binding in sparql.iterate("SELECT ?s ?label WHERE { ?s rdfs:label ?label }") :
+                    print binding["label"].value
+
+            Paging needs a stable order of the results: if the query has no C{ORDER BY} clause, one is added, on the
+            selected variables. A C{LIMIT} or C{OFFSET} of the query is respected: the pages cover that slice of the
+            results only. The current settings of this instance (custom parameters, credentials, etc) are used.
+
+            If the endpoint caps the number of results below C{pageSize}, the pages come back shorter than asked for:
+            a short response is only taken as the end of the results if it is shorter than the longest one received
+            so far (or empty), otherwise the rest of the page is asked for. Paging is most efficient with a
+            C{pageSize} not above the cap of the endpoint.
+
+            @param query: the SELECT query
+            @type query: string
+            @param pageSize: number of results per query
+            @type pageSize: int
+            @param prefetch: if C{True}, the next page is requested in the background while the current one is consumed
+            @type prefetch: bool
+            @return: generator of bindings, ie, dictionaries mapping variables to L{Value} instances
+            @raise ValueError: if the query is not a SELECT query
+        """
+        fetch = self._pageFetcher(query, pageSize)
+        page = 0
+        current = _Fetch(fetch, page, background=False)
+        while True :
+            bindings = current.result()
+            last = bindings and bindings[-1] is None
+            if last :
+                bindings.pop()
+            elif bindings :
+                # the next page is fetched while the current one is consumed
+                page += 1
+                current = _Fetch(fetch, page, background=prefetch)
+            for binding in bindings :
+                yield binding
+            if last or not bindings :
+                return
+
+    def _pageFetcher(self, query, pageSize) :
+        """
+            Internal method returning a function fetching a page of the results of a SELECT query (see L{iterate}).
+            The function takes the number of the page, from 0, and returns the list of its bindings; the last page
+            ends with C{None}.
+            @raise ValueError: if the query is not a SELECT query
+        """
+        prototype = self.createQueryRequest(query)
+        if prototype.queryType != SELECT :
+            raise ValueError("only SELECT queries can be paged")
+        if self._minifyQueries :
+            paged = _PagedQuery(minify(query))
+        else :
+            paged = _PagedQuery(query)
+
+        # the largest number of results of a response: the endpoint does not cap the responses below it
+        largest = [0]
+
+        def fetch(page) :
+            offset = paged.offset + page * pageSize
+            limit = pageSize
+            if paged.limit is not None :
+                limit = min(pageSize, paged.limit - page * pageSize)
+            bindings = []
+            while len(bindings) < limit :
+                text = paged.text(limit - len(bindings), offset + len(bindings))
+                if self._minifyQueries :
+                    text = Minified(text)
+                received = self.execute(prototype.replace(queryString=text, queryType=SELECT)).bindings
+                bindings.extend(received)
+                if not received or len(received) < largest[0] :
+                    # not capped: the last page
+                    bindings.append(None)
+                    break
+                # short, but maybe capped by the endpoint: the rest of the page is asked for
+                largest[0] = max(largest[0], len(received))
+            return bindings
+        return fetch
+
+    def scan(self, query, partitions=4, variable=None, pageSize=1000, prefetch=True) :
+        """
+            Read all the results of a SELECT query with several queries running at the same time, and yield their
+            bindings one by one, like L{iterate}. The results are split in C{partitions} disjoint parts:
+
+             - by default, into pages (see L{iterate}), C{partitions} of them being read at the same time; the bindings
+             are yielded in the order of the pages, ie, in the same order as by L{iterate};
+             - if C{variable} is given, by the hash of the value of that variable: each partition is the query with a
+             C{FILTER} on the first hexadecimal digits of the C{MD5} of the value, read page by page. The partitions
+             have about the same size whatever the values, and their queries are independent: the endpoint can run
+             them on several cores without computing the whole result first, as it may have to do for large C{OFFSET}s.
+             The bindings are yielded as they arrive, the partitions being interleaved. The variable should be bound in
+             all the solutions (the solutions where it is not are in none of the partitions), and the endpoint should
+             support SPARQL 1.1.
+
+            @param query: the SELECT query
+            @type query: string
+            @param partitions: number of partitions, ie, of queries running at the same time
+            @type partitions: int
+            @param variable: the name of the partitioning variable (without C{?}), or C{None} to partition by page
+            @type variable: string
+            @param pageSize: number of results per query
+            @type pageSize: int
+            @param prefetch: if C{True}, each partition requests its next page while the current one is consumed
+            (partitions by hash only)
+            @type prefetch: bool
+            @return: generator of bindings, ie, dictionaries mapping variables to L{Value} instances
+            @raise ValueError: if the query is not a SELECT query, or does not use the variable
+        """
+        partitions = max(1, partitions)
+        if variable is None :
+            fetch = self._pageFetcher(query, pageSize)
+            for page, bindings in threadedMap(fetch, itertools.count(), partitions) :
+                last = bindings and bindings[-1] is None
+                if last :
+                    bindings.pop()
+                for binding in bindings :
+                    yield binding
+                if last or not bindings :
+                    return
+        else :
+            if self._minifyQueries :
+                query = minify(query)
+            head, tail = _splitWhereClause(query, variable)
+            queries = [u"%sFILTER(SUBSTR(MD5(STR(?%s)),1,%d) IN(%s))%s" % (head, variable, len(buckets[0]), u",".join(u'"%s"' % bucket for bucket in buckets), tail)
+                       for buckets in _hashBuckets(partitions)]
+            for binding in _merge([self.iterate(partition, pageSize, prefetch) for partition in queries], pageSize) :
+                yield binding
+
+##############################################################################################################
+
+_XSD = "http://www.w3.org/2001/XMLSchema#"
+
+def _lookupTerm(value) :
+    """The serialization of a lookup key or of a L{Value}, the same for the same RDF terms."""
+    if isinstance(value, bool) :
+        value = Literal(value and "true" or "false", datatype=_XSD + "boolean")
+    elif isinstance(value, (int, long)) :
+        value = Literal(unicode(value), datatype=_XSD + "integer")
+    if isinstance(value, (Literal, Value)) and getattr(value, "type", "literal") != Value.URI :
+        # plain literals are xsd:string literals, and language tags are case insensitive
+        if value.lang :
+            return Literal(value.value, lang=value.lang.lower()).n3()
+        if value.datatype == _XSD + "string" :
+            return Literal(value.value).n3()
+        return Literal(value.value, datatype=value.datatype).n3()
+    try :
+        return term(value)
+    except (TypeError, ValueError) :
+        # eg, a blank node
+        return None
+
+def _batches(keys, batchSize) :
+    """Split the distinct keys into lists of at most C{batchSize} C{(lookupTerm, key)} pairs."""
+    seen = set()
+    batch = []
+    for key in keys :
+        lookupTerm = _lookupTerm(key)
+        if lookupTerm is None :
+            raise TypeError("cannot look up %r" % (key,))
+        if lookupTerm in seen :
+            continue
+        seen.add(lookupTerm)
+        batch.append((lookupTerm, key))
+        if len(batch) == batchSize :
+            yield batch
+            batch = []
+    if batch :
+        yield batch
+
+def _splitWhereClause(query, variable) :
+    """Split a SELECT query right after the opening brace of its C{WHERE} clause."""
+    tokens = list(tokenize(query))
+    if (VAR, "?" + variable) not in tokens and (VAR, "$" + variable) not in tokens :
+        raise ValueError("the query does not use ?%s" % variable)
+    if (PUNCT, "{") not in tokens :
+        raise ValueError("no WHERE clause in the query")
+    split = tokens.index((PUNCT, "{")) + 1
+    return u"".join(text for kind, text in tokens[:split]), u"".join(text for kind, text in tokens[split:])
+
+class _PagedQuery :
+    """
+    A SELECT query taken apart for paging: its text without C{LIMIT} and C{OFFSET} (with an C{ORDER BY} clause added
+    if needed), the trailing C{VALUES} clause, and the slice of the results it asks for.
+
+    @ivar limit: the C{LIMIT} of the query, or C{None}
+    @ivar offset: the C{OFFSET} of the query, or 0
+    """
+    def __init__(self, query) :
+        tokens = list(tokenize(query))
+        significant = [i for i, (kind, text) in enumerate(tokens) if kind not in (WS, COMMENT)]
+        braces = [i for i in significant if tokens[i] == (PUNCT, "{")]
+        if not braces :
+            raise ValueError("no WHERE clause in the query")
+
+        # the variables of the SELECT clause
+        selected = []
+        depth = 0
+        everything = False
+        previous = None
+        for i in significant :
+            if i == braces[0] :
+                break
+            kind, text = tokens[i]
+            if text == "(" :
+                depth += 1
+            elif text == ")" :
+                depth -= 1
+            elif text == "*" and depth == 0 :
+                everything = True
+            elif kind == VAR and (depth == 0 or previous == "AS") and text[1:] not in selected :
+                selected.append(text[1:])
+            previous = text.upper()
+        if everything :
+            selected = []
+            for kind, text in tokens :
+                if kind == VAR and text[1:] not in selected :
+                    selected.append(text[1:])
+
+        # the solution modifiers follow the WHERE clause
+        depth = 0
+        for position, i in enumerate(significant) :
+            if tokens[i] == (PUNCT, "{") :
+                depth += 1
+            elif tokens[i] == (PUNCT, "}") :
+                depth -= 1
+                if depth == 0 and i > braces[0] :
+                    break
+        modifiers = significant[position + 1:]
+        self.limit = None
+        self.offset = 0
+        removed = set()
+        valuesAt = len(tokens)
+        ordered = False
+        for position, i in enumerate(modifiers) :
+            kind, text = tokens[i]
+            keyword = text.upper() if kind == NAME else None
+            if keyword == "VALUES" :
+                valuesAt = i
+                break
+            if keyword in ("LIMIT", "OFFSET") and position + 1 < len(modifiers) and tokens[modifiers[position + 1]][0] == NUMBER :
+                number = int(tokens[modifiers[position + 1]][1])
+                if keyword == "LIMIT" :
+                    self.limit = number
+                else :
+                    self.offset = number
+                removed.update(range(i - 1 if tokens[i - 1][0] == WS else i, modifiers[position + 1] + 1))
+            elif keyword == "ORDER" :
+                ordered = True
+        # up to the last token of the modifiers, ie, without a trailing comment
+        last = max(i for i in significant if i < valuesAt)
+        self.body = u"".join(text for i, (kind, text) in enumerate(tokens[:last + 1]) if i not in removed)
+        if not ordered and selected :
+            self.body += u" ORDER BY " + u" ".join("?" + variable for variable in selected)
+        self.values = u"".join(text for kind, text in tokens[valuesAt:])
+        if self.values :
+            self.values = u" " + self.values
+
+    def text(self, limit, offset) :
+        """The text of the query for the given slice of the results."""
+        return u"%s LIMIT %d OFFSET %d%s" % (self.body, limit, offset, self.values)
+
+class _Fetch :
+    """The result of a function call, computed in a background thread or right away."""
+    def __init__(self, function, argument, background=True) :
+        self._function = function
+        self._argument = argument
+        self._result = None
+        self._error = None
+        self._thread = None
+        if background :
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+        else :
+            self._run()
+
+    def _run(self) :
+        try :
+            self._result = self._function(self._argument)
+        except :
+            self._error = sys.exc_info()
+
+    def result(self) :
+        """Wait for the call to be over, and return its result or raise its exception."""
+        if self._thread is not None :
+            self._thread.join()
+        if self._error is not None :
+            raise self._error[0], self._error[1], self._error[2]
+        return self._result
+
+def _hashBuckets(partitions) :
+    """Split the C{16} one digit (or C{256} two digit) hexadecimal prefixes into C{partitions} lists of the same size, or about."""
+    digits = 1 if partitions <= 16 else 2
+    prefixes = ["%0*x" % (digits, i) for i in range(16 ** digits)]
+    return [prefixes[i::partitions] for i in range(min(partitions, len(prefixes)))]
+
+def _merge(iterators, bufferSize=1000) :
+    """
+    Merge iterators, each of them being consumed by a thread of its own, into a single generator; the items are yielded
+    as they arrive. Closing the generator stops the threads.
+    """
+    items = Queue.Queue(bufferSize)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item) :
+        while not stopped.is_set() :
+            try :
+                items.put(item, timeout=0.1)
+                return True
+            except Queue.Full :
+                pass
+        return False
+
+    def consume(iterator) :
+        try :
+            for item in iterator :
+                if not put((True, item)) :
+                    break
+        except :
+            put((False, sys.exc_info()))
+        put((True, done))
+
+    for iterator in iterators :
+        thread = threading.Thread(target=consume, args=(iterator,))
+        thread.daemon = True
+        thread.start()
+    running = len(iterators)
+    try :
+        while running :
+            ok, item = items.get()
+            if not ok :
+                raise item[0], item[1], item[2]
+            if item is done :
+                running -= 1
+            else :
+                yield item
+    finally :
+        stopped.set()
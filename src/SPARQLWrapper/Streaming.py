@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+
+"""
+Incremental readers of SPARQL query results.
+
+A reader parses the response of an endpoint while iterating over it, and yields the solutions of a C{SELECT} query one
+by one, as they arrive: only a solution (and a block of the response) is in memory at a time, whatever the size of the
+results. Readers are created by L{QueryResult.stream<SPARQLWrapper.Wrapper.QueryResult.stream>}; the lazy
+L{Bindings<SPARQLWrapper.SmartWrapper.Bindings>} of L{SPARQLWrapper2.streamQuery<SPARQLWrapper.SmartWrapper.SPARQLWrapper2.streamQuery>}
+are built on them.
+
+The solutions are yielded in the structure of the JSON results format, whatever the format of the response: a
+dictionary per solution, mapping the bound variables to dictionaries with the C{type} (C{uri}, C{literal},
+C{typed-literal} or C{bnode}), C{value} and, possibly, C{xml:lang} or C{datatype} keys.
+
+@authors: U{Ivan Herman<http://www.ivan-herman.net>}, U{Sergio Fernández<http://www.wikier.org>}, U{Carlos Tejo Alonso<http://www.dayures.net>}
+@organization: U{World Wide Web Consortium<http://www.w3.org>} and U{Foundation CTIC<http://www.fundacionctic.org/>}.
+@license: U{W3C® SOFTWARE NOTICE AND LICENSE<href="http://www.w3.org/Consortium/Legal/copyright-software">}
+"""
+
+import re
+import csv
+import codecs
+import json
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+# number of bytes read from the response at a time
+_CHUNK_SIZE = 64 * 1024
+
+class _ResultReader :
+    """
+    Base class of the readers: iterating over a reader yields the solutions; it can be done once only.
+
+    @ivar head: the C{head} of the results (in the structure of the JSON format)
+    @ivar variables: the variables of the results, or C{None}
+    @ivar boolean: the result of an C{ASK} query (known once the reader is created), or C{None}
+    @ivar members: the other members of the results, known once the iteration is over
+    @type members: dict
+    """
+    def __init__(self) :
+        self.head = None
+        self.variables = None
+        self.boolean = None
+        self.members = {}
+        self._solutions = self._parse()
+        # the response is parsed up to the first solution: the head usually comes before
+        self._pending = []
+        try :
+            self._pending.append(next(self._solutions))
+        except StopIteration :
+            pass
+
+    def __iter__(self) :
+        """Return the generator of the solutions (dictionaries mapping the bound variables to their values)."""
+        pending, self._pending = self._pending, []
+        for solution in pending :
+            yield solution
+        for solution in self._solutions :
+            yield solution
+
+    def _parse(self) :
+        """Generator of the solutions, setting the other attributes as they are found; to be defined by subclasses."""
+        raise NotImplementedError
+
+class JSONResultReader(_ResultReader) :
+    """
+    Incremental reader of results in the U{SPARQL JSON format<http://www.w3.org/TR/sparql11-results-json/>}. Iterating
+    over the reader yields the solutions; it can be done once only. The members of the results other than the
+    solutions are decoded as a whole, with the standard C{json} module (rather than the module set via
+    L{jsonlayer<SPARQLWrapper.jsonlayer>}, as an incremental parse needs the C{raw_decode} method of C{json}).
+
+    @ivar head: the C{head} member of the results; it is known once the reader is created, unless the endpoint sends
+    it after the solutions
+    @ivar variables: the variables of the results (the C{vars} member of the C{head}), or C{None}
+    @ivar boolean: the result of an C{ASK} query (known once the reader is created), or C{None}
+    @ivar members: the other members of the results (eg, C{distinct}, C{ordered}), known once the iteration is over
+    @type members: dict
+    """
+    def __init__(self, stream, chunkSize=_CHUNK_SIZE) :
+        """
+        @param stream: file-like object with the response, eg, a C{urllib2} response
+        @param chunkSize: the number of bytes read at a time
+        @type chunkSize: int
+        @raise ValueError: if the beginning of the response is not valid
+        """
+        self._buffer = _Buffer(stream, chunkSize)
+        _ResultReader.__init__(self)
+
+    def _parse(self) :
+        buffer = self._buffer
+        buffer.expect("{")
+        if buffer.skip("}") :
+            return
+        while True :
+            key = buffer.key()
+            if key == "results" :
+                for solution in self._results() :
+                    yield solution
+            else :
+                self._member(key, buffer.value())
+            if not buffer.separator("}") :
+                break
+        buffer.end()
+
+    def _results(self) :
+        buffer = self._buffer
+        buffer.expect("{")
+        if buffer.skip("}") :
+            return
+        while True :
+            key = buffer.key()
+            if key == "bindings" :
+                buffer.expect("[")
+                if not buffer.skip("]") :
+                    while True :
+                        solution = buffer.value()
+                        if not isinstance(solution, dict) :
+                            raise ValueError("invalid SPARQL JSON results: a solution is not an object")
+                        yield solution
+                        if not buffer.separator("]") :
+                            break
+            else :
+                self.members[key] = buffer.value()
+            if not buffer.separator("}") :
+                break
+
+    def _member(self, key, value) :
+        if key == "head" :
+            if not isinstance(value, dict) :
+                raise ValueError("invalid SPARQL JSON results: the head is not an object")
+            self.head = value
+            self.variables = value.get("vars")
+        elif key == "boolean" :
+            self.boolean = value
+        else :
+            self.members[key] = value
+
+_SPARQL_RESULTS = "{http://www.w3.org/2005/sparql-results#}"
+_XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+class XMLResultReader(_ResultReader) :
+    """
+    Incremental reader of results in the U{SPARQL XML format<http://www.w3.org/TR/rdf-sparql-XMLres/>}, parsed with
+    C{ElementTree.iterparse}: the elements of each solution are dropped once it is yielded. Iterating over the reader
+    yields the solutions, in the structure of the JSON format; it can be done once only.
+
+    @ivar head: the C{head} of the results, in the structure of the JSON format (C{vars} and, possibly, C{link})
+    @ivar variables: the variables of the results, or C{None}
+    @ivar boolean: the result of an C{ASK} query (known once the reader is created), or C{None}
+    @ivar members: always empty
+    @type members: dict
+    """
+    def __init__(self, stream) :
+        """
+        @param stream: file-like object with the response, eg, a C{urllib2} response
+        @raise ValueError: if the beginning of the response is not valid
+        """
+        self._stream = stream
+        _ResultReader.__init__(self)
+
+    def _parse(self) :
+        results = None
+        variables = []
+        links = []
+        try :
+            for event, element in ElementTree.iterparse(self._stream, ("start", "end")) :
+                tag = element.tag
+                if event == "start" :
+                    if tag == _SPARQL_RESULTS + "results" :
+                        # the elements of the solutions are removed from it once read
+                        results = element
+                    continue
+                if tag == _SPARQL_RESULTS + "result" :
+                    solution = {}
+                    for binding in element :
+                        if len(binding) :
+                            solution[binding.get("name")] = _xmlValue(binding[0])
+                    if results is not None :
+                        results.clear()
+                    yield solution
+                elif tag == _SPARQL_RESULTS + "variable" :
+                    variables.append(element.get("name"))
+                elif tag == _SPARQL_RESULTS + "link" :
+                    links.append(element.get("href"))
+                elif tag == _SPARQL_RESULTS + "head" :
+                    self.head = { "vars" : variables }
+                    if links :
+                        self.head["link"] = links
+                    self.variables = variables
+                elif tag == _SPARQL_RESULTS + "boolean" :
+                    self.boolean = (element.text or "").strip() == "true"
+        except SyntaxError, e :
+            # ElementTree.ParseError is a subclass of SyntaxError
+            raise ValueError("invalid SPARQL XML results: %s" % e)
+
+def _xmlValue(element) :
+    """The value of a binding (the C{uri}, C{literal} or C{bnode} element), in the structure of the JSON format."""
+    kind = element.tag[len(_SPARQL_RESULTS):]
+    value = { "type" : kind, "value" : unicode(element.text or u"") }
+    if kind == "literal" :
+        datatype = element.get("datatype")
+        if datatype is not None :
+            value["type"] = "typed-literal"
+            value["datatype"] = datatype
+        lang = element.get(_XML_LANG)
+        if lang is not None :
+            value["xml:lang"] = lang
+    return value
+
+_XSD = "http://www.w3.org/2001/XMLSchema#"
+
+class CSVResultReader(_ResultReader) :
+    """
+    Incremental reader of results in the U{SPARQL CSV format<http://www.w3.org/TR/sparql11-results-csv-tsv/>}, parsed
+    with the C{csv} module. The CSV format does not tell IRIs from literals, nor keep the language tags and datatypes:
+    the values are yielded as plain literals, except the blank nodes (written C{_:label}); use the TSV format (see
+    L{TSVResultReader}) for the full RDF terms. Empty values are unbound variables.
+
+    @ivar head: the C{head} of the results, in the structure of the JSON format
+    @ivar variables: the variables of the results
+    @ivar boolean: always C{None} (the format has no C{ASK} results)
+    @ivar members: always empty
+    @type members: dict
+    """
+    def __init__(self, stream) :
+        """
+        @param stream: file-like object with the response, eg, a C{urllib2} response
+        @raise ValueError: if the beginning of the response is not valid
+        """
+        self._stream = stream
+        _ResultReader.__init__(self)
+
+    def _parse(self) :
+        if bytes is str :
+            # the csv module of Python 2 reads bytes
+            rows = (map(_decode, row) for row in csv.reader(self._stream))
+        else :
+            rows = csv.reader(codecs.iterdecode(self._stream, "utf-8"))
+        try :
+            variables = next(rows)
+        except StopIteration :
+            raise ValueError("invalid SPARQL CSV results: no header")
+        except csv.Error, e :
+            raise ValueError("invalid SPARQL CSV results: %s" % e)
+        self.variables = variables
+        self.head = { "vars" : variables }
+        try :
+            for row in rows :
+                solution = {}
+                for variable, value in zip(variables, row) :
+                    if value :
+                        if value.startswith(u"_:") :
+                            solution[variable] = { "type" : "bnode", "value" : value[2:] }
+                        else :
+                            solution[variable] = { "type" : "literal", "value" : value }
+                yield solution
+        except csv.Error, e :
+            raise ValueError("invalid SPARQL CSV results: %s" % e)
+
+def _decode(value) :
+    return value.decode("utf-8")
+
+class TSVResultReader(_ResultReader) :
+    """
+    Incremental reader of results in the U{SPARQL TSV format<http://www.w3.org/TR/sparql11-results-csv-tsv/>}, line
+    by line. The values are RDF terms in the Turtle syntax, hence keep their type, language tag and datatype; the
+    abbreviated numbers and booleans are yielded as typed literals. Empty values are unbound variables.
+
+    @ivar head: the C{head} of the results, in the structure of the JSON format
+    @ivar variables: the variables of the results (without C{?})
+    @ivar boolean: always C{None} (the format has no C{ASK} results)
+    @ivar members: always empty
+    @type members: dict
+    """
+    def __init__(self, stream) :
+        """
+        @param stream: file-like object with the response, eg, a C{urllib2} response
+        @raise ValueError: if the beginning of the response is not valid
+        """
+        self._stream = stream
+        _ResultReader.__init__(self)
+
+    def _parse(self) :
+        lines = iter(self._stream)
+        try :
+            header = next(lines).decode("utf-8").rstrip(u"\r\n")
+        except StopIteration :
+            raise ValueError("invalid SPARQL TSV results: no header")
+        variables = [variable.lstrip(u"?$") for variable in header.split(u"\t")] if header else []
+        self.variables = variables
+        self.head = { "vars" : variables }
+        for line in lines :
+            line = line.decode("utf-8").rstrip(u"\r\n")
+            solution = {}
+            for variable, value in zip(variables, line.split(u"\t")) :
+                if value :
+                    solution[variable] = _tsvTerm(value)
+            yield solution
+
+# an RDF term of the TSV format: IRI, blank node, literal (quoted, possibly with a language tag or a datatype), or
+# abbreviated number or boolean
+_TSV_TERM = re.compile(r"""
+    (?:<(?P<iri>[^>]*)>
+      |_:(?P<bnode>\S+)
+      |(?:"(?P<string>(?:[^"\\]|\\.)*)"|'(?P<string2>(?:[^'\\]|\\.)*)')
+       (?:@(?P<lang>[a-zA-Z]+(?:-[a-zA-Z0-9]+)*)|\^\^<(?P<datatype>[^>]*)>)?
+      |(?P<boolean>true|false)
+      |[+-]?(?:\d+(?P<decimal>\.\d*)?|(?P<point>\.)\d+)(?P<exponent>[eE][+-]?\d+)?
+    )$""", re.VERBOSE | re.UNICODE)
+
+_ECHAR = re.compile(r"\\(?:u([0-9a-fA-F]{4})|U([0-9a-fA-F]{8})|(.))", re.DOTALL)
+_ECHARS = { "t" : u"\t", "b" : u"\b", "n" : u"\n", "r" : u"\r", "f" : u"\f", '"' : u'"', "'" : u"'", "\\" : u"\\" }
+
+def _unescape(match) :
+    if match.group(3) is not None :
+        return _ECHARS.get(match.group(3), match.group(3))
+    return unichr(int(match.group(1) or match.group(2), 16))
+
+def _tsvTerm(value) :
+    """The RDF term of a value of the TSV format, in the structure of the JSON format."""
+    # the common cases, IRIs and plain literals without escapes, bypass the regular expression
+    if u"\\" not in value and len(value) > 1 :
+        first, last = value[0], value[-1]
+        if first == u"<" and last == u">" and u">" not in value[1:-1] :
+            return { "type" : "uri", "value" : value[1:-1] }
+        if first == u'"' and last == u'"' and u'"' not in value[1:-1] :
+            return { "type" : "literal", "value" : value[1:-1] }
+    match = _TSV_TERM.match(value)
+    if match is None :
+        raise ValueError("invalid SPARQL TSV results: %r is not an RDF term" % value)
+    if match.group("iri") is not None :
+        return { "type" : "uri", "value" : _ECHAR.sub(_unescape, match.group("iri")) }
+    if match.group("bnode") is not None :
+        return { "type" : "bnode", "value" : match.group("bnode") }
+    string = match.group("string")
+    if string is None :
+        string = match.group("string2")
+    if string is not None :
+        term = { "type" : "literal", "value" : _ECHAR.sub(_unescape, string) }
+        if match.group("lang") is not None :
+            term["xml:lang"] = match.group("lang")
+        elif match.group("datatype") is not None :
+            term["type"] = "typed-literal"
+            term["datatype"] = match.group("datatype")
+        return term
+    if match.group("boolean") is not None :
+        datatype = "boolean"
+    elif match.group("exponent") is not None :
+        datatype = "double"
+    elif match.group("decimal") is not None or match.group("point") is not None :
+        datatype = "decimal"
+    else :
+        datatype = "integer"
+    return { "type" : "typed-literal", "value" : value, "datatype" : _XSD + datatype }
+
+#######################################################################################################
+
+class _Buffer :
+    """The decoded text of a response not parsed yet, read as needed."""
+    _WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+    def __init__(self, stream, chunkSize) :
+        self._stream = stream
+        self._chunkSize = chunkSize
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._decoderObject = json.JSONDecoder()
+        self._text = u""
+        self._position = 0
+        self._eof = False
+
+    def _fill(self, size) :
+        """Read at least C{size} bytes more (unless at the end of the response), dropping the parsed text."""
+        if self._eof :
+            return False
+        data = self._stream.read(max(size, self._chunkSize))
+        self._eof = not data
+        self._text = self._text[self._position:] + self._decoder.decode(data, self._eof)
+        self._position = 0
+        return True
+
+    def _next(self) :
+        """Skip the whitespace, and return the next character (C{""} at the end of the response)."""
+        while True :
+            self._position = self._WHITESPACE.match(self._text, self._position).end()
+            if self._position < len(self._text) :
+                return self._text[self._position]
+            if not self._fill(0) :
+                return u""
+
+    def skip(self, character) :
+        """Skip a character, if it is the next one."""
+        if self._next() == character :
+            self._position += 1
+            return True
+        return False
+
+    def expect(self, character) :
+        if not self.skip(character) :
+            raise ValueError("invalid SPARQL JSON results: %r expected at %r" % (character, self._text[self._position:self._position + 20]))
+
+    def separator(self, closing) :
+        """Skip a comma, and return C{True}, or the closing character, and return C{False}."""
+        if self.skip(u",") :
+            return True
+        self.expect(closing)
+        return False
+
+    def value(self) :
+        """Decode the next JSON value, reading as much of the response as it needs."""
+        self._next()
+        while True :
+            try :
+                value, end = self._decoderObject.raw_decode(self._text, self._position)
+            except ValueError :
+                # truncated, unless at the end of the response; a value longer than the buffer doubles it
+                if not self._fill(len(self._text) - self._position) :
+                    raise ValueError("invalid SPARQL JSON results at %r" % self._text[self._position:self._position + 20])
+                continue
+            # a number may continue in the next block
+            if end == len(self._text) and not self._eof and not isinstance(value, (dict, list, unicode, str)) :
+                if self._fill(0) :
+                    continue
+            self._position = end
+            return value
+
+    def key(self) :
+        key = self.value()
+        if not isinstance(key, basestring) :
+            raise ValueError("invalid SPARQL JSON results: %r is not a member name" % (key,))
+        self.expect(":")
+        return key
+
+    def end(self) :
+        if self._next() != u"" :
+            raise ValueError("invalid SPARQL JSON results: unexpected %r" % self._text[self._position:self._position + 20])
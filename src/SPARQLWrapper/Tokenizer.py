@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""
+A lexer for SPARQL queries and updates, and the query rewriting built on it.
+
+The lexer does not validate the query: it only splits it into tokens (IRIs, strings, prefixed names, variables,
+keywords...) in a single pass, so that comments and whitespace can be told apart from the same characters within IRIs
+or strings. Unexpected characters become single character L{PUNCT} tokens; the lexer never fails.
+
+@authors: U{Ivan Herman<http://www.ivan-herman.net>}, U{Sergio Fernández<http://www.wikier.org>}, U{Carlos Tejo Alonso<http://www.dayures.net>}
+@organization: U{World Wide Web Consortium<http://www.w3.org>} and U{Foundation CTIC<http://www.fundacionctic.org/>}.
+@license: U{W3C® SOFTWARE NOTICE AND LICENSE<href="http://www.w3.org/Consortium/Legal/copyright-software">}
+"""
+
+import re
+
+# token kinds
+WS      = "WS"
+COMMENT = "COMMENT"
+IRI     = "IRI"
+STRING  = "STRING"
+VAR     = "VAR"
+BNODE   = "BNODE"
+PNAME   = "PNAME"
+LANGTAG = "LANGTAG"
+NUMBER  = "NUMBER"
+NAME    = "NAME"
+PUNCT   = "PUNCT"
+
+# each alternative is tried at most once per token, and none of them backtracks more than the token it matches:
+# the lexer is linear in the length of the query
+_TOKEN = re.compile(r"""
+     (?P<WS>\s+)
+    |(?P<COMMENT>\#[^\r\n]*)
+    |(?P<IRI><[^<>"{}|^`\\\x00-\x20]*>)
+    |(?P<STRING>'''(?:(?:'|'')?(?:[^'\\]|\\.))*'''
+               |\"\"\"(?:(?:"|"")?(?:[^"\\]|\\.))*\"\"\"
+               |'(?:[^'\\\n\r]|\\.)*'
+               |"(?:[^"\\\n\r]|\\.)*")
+    |(?P<VAR>[?$]\w+)
+    |(?P<BNODE>_:(?:\w|-|\.(?=[\w-]))+)
+    |(?P<PNAME>(?:[^\W\d_](?:[\w-]|\.(?=[\w-]))*)?:(?:[\w:%-]|\\[^\s]|\.(?=[\w:%-]))*)
+    |(?P<LANGTAG>@[a-zA-Z]+(?:-[a-zA-Z0-9]+)*)
+    |(?P<NUMBER>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+    |(?P<NAME>[^\W\d](?:[\w-]|\.(?=[\w-]))*)
+    |(?P<PUNCT>.)
+""", re.VERBOSE | re.UNICODE | re.DOTALL)
+
+def tokenize(query) :
+    """
+    Split a query into tokens.
+    @param query: the query (or update) text
+    @type query: string
+    @return: generator of C{(kind, text)} pairs, C{kind} being one of the token kinds of this module; the texts,
+    put together, give back the query
+    """
+    for match in _TOKEN.finditer(query) :
+        yield match.lastgroup, match.group()
+
+#######################################################################################################
+
+def queryForm(query) :
+    """
+    Return the keyword introducing a query or update (C{SELECT}, C{CONSTRUCT}, C{INSERT}, C{LOAD}...), in upper case.
+    The comments, the C{BASE} and C{PREFIX} declarations and the C{DEFINE} pragmas (of Virtuoso, eg,
+    C{DEFINE input:inference "rules"}) of the prologue are skipped, and so is the C{WITH} clause of a
+    C{DELETE}/C{INSERT} update (ie, the keyword following it is returned). Only the prologue is scanned, in a
+    single pass, and results are memoized per query text.
+    @param query: the query (or update) text
+    @type query: string
+    @return: the keyword, or C{None} if the query does not start with one
+    @rtype: string
+    """
+    result = _forms.get(query, _NONE)
+    if result is _NONE :
+        if len(_forms) >= _FORMS_SIZE :
+            _forms.clear()
+        keyword = _PROLOGUE.match(query).group("keyword")
+        result = _forms[query] = keyword and keyword.upper()
+    return result
+
+_forms = {}
+_FORMS_SIZE = 1024
+_NONE = object()
+
+# the alternatives of the prologue start with different characters, and each of them stops at the first character it
+# does not accept; as everything after the prologue is optional, the match never backtracks: the scan is linear
+_IRI_REF = r"""<[^<>"{}|^`\\\x00-\x20]*>"""
+_PN_PREFIX = r"(?:[^\W\d_](?:[\w-]|\.(?=[\w-]))*)?:"
+# the value of a pragma: a string, an IRI, a number or a name
+_PRAGMA_VALUE = r"""(?:"(?:[^"\\\r\n]|\\.)*"|'(?:[^'\\\r\n]|\\.)*'|%s|[+-]?[\d.]+|[\w:-]+)""" % _IRI_REF
+_PROLOGUE = re.compile(r"""
+    (?:\s+
+      |\#[^\r\n]*
+      |BASE\s*%(iri)s
+      |PREFIX\s*%(prefix)s\s*%(iri)s
+      |DEFINE\s+[\w:-]+\s*%(value)s(?:\s*,\s*%(value)s)*
+      |WITH\s*(?:%(iri)s|%(prefix)s(?:[\w:%%-]|\\[^\s]|\.(?=[\w:%%-]))*)
+    )*
+    (?P<keyword>[^\W\d_]\w*)?
+""" % { "iri" : _IRI_REF, "prefix" : _PN_PREFIX, "value" : _PRAGMA_VALUE }, re.VERBOSE | re.IGNORECASE | re.UNICODE)
+
+#######################################################################################################
+
+# tokens no whitespace is needed around
+_DELIMITERS = frozenset(["{", "}", "(", ")", ",", ";"])
+
+def minify(query) :
+    """
+    Return a shorter, equivalent, query: comments are removed, whitespace is reduced to single spaces where needed
+    to separate tokens, and the C{PREFIX} declarations of prefixes the query does not use are dropped. IRIs and
+    strings are left untouched.
+    @param query: the query (or update) text
+    @type query: string
+    @rtype: string
+    """
+    if isinstance(query, Minified) :
+        return query
+    result = _minified.get(query)
+    if result is None :
+        if len(_minified) >= _MINIFIED_SIZE :
+            _minified.clear()
+        result = _minified[query] = _minify(query)
+    return result
+
+_minified = {}
+_MINIFIED_SIZE = 1024
+
+class Minified(unicode) :
+    """A query text known to be minified already (eg, built from a minified template), which L{minify} returns as it is."""
+    __slots__ = ()
+
+def _minify(query) :
+    tokens = list(tokenize(query))
+    significant = [i for i, (kind, text) in enumerate(tokens) if kind not in (WS, COMMENT)]
+
+    # PREFIX declarations: keyword, prefix, IRI
+    declarations = []
+    used = set()
+    position = 0
+    while position < len(significant) :
+        kind, text = tokens[significant[position]]
+        if kind == NAME and text.upper() == "PREFIX" and position + 2 < len(significant) \
+           and tokens[significant[position + 1]][0] == PNAME and tokens[significant[position + 1]][1].endswith(":") \
+           and tokens[significant[position + 2]][0] == IRI :
+            declarations.append((tokens[significant[position + 1]][1][:-1], significant[position], significant[position + 2]))
+            position += 3
+            continue
+        if kind == PNAME :
+            used.add(text.split(":", 1)[0])
+        position += 1
+    dropped = set()
+    for prefix, start, end in declarations :
+        if prefix not in used :
+            dropped.update(range(start, end + 1))
+
+    output = []
+    space = False
+    for i, (kind, text) in enumerate(tokens) :
+        if kind in (WS, COMMENT) or i in dropped :
+            space = True
+            continue
+        if space and output and output[-1] not in _DELIMITERS and text not in _DELIMITERS :
+            output.append(" ")
+        space = False
+        output.append(text)
+    return "".join(output)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""
+The HTTP layer of L{SPARQLWrapper<SPARQLWrapper.Wrapper.SPARQLWrapper>}.
+
+The wrapper builds the HTTP request of a query (URI, method, headers, body) and interprets the response; sending the
+one and receiving the other is the job of a L{Transport}. The default transport, L{UrllibTransport}, is a C{urllib2}
+opener; others (eg, based on a different HTTP library, or not using the network at all, like the one of
+L{FakeEndpoint<SPARQLWrapper.FakeEndpoint.FakeEndpoint>}) can be set via
+L{SPARQLWrapper.setTransport<SPARQLWrapper.Wrapper.SPARQLWrapper.setTransport>}.
+
+A transport receives the requests as C{urllib2.Request} objects and must return C{urllib2.urlopen} like responses:
+file-like objects with C{info()} (the headers), C{geturl()} and a C{code} attribute. Responses with an error status
+are raised as C{urllib2.HTTPError}, network failures as C{urllib2.URLError} (C{socket.error} and
+C{httplib.HTTPException} are accepted, too), so the retry policy, the failover and the error mapping of the wrapper
+work the same with any transport.
+
+@authors: U{Ivan Herman<http://www.ivan-herman.net>}, U{Sergio Fernández<http://www.wikier.org>}, U{Carlos Tejo Alonso<http://www.dayures.net>}
+@organization: U{World Wide Web Consortium<http://www.w3.org>} and U{Foundation CTIC<http://www.fundacionctic.org/>}.
+@license: U{W3C® SOFTWARE NOTICE AND LICENSE<href="http://www.w3.org/Consortium/Legal/copyright-software">}
+"""
+
+import socket
+import urllib2
+
+class Transport :
+    """
+    Interface of the objects sending the HTTP requests of a L{SPARQLWrapper<SPARQLWrapper.Wrapper.SPARQLWrapper>}.
+    A transport may be used by several threads at the same time.
+    """
+    def open(self, request, timeout=socket._GLOBAL_DEFAULT_TIMEOUT) :
+        """
+        Send a request and return its response.
+        @param request: the request; besides the usual ones, it may have the C{connectTimeout} and C{deadline}
+        attributes (see the L{Deadline<SPARQLWrapper.Deadline>} module), which a transport should honour if it can
+        @type request: C{urllib2.Request}
+        @param timeout: the timeout of the socket operations, in seconds
+        @return: the response, a file-like object as returned by C{urllib2.urlopen}
+        @raise urllib2.HTTPError: if the response has an error status
+        @raise urllib2.URLError: if the endpoint cannot be reached
+        """
+        raise NotImplementedError("%s.open" % self.__class__.__name__)
+
+    def close(self) :
+        """Release the resources (eg, open connections) held by the transport. It can still be used afterwards."""
+        pass
+
+class UrllibTransport(Transport) :
+    """
+    Transport using a C{urllib2} opener.
+
+    @ivar opener: the opener
+    """
+    def __init__(self, *handlers) :
+        """
+        @param handlers: the C{urllib2} handlers of the opener, in addition to the default ones
+        """
+        self.opener = urllib2.build_opener(*handlers)
+
+    def open(self, request, timeout=socket._GLOBAL_DEFAULT_TIMEOUT) :
+        return self.opener.open(request, timeout=timeout)
@@ -7,6 +7,8 @@
 @var TURTLE: to be used to set the return format to Turtle
 @var N3: to be used to set the return format to N3 (for most of the SPARQL services this is equivalent to Turtle)
 @var RDF: to be used to set the return RDF Graph
+@var CSV: to be used to set the return format to CSV (SELECT queries only; the values lose their RDF term type)
+@var TSV: to be used to set the return format to TSV (SELECT queries only; the values are written as RDF terms)
 
 @var POST: to be used to set HTTP POST
 @var GET: to be used to set HTTP GET. This is the default.
@@ -24,15 +26,38 @@
 """
 
 import sys
+import time
+import threading
+import Queue
+import httplib
+import socket
+import io
 import urllib, urllib2
 import base64
+import hashlib
 import re
 import jsonlayer
 import warnings
 from SPARQLWrapper import __agent__
-from SPARQLExceptions import QueryBadFormed, EndPointNotFound, EndPointInternalError
-from SPARQLUtils import deprecated
+from SPARQLExceptions import SPARQLWrapperException, QueryBadFormed, EndPointNotFound, EndPointInternalError, EndPointUnavailable, QueryTimeout
+from SPARQLUtils import deprecated, threadedMap
 from KeyCaseInsensitiveDict import KeyCaseInsensitiveDict
+from ConnectionPool import ConnectionPool, PooledHTTPHandler, PooledHTTPSHandler
+from Compression import HTTPCompressionProcessor
+from DigestAuth import PreemptiveDigestAuthHandler
+from RetryPolicy import RetryPolicy, CircuitBreaker
+from LoadBalancer import LoadBalancer
+from Deadline import Deadline, DeadlineResponse, TimeoutHTTPHandler, TimeoutHTTPSHandler
+from Transport import UrllibTransport
+from Tokenizer import minify, queryForm
+from PreparedQuery import PreparedQuery
+from Cache import CachedResponse, CachingResponse, SingleFlight, freshness
+from Streaming import JSONResultReader, XMLResultReader, CSVResultReader, TSVResultReader
+import Columns
+try:
+    from urllib import addinfourl           # Python 2
+except ImportError:
+    from urllib.response import addinfourl  # Python 3
 
 #  Possible output format keys...
 JSON   = "json"
@@ -40,7 +65,9 @@ XML    = "xml"
 TURTLE = "n3"
 N3     = "n3"
 RDF    = "rdf"
-_allowedFormats = [JSON, XML, TURTLE, N3, RDF]
+CSV    = "csv"
+TSV    = "tsv"
+_allowedFormats = [JSON, XML, TURTLE, N3, RDF, CSV, TSV]
 
 # Possible HTTP methods
 POST = "POST"
@@ -55,7 +82,15 @@ DESCRIBE   = "DESCRIBE"
 INSERT     = "INSERT"
 DELETE     = "DELETE"
 MODIFY     = "MODIFY"
-_allowedQueryTypes = [SELECT, CONSTRUCT, ASK, DESCRIBE, INSERT, DELETE, MODIFY]
+LOAD       = "LOAD"
+CLEAR      = "CLEAR"
+DROP       = "DROP"
+CREATE     = "CREATE"
+ADD        = "ADD"
+MOVE       = "MOVE"
+COPY       = "COPY"
+_allowedQueryTypes = [SELECT, CONSTRUCT, ASK, DESCRIBE, INSERT, DELETE, MODIFY, LOAD, CLEAR, DROP, CREATE, ADD, MOVE, COPY]
+_updateQueryTypes  = [INSERT, DELETE, MODIFY, LOAD, CLEAR, DROP, CREATE, ADD, MOVE, COPY]
 
 # Possible output format (mime types) that can be converted by the local script. Unfortunately,
 # it does not work by simply setting the return format, because there is still a certain level of confusion
@@ -68,11 +103,13 @@ _allowedQueryTypes = [SELECT, CONSTRUCT, ASK, DESCRIBE, INSERT, DELETE, MODIFY]
 _SPARQL_DEFAULT  = ["application/sparql-results+xml", "application/rdf+xml", "*/*"]
 _SPARQL_XML      = ["application/sparql-results+xml"]
 _SPARQL_JSON     = ["application/sparql-results+json", "text/javascript", "application/json"]
+_SPARQL_CSV      = ["text/csv"]
+_SPARQL_TSV      = ["text/tab-separated-values"]
 _RDF_XML         = ["application/rdf+xml"]
 _RDF_N3          = ["text/rdf+n3","application/n-triples","application/turtle","application/n3","text/n3","text/turtle"]
 _ALL             = ["*/*"]
 _RDF_POSSIBLE    = _RDF_XML + _RDF_N3
-_SPARQL_POSSIBLE = _SPARQL_XML + _SPARQL_JSON + _RDF_XML + _RDF_N3
+_SPARQL_POSSIBLE = _SPARQL_XML + _SPARQL_JSON + _SPARQL_CSV + _SPARQL_TSV + _RDF_XML + _RDF_N3
 _SPARQL_PARAMS   = ["query"]
 
 # This is very ugly. The fact is that the key for the choice of the output format is not defined. 
@@ -83,6 +120,129 @@ _SPARQL_PARAMS   = ["query"]
 # parameters they do not understand. So: just repeat all possibilities in the final URI. UGLY!!!!!!!
 _returnFormatSetting = ["format","output","results"]
 
+# requests in progress, shared by all the instances coalescing their queries (see SPARQLWrapper.setCoalescing)
+_SINGLE_FLIGHT = SingleFlight()
+
+# maximum number of request templates cached by a wrapper
+_TEMPLATES_SIZE = 256
+
+def _parseQueryType(query, pattern=None) :
+    """
+        Parse the SPARQL query and return its type; see L{SPARQLWrapper._parseQueryType}.
+        @param query: query text
+        @type query: string
+        @param pattern: the regular expression to use instead of the tokenizer (see L{queryForm<SPARQLWrapper.Tokenizer.queryForm>}), if
+        different from L{SPARQLWrapper.pattern}
+        @rtype: string
+    """
+    if pattern is None or pattern is SPARQLWrapper.pattern :
+        r_queryType = queryForm(query)
+    else :
+        try:
+            r_queryType = pattern.search(query).group("queryType").upper()
+        except AttributeError:
+            r_queryType = None
+
+    if r_queryType in _allowedQueryTypes :
+        return r_queryType
+    else :
+        #raise Exception("Illegal SPARQL Query; must be one of SELECT, ASK, DESCRIBE, or CONSTRUCT")
+        warnings.warn("unknown query type", RuntimeWarning)
+        return SELECT
+
+#######################################################################################################
+
+class QueryRequest(object) :
+    """
+    Immutable description of a single SPARQL request: the query text and type, the return format, the HTTP method,
+    the custom parameters and the credentials. Contrary to the settings of a L{SPARQLWrapper} instance, a request
+    cannot change once created, so it can be shared freely between threads, and a single L{SPARQLWrapper} instance
+    can L{execute<SPARQLWrapper.execute>} any number of them concurrently (sharing its connections and caches).
+
+    Requests are usually created from the settings of a wrapper via L{SPARQLWrapper.createQueryRequest}; a modified
+    copy of a request can be obtained via L{replace}. Requests are hashable, two requests with the same values are equal.
+
+    @ivar queryString: the query text
+    @ivar queryType: the query type (L{SELECT}, L{ASK}, ...)
+    @ivar returnFormat: the return format (L{XML}, L{JSON}, ...)
+    @ivar method: L{GET} or L{POST}
+    @ivar customParameters: the custom parameters; a new dictionary is returned on each access
+    @ivar user: user name for the authentication, or C{None}
+    @ivar passwd: password for the authentication, or C{None}
+    @ivar auth_mode: authentication mode, C{'basic'} or C{'digest'}
+    @ivar realm: authentication realm
+    @ivar timeout: number of seconds within which the response must be complete, or C{None}
+    """
+    __slots__ = ("queryString", "queryType", "returnFormat", "method", "parameters", "user", "passwd", "auth_mode", "realm", "timeout")
+
+    def __init__(self, queryString, returnFormat=XML, method=GET, customParameters=None, user=None, passwd=None, auth_mode='', realm='', queryType=None, timeout=None) :
+        """
+        @param queryString: query text
+        @type queryString: string
+        @keyword returnFormat: one of L{JSON}, L{XML}, L{TURTLE}, L{N3}, L{RDF}, L{CSV}, L{TSV}; other values fall back to L{XML}
+        @keyword method: L{GET} or L{POST}; other values fall back to L{GET}
+        @keyword customParameters: dictionary of extra parameters sent to the endpoint
+        @keyword user: user name
+        @keyword passwd: password
+        @keyword auth_mode: C{'basic'} or C{'digest'}
+        @keyword realm: realm (for digest authentication)
+        @keyword queryType: the query type; determined from the query text if not given
+        @keyword timeout: number of seconds within which the response must be complete (see L{SPARQLWrapper.setTimeout})
+        """
+        if queryType is None :
+            queryType = _parseQueryType(queryString)
+        init = super(QueryRequest, self).__setattr__
+        init("queryString", queryString)
+        init("queryType", queryType)
+        init("returnFormat", returnFormat if returnFormat in _allowedFormats else XML)
+        init("method", method if method in _allowedRequests else GET)
+        init("parameters", tuple(sorted((customParameters or {}).items())))
+        init("user", user)
+        init("passwd", passwd)
+        init("auth_mode", auth_mode)
+        init("realm", realm)
+        init("timeout", timeout)
+
+    def __setattr__(self, name, value) :
+        raise AttributeError("QueryRequest instances are immutable")
+
+    def __delattr__(self, name) :
+        raise AttributeError("QueryRequest instances are immutable")
+
+    @property
+    def customParameters(self) :
+        return dict(self.parameters)
+
+    def replace(self, **changes) :
+        """
+        Return a copy of the request with some values changed. The keywords are those of the constructor;
+        if the query string is changed but not the query type, the latter is determined anew.
+        @return: new request
+        @rtype: L{QueryRequest}
+        """
+        values = dict(queryString=self.queryString, returnFormat=self.returnFormat, method=self.method,
+                      customParameters=self.customParameters, user=self.user, passwd=self.passwd,
+                      auth_mode=self.auth_mode, realm=self.realm, timeout=self.timeout)
+        if "queryString" not in changes :
+            values["queryType"] = self.queryType
+        values.update(changes)
+        return QueryRequest(**values)
+
+    def _key(self) :
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other) :
+        return isinstance(other, QueryRequest) and self._key() == other._key()
+
+    def __ne__(self, other) :
+        return not self == other
+
+    def __hash__(self) :
+        return hash(self._key())
+
+    def __repr__(self) :
+        return "<QueryRequest %s %s %s>" % (self.queryType, self.method, self.returnFormat)
+
 #######################################################################################################
 
 class SPARQLWrapper :
@@ -93,7 +253,12 @@ class SPARQLWrapper :
     are retained from one query to the next (in other words, only the query string changes). The instance can also be
     reset to its initial values using the L{resetQuery} method.
 
-    @cvar pattern: regular expression used to determine whether a query is of type L{CONSTRUCT}, L{SELECT}, L{ASK}, or L{DESCRIBE}.
+    The settings of an instance are not meant to be changed by several threads at the same time. To share one instance
+    (and its connections) between threads, create immutable L{QueryRequest} objects (eg, via L{createQueryRequest}) and
+    run them with L{execute}, which leaves the instance untouched.
+
+    @cvar pattern: regular expression formerly used to determine whether a query is of type L{CONSTRUCT}, L{SELECT}, L{ASK}, or L{DESCRIBE}.
+    The query type is now found by L{queryForm<SPARQLWrapper.Tokenizer.queryForm>}; the regular expression is only used if a subclass overrides it.
     @type pattern: compiled regular expression (see the C{re} module of Python)
     @ivar baseURI: the URI of the SPARQL service
     """
@@ -105,9 +270,12 @@ class SPARQLWrapper :
     def __init__(self,endpoint,updateEndpoint=None,returnFormat=XML,defaultGraph=None,agent=__agent__) :
         """
         Class encapsulating a full SPARQL call.
-        @param endpoint: string of the SPARQL endpoint's URI
-        @type endpoint: string
-        @param updateEndpoint: string of the SPARQL endpoint's URI for update operations (if it's a different one)
+        @param endpoint: string of the SPARQL endpoint's URI, or a list of URIs of equivalent (read) replicas. In the latter case
+        each query is sent to the replica that currently answers fastest, replicas failing repeatedly are put aside for a while,
+        and a query failing on one replica is retried on another one; see L{setLoadBalancing}.
+        @type endpoint: string or list of strings
+        @param updateEndpoint: string of the SPARQL endpoint's URI for update operations (if it's a different one). By default,
+        the (first) query endpoint.
         @type updateEndpoint: string
         @keyword returnFormat: Default: L{XML}.
         Can be set to JSON or Turtle/N3
@@ -117,14 +285,18 @@ class SPARQLWrapper :
         is up to the endpoint to react or not, this wrapper does not check.
 
         Possible values:
-        L{JSON}, L{XML}, L{TURTLE}, L{N3} (constants in this module). The value can also be set via explicit
+        L{JSON}, L{XML}, L{TURTLE}, L{N3}, L{CSV}, L{TSV} (constants in this module). The value can also be set via explicit
         call, see below.
         @type returnFormat: string
         @keyword defaultGraph: URI for the default graph. Default is None, the value can be set either via an L{explicit call<addDefaultGraph>} or as part of the query string.
         @type defaultGraph: string
         """
-        self.endpoint = endpoint
-        self.updateEndpoint = updateEndpoint if updateEndpoint else endpoint
+        if isinstance(endpoint, (list, tuple)) :
+            self.endpoints = list(endpoint)
+        else :
+            self.endpoints = [endpoint]
+        self.endpoint = self.endpoints[0]
+        self.updateEndpoint = updateEndpoint if updateEndpoint else self.endpoint
         self.agent = agent
         self.user = None
         self.passwd = None
@@ -141,6 +313,29 @@ class SPARQLWrapper :
         self.queryString = """SELECT * WHERE{ ?s ?p ?o }"""
         self.method    = GET
         self.queryType = SELECT
+        self._pool = None
+        self._keepAliveHandler = None
+        self._authHandler = PreemptiveDigestAuthHandler()
+        self._useCompression = True
+        self._compression = {}
+        self._defaultTransport = None
+        self._transport = None
+        self._retryPolicy = None
+        self._circuitBreakerSettings = None
+        self._circuitBreakers = {}
+        self._loadBalancer = None
+        if len(self.endpoints) > 1 :
+            self._loadBalancer = LoadBalancer(self.endpoints)
+        self._hedgePercentile = None
+        self.timeout = None
+        self._timeoutHint = None
+        self._connectTimeout = None
+        self._readTimeout = None
+        self._maxURILength = 2048
+        self._minifyQueries = False
+        self._templates = {}
+        self._cache = None
+        self._singleFlight = None
 
     def resetQuery(self) :
         """Reset the query, ie, return format, query, default or named graph settings, etc,
@@ -156,7 +351,7 @@ class SPARQLWrapper :
     def setReturnFormat(self,format) :
         """Set the return format. If not an allowed value, the setting is ignored.
 
-        @param format: Possible values: are L{JSON}, L{XML}, L{TURTLE}, L{N3}, L{RDF} (constants in this module). All other cases are ignored.
+        @param format: Possible values: are L{JSON}, L{XML}, L{TURTLE}, L{N3}, L{RDF}, L{CSV}, L{TSV} (constants in this module). All other cases are ignored.
         @type format: string
         """
         if format in _allowedFormats :
@@ -248,7 +443,7 @@ class SPARQLWrapper :
 
     def _parseQueryType(self,query) :
         """
-            Parse the SPARQL query and return its type (ie, L{SELECT}, L{ASK}, etc).
+            Parse the SPARQL query and return its type (ie, L{SELECT}, L{ASK}, L{INSERT}, L{LOAD}, etc).
 
             Note that the method returns L{SELECT} if nothing is specified. This is just to get all other
             methods running; in fact, this means that the query is erronous, because the query must be,
@@ -259,17 +454,7 @@ class SPARQLWrapper :
             @type query: string
             @rtype: string
         """
-        try:
-            r_queryType = self.pattern.search(query).group("queryType").upper()
-        except AttributeError:
-            r_queryType = None
-    
-        if r_queryType in _allowedQueryTypes :
-            return r_queryType
-        else :
-            #raise Exception("Illegal SPARQL Query; must be one of SELECT, ASK, DESCRIBE, or CONSTRUCT")
-            warnings.warn("unknown query type", RuntimeWarning)
-            return SELECT
+        return _parseQueryType(query, self.pattern)
 
     def setMethod(self,method) :
         """Set the invocation method. By default, this is L{GET}, but can be set to L{POST}.
@@ -278,121 +463,701 @@ class SPARQLWrapper :
         if method in _allowedRequests : self.method = method
 
     def setUseKeepAlive(self):
-        """Make urllib2 use keep-alive.
+        """Make urllib2 use keep-alive for the queries of this instance. See also L{setUseConnectionPool}, which does not
+        need an external package and takes precedence over this setting.
         @raise ImportError: when could not be imported urlgrabber.keepalive.HTTPHandler
         """
         try:
             from urlgrabber.keepalive import HTTPHandler
-            keepalive_handler = HTTPHandler()
-            opener = urllib2.build_opener(keepalive_handler)
-            urllib2.install_opener(opener)
+            self._keepAliveHandler = HTTPHandler()
+            self._defaultTransport = None
         except ImportError:
             warnings.warn("urlgrabber not installed in the system. The execution of this method has no effect.")
 
-    def _getURI(self) :
+    def setUseConnectionPool(self, maxConnections=10, idleTimeout=60.0, blockTimeout=None, healthCheck=True):
+        """Keep the HTTP connections to the endpoint(s) open between queries, instead of opening a new
+        one (with its TCP and, possibly, TLS handshake) for each query. The connections are pooled per host
+        and owned by this instance; see L{ConnectionPool<SPARQLWrapper.ConnectionPool.ConnectionPool>} for the details.
+        Calling this method again replaces the current pool (closing its idle connections).
+
+        @param maxConnections: maximum number of connections per host
+        @type maxConnections: int
+        @param idleTimeout: number of seconds an unused connection is kept open
+        @type idleTimeout: float
+        @param blockTimeout: number of seconds a query waits for a free connection if C{maxConnections} are in use; C{None} means forever
+        @type blockTimeout: float
+        @param healthCheck: whether idle connections are checked for a server side close before they are reused
+        @type healthCheck: boolean
+        """
+        self.close()
+        self._pool = ConnectionPool(maxConnections, idleTimeout, blockTimeout, healthCheck)
+        self._defaultTransport = None
+
+    def setUseCompression(self, use=True, endpoint=None):
+        """Ask the endpoint for compressed (C{gzip}, C{deflate}, or C{br} if the C{brotli} package is installed) responses,
+        and decompress them on the fly while they are read. This is the default; endpoints (or proxies) that do not handle
+        compression properly can be queried with C{setUseCompression(False)}, or C{setUseCompression(False, uri)} for a
+        single endpoint (eg, one of the replicas, or the update endpoint). The responses of an endpoint compression is
+        not used for are left untouched.
+        @param use: whether compression is used
+        @type use: bool
+        @param endpoint: the URI of the endpoint the setting is for; by default, all of them (the settings given for
+        single endpoints so far are then dropped)
+        @type endpoint: string
+        """
+        if endpoint is None :
+            self._useCompression = use
+            self._compression = {}
+        else :
+            self._compression[endpoint] = use
+
+    def setRetryPolicy(self, policy=None):
+        """Retry the queries failing because of a transient problem of the endpoint (HTTP 500, 502, 503, 504 responses,
+        connection errors, timeouts), waiting longer and longer between the attempts.
+        See L{RetryPolicy<SPARQLWrapper.RetryPolicy.RetryPolicy>} for the details. Update operations are not retried unless
+        the policy says so.
+        @param policy: the retry policy; C{None} switches the retries off (the default)
+        @type policy: L{RetryPolicy<SPARQLWrapper.RetryPolicy.RetryPolicy>}
+        """
+        self._retryPolicy = policy
+
+    def setCache(self, cache=None):
+        """Keep the results of the queries in a cache, and answer identical queries from it. Queries are identical if
+        they have the same endpoint, query text (once minified, see L{setMinifyQueries}), return format, method, custom
+        parameters (eg, the default and named graphs) and user. The cache can be shared with other instances. See the
+        L{Cache<SPARQLWrapper.Cache>} module for the details, including the revalidation of expired results.
+        @param cache: the cache, eg, a L{ResultCache<SPARQLWrapper.Cache.ResultCache>} or a
+        L{DiskCache<SPARQLWrapper.Cache.DiskCache>}; C{None} switches caching off (the default)
+        """
+        self._cache = cache
+
+    def setCoalescing(self, coalesce=True):
+        """Send a single request for identical queries (see L{setCache}) issued concurrently, by any thread and any
+        instance of this process: the first one is sent, the others wait for its response, and each caller gets its
+        own L{QueryResult} reading the same bytes. This avoids stampedes of expensive queries, eg, when the entry of a
+        popular query expires from a cache. Updates are never coalesced, nor are queries with different credentials
+        (see L{setCredentials}), nor queries with different timeouts (see L{setTimeout}), so that the wait for the
+        response of another caller never exceeds the timeout of a query.
+
+        Note that coalesced responses are read fully before being returned (instead of being streamed).
+        @param coalesce: whether identical concurrent queries are coalesced (default: C{False})
+        @type coalesce: bool
+        """
+        self._singleFlight = coalesce and _SINGLE_FLIGHT or None
+
+    def setCircuitBreaker(self, failureThreshold=5, recoveryTimeout=30.0):
+        """Stop querying an endpoint for C{recoveryTimeout} seconds after C{failureThreshold} consecutive transient
+        failures: in the meantime, the queries fail right away with L{EndPointUnavailable}. This spares an endpoint that is,
+        eg, restarting from being flooded with requests. See L{CircuitBreaker<SPARQLWrapper.RetryPolicy.CircuitBreaker>}
+        for the details. The query and update endpoints have their own circuit breakers.
+        @param failureThreshold: number of consecutive failures after which the endpoint is not queried; C{None} switches the circuit breaker off
+        @type failureThreshold: int
+        @param recoveryTimeout: number of seconds before a new trial query is sent to the endpoint
+        @type recoveryTimeout: float
+        """
+        if failureThreshold is None :
+            self._circuitBreakerSettings = None
+        else :
+            self._circuitBreakerSettings = (failureThreshold, recoveryTimeout)
+        self._circuitBreakers = {}
+
+    def setTimeout(self, timeout, hintParameter=None, hintScale=1000):
+        """Set the time limit of the queries: if the response is not complete (including its reading by the
+        converters) within C{timeout} seconds, a L{QueryTimeout} is raised, whatever the endpoint does meanwhile.
+        Retries never go beyond that limit either.
+
+        Some endpoints accept a time limit as a query parameter, and stop working on the query when it is over, eg,
+        C{timeout} in milliseconds for Virtuoso: C{setTimeout(30, "timeout", 1000)}.
+        @param timeout: number of seconds; C{None} for no limit
+        @type timeout: float
+        @param hintParameter: name of the query parameter telling the time limit to the endpoint, if any
+        @type hintParameter: string
+        @param hintScale: number of units of the hint parameter per second (1000 for milliseconds)
+        """
+        self.timeout = timeout
+        if hintParameter is None :
+            self._timeoutHint = None
+        else :
+            self._timeoutHint = (hintParameter, hintScale)
+
+    def setMaxURILength(self, length=2048):
+        """Send the C{GET} queries whose URI would be longer than C{length} characters by C{POST} instead, as
+        servers and proxies often refuse long URIs (C{414 Request-URI Too Long}). The limit is 2048 by default.
+        @param length: the maximum length of the URIs; C{None} to never switch to C{POST}
+        @type length: int
+        """
+        self._maxURILength = length
+
+    def setMinifyQueries(self, minify=True):
+        """Send the queries without comments, superfluous whitespace and unused C{PREFIX} declarations (see
+        L{Tokenizer.minify<SPARQLWrapper.Tokenizer.minify>}), which makes requests smaller and cheaper to parse.
+        This is off by default, as it changes the query text seen by the endpoint (eg, in its logs), and drops the
+        comments some endpoints read as hints.
+        @param minify: whether queries are minified
+        @type minify: bool
+        """
+        self._minifyQueries = minify
+
+    def setSocketTimeouts(self, connectTimeout=None, readTimeout=None):
+        """Set the timeouts of the network operations: establishing a connection, and waiting for (the next part
+        of) a response. A timeout counts as a transient failure for the L{retry policy<setRetryPolicy>}.
+        Note that data trickling slowly, but steadily, never hits the read timeout; see L{setTimeout} for that.
+        With L{setUseKeepAlive}, only the read timeout is used.
+        @param connectTimeout: number of seconds; C{None} for the default timeout of the sockets
+        @type connectTimeout: float
+        @param readTimeout: number of seconds; C{None} for the default timeout of the sockets
+        @type readTimeout: float
+        """
+        self._connectTimeout = connectTimeout
+        self._readTimeout = readTimeout
+
+    def setLoadBalancing(self, decay=0.3, ejectAfter=3, ejectionTime=30.0):
+        """Tune the distribution of the queries over the replicas given at initialization (it has no effect with a
+        single endpoint). See L{LoadBalancer<SPARQLWrapper.LoadBalancer.LoadBalancer>} for the details; the statistics
+        collected so far are reset.
+        @param decay: weight of the latest measurement in the moving average of the latency of a replica, between 0 and 1
+        @type decay: float
+        @param ejectAfter: number of consecutive failures after which a replica is put aside
+        @type ejectAfter: int
+        @param ejectionTime: number of seconds a replica is put aside
+        @type ejectionTime: float
+        """
+        if len(self.endpoints) > 1 :
+            self._loadBalancer = LoadBalancer(self.endpoints, decay, ejectAfter, ejectionTime)
+
+    def setHedging(self, percentile=95):
+        """Send a duplicate of a query to a second replica when the first one has not answered within the given
+        percentile of its recent latencies, and use whichever response comes first; the other request is aborted (its
+        connection is shut down) as soon as the first response arrives. This cuts the latency tail due to occasionally slow replicas, at
+        the price of a few more requests. Hedging needs several endpoints and at least 10 latencies measured on the
+        replica; updates are never duplicated.
+        @param percentile: the percentile (between 0 and 100) of the latency after which a duplicate is sent; C{None} switches hedging off
+        @type percentile: float
+        """
+        self._hedgePercentile = percentile
+
+    def _chooseEndpoint(self, request, exclude=()):
+        """Internal method returning the URI of the endpoint a request should be sent to: the update endpoint for
+        updates, otherwise the query endpoint (chosen by the load balancer among the replicas, if several).
+        @param request: the request
+        @type request: L{QueryRequest}
+        @param exclude: replicas not to be chosen
+        @return: endpoint URI, or C{None} if all the replicas are excluded
+        """
+        if request.method == POST and request.queryType in _updateQueryTypes :
+            return self.updateEndpoint if self.updateEndpoint not in exclude else None
+        if self._loadBalancer is None :
+            return self.endpoint if self.endpoint not in exclude else None
+        return self._loadBalancer.choose(exclude)
+
+    def _getCircuitBreaker(self, uri):
+        """Internal method returning the circuit breaker of an endpoint, or C{None} if not used."""
+        if self._circuitBreakerSettings is None :
+            return None
+        breaker = self._circuitBreakers.get(uri)
+        if breaker is None :
+            breaker = self._circuitBreakers.setdefault(uri, CircuitBreaker(*self._circuitBreakerSettings))
+        return breaker
+
+    def setTransport(self, transport=None):
+        """Send the HTTP requests of this instance with another L{Transport<SPARQLWrapper.Transport.Transport>}
+        than the default C{urllib2} one, eg, one using a different HTTP library, or the in-process transport of a
+        L{FakeEndpoint<SPARQLWrapper.FakeEndpoint.FakeEndpoint>}. The connection pool, keep-alive, compression and
+        digest authentication settings only apply to the default transport.
+        @param transport: the transport; C{None} restores the default one
+        @type transport: L{Transport<SPARQLWrapper.Transport.Transport>}
+        """
+        self._transport = transport
+
+    def _getTransport(self):
+        """Internal method returning the L{Transport<SPARQLWrapper.Transport.Transport>} used by this instance: the one
+        set via L{setTransport}, or a C{urllib2} opener built according to the settings of the instance (connection
+        pool, compression, authentication).
+        @return: transport
+        """
+        if self._transport is not None :
+            return self._transport
+        transport = self._defaultTransport
+        if transport is None :
+            handlers = []
+            if self._pool is not None :
+                handlers.extend([PooledHTTPHandler(self._pool), PooledHTTPSHandler(self._pool)])
+            elif self._keepAliveHandler is not None :
+                handlers.append(self._keepAliveHandler)
+            else :
+                handlers.extend([TimeoutHTTPHandler(), TimeoutHTTPSHandler()])
+            handlers.append(HTTPCompressionProcessor())
+            handlers.append(self._authHandler)
+            transport = self._defaultTransport = UrllibTransport(*handlers)
+        return transport
+
+    def close(self):
+        """Close the idle connections kept by L{setUseConnectionPool} or by the transport, if any. The instance can still be used
+        afterwards, new connections are opened as needed."""
+        if self._pool is not None :
+            self._pool.close()
+        if self._transport is not None :
+            self._transport.close()
+
+    def _getURI(self, request=None, endpoint=None) :
         """Return the URI as sent (or to be sent) to the SPARQL endpoint. The URI is constructed
         with the base URI given at initialization, plus all the other parameters set.
+        @param request: the request to build the URI for; by default, the one defined by the current settings of this instance
+        @type request: L{QueryRequest}
+        @param endpoint: the endpoint URI to use; by default, the (first) query endpoint
+        @type endpoint: string
         @return: URI
         @rtype: string
         """
-        finalQueryParameters = self.customParameters.copy()
+        if request is None :
+            request = self.createQueryRequest()
         # FIXME: I've commented the lines bellow because they made the INSERTS and DELETES stop working on Virtuoso
         # This must to be analyzed more carefully for general purposes
-        #if self.queryType in [INSERT, DELETE, MODIFY]:
+        #if request.queryType in [INSERT, DELETE, MODIFY]:
         #    uri = self.updateEndpoint
-        #    finalQueryParameters["update"] = self.queryString
+        #    finalQueryParameters["update"] = request.queryString
         #else:
-        uri = self.endpoint
-        finalQueryParameters["query"] = self.queryString
+        uri = endpoint or self.endpoint
+        return uri + "?" + self._getQueryParameters(request)
+
+    def _getQueryParameters(self, request) :
+        """Internal method returning the parameters of a query request (the query text, the custom parameters and
+        the return format), encoded for a query string or a form body.
+        @param request: the request
+        @type request: L{QueryRequest}
+        @rtype: string
+        """
+        query = "query=" + _encodeValue(self._queryText(request))
+        parameters = self._getTemplate(request).parameters
+        if parameters :
+            return query + "&" + parameters
+        return query
+
+    def _getTemplate(self, request) :
+        """Internal method returning the L{_RequestTemplate} of a request, ie, the parts of the HTTP request that do
+        not depend on the query text. Templates are computed once and cached, per set of settings.
+        @param request: the request
+        @type request: L{QueryRequest}
+        @rtype: L{_RequestTemplate}
+        """
+        key = (request.queryType, request.returnFormat, request.parameters, request.user, request.passwd,
+               request.auth_mode, request.timeout, self._timeoutHint, self.agent)
+        template = self._templates.get(key)
+        if template is None :
+            if len(self._templates) >= _TEMPLATES_SIZE :
+                self._templates.clear()
+            template = self._templates[key] = self._createTemplate(request)
+        return template
+
+    def _createTemplate(self, request) :
+        """Internal method computing the L{_RequestTemplate} of a request; see L{_getTemplate}.
+        @param request: the request
+        @type request: L{QueryRequest}
+        @rtype: L{_RequestTemplate}
+        """
+        finalQueryParameters = request.customParameters.copy()
 
         # This is very ugly. The fact is that the key for the choice of the output format is not defined. 
         # Virtuoso uses 'format',sparqler uses 'output'
         # However, these processors are (hopefully) oblivious to the parameters they do not understand. 
         # So: just repeat all possibilities in the final URI. UGLY!!!!!!!
-        for f in _returnFormatSetting: finalQueryParameters[f] = self.returnFormat
-
-        return uri + "?" + urllib.urlencode(dict([k, v.encode("utf-8")] for k, v in finalQueryParameters.items()))
+        for f in _returnFormatSetting: finalQueryParameters[f] = request.returnFormat
+        finalQueryParameters.update(self._timeoutParameters(request))
 
-    def _createRequest(self) :
-        """Internal method to create request according a HTTP method. Returns a
-        C{urllib2.Request} object of the urllib2 Python library
-        @return: request
-        """
-        if self.queryType in [SELECT, ASK]:
-            if self.returnFormat == XML:
+        if request.queryType in [SELECT, ASK]:
+            if request.returnFormat == XML:
                 acceptHeader = ",".join(_SPARQL_XML)
-            elif self.returnFormat == JSON:
+            elif request.returnFormat == JSON:
                 acceptHeader = ",".join(_SPARQL_JSON)
+            elif request.returnFormat == CSV:
+                acceptHeader = ",".join(_SPARQL_CSV)
+            elif request.returnFormat == TSV:
+                acceptHeader = ",".join(_SPARQL_TSV)
             else :
                 acceptHeader = ",".join(_ALL)
-        elif self.queryType in [INSERT, DELETE, MODIFY]:
+        elif request.queryType in _updateQueryTypes:
             acceptHeader = "*/*"
         else:
-            if self.returnFormat == N3 or self.returnFormat == TURTLE :
+            if request.returnFormat == N3 or request.returnFormat == TURTLE :
                 acceptHeader = ",".join(_RDF_N3)
-            elif self.returnFormat == XML :
+            elif request.returnFormat == XML :
                 acceptHeader = ",".join(_RDF_XML)
             else :
                 acceptHeader = ",".join(_ALL)
 
-        if self.method == POST :
+        # Some versions of Joseki do not work well if no Accept header is given.
+        # Although it is probably o.k. in newer versions, it does not harm to have that set once and for all...
+        headers = [("User-Agent", self.agent), ("Accept", acceptHeader)]
+        if request.user and request.passwd and request.auth_mode != 'digest':
+            headers.append(("Authorization", "Basic {0}".format(base64.b64encode("{0}:{1}".format(request.user, request.passwd).encode("ascii")).decode("utf-8"))))
+        # urllib2 keeps the header names capitalized
+        headers = dict((name.capitalize(), value) for name, value in headers)
+        return _RequestTemplate(_encodeParameters(finalQueryParameters), headers)
+
+    def _queryText(self, request) :
+        """Internal method returning the query (or update) text of a request as sent to the endpoint, ie,
+        minified unless switched off via L{setMinifyQueries}."""
+        if self._minifyQueries :
+            return minify(request.queryString)
+        return request.queryString
+
+    def _timeoutParameters(self, request) :
+        """Internal method returning the query parameter telling the endpoint the time limit of a request
+        (see L{setTimeout}), as a dictionary."""
+        if self._timeoutHint is None or request.timeout is None :
+            return {}
+        parameter, scale = self._timeoutHint
+        return { parameter : str(int(request.timeout * scale)) }
+
+    def _createRequest(self, request=None, endpoint=None, deadline=None) :
+        """Internal method to create request according a HTTP method. Returns a
+        C{urllib2.Request} object of the urllib2 Python library
+        @param request: the request to send; by default, the one defined by the current settings of this instance
+        @type request: L{QueryRequest}
+        @param endpoint: the endpoint URI to send the request to; by default, the (first) query endpoint, or the update endpoint for updates
+        @type endpoint: string
+        @param deadline: the deadline of the request, if any
+        @type deadline: L{Deadline<SPARQLWrapper.Deadline.Deadline>}
+        @return: request
+        """
+        if request is None :
+            request = self.createQueryRequest()
+        method = request.method
+        if method == GET :
+            uri = self._getURI(request, endpoint)
+            if self._maxURILength is not None and len(uri) > self._maxURILength and request.queryType not in _updateQueryTypes :
+                # too long for servers and proxies: the very same parameters are sent in the body instead
+                method = POST
+        if method == POST :
             # by POST
-            if self.queryType in [INSERT, DELETE, MODIFY]:
-                uri = self.updateEndpoint
-                values = { "update" : self.queryString }
+            if request.queryType in _updateQueryTypes:
+                uri = endpoint or self.updateEndpoint
+                data = "update=" + _encodeValue(self._queryText(request))
             else:
-                uri = self.endpoint
-                values = { "query" : self.queryString }
-        else:
-            uri = self._getURI()
-
-        if (self.auth_mode=='digest') and self.user and self.passwd:
-            passwdmngr = urllib2.HTTPPasswordMgrWithDefaultRealm()
-            passwdmngr.add_password(self.realm, uri, self.user, self.passwd)
-            authhandler = urllib2.HTTPDigestAuthHandler(passwdmngr)
-            opener = urllib2.build_opener(authhandler)
-            urllib2.install_opener(opener)
-
-        if self.method == POST:
-            request = urllib2.Request(uri)
-            request.add_header("Content-Type", "application/x-www-url-form-urlencoded")
-            data = urllib.urlencode(values)
+                uri = endpoint or self.endpoint
+                data = self._getQueryParameters(request)
+
+        if (request.auth_mode=='digest') and request.user and request.passwd:
+            # the handler is kept by the instance: after the first challenge, the next requests are authenticated right away
+            self._authHandler.addCredentials(request.realm, uri.split("?")[0], request.user, request.passwd)
+
+        httpRequest = urllib2.Request(uri)
+        httpRequest.headers.update(self._getTemplate(request).headers)
+        if method == POST:
+            httpRequest.add_header("Content-Type", "application/x-www-form-urlencoded")
             if isinstance(data, unicode):
                 data = data.encode("utf-8")
-            request.add_data(data)
-        else:
-            # by GET
-            # Some versions of Joseki do not work well if no Accept header is given.
-            # Although it is probably o.k. in newer versions, it does not harm to have that set once and for all...
-            request = urllib2.Request(uri)
-
-        request.add_header("User-Agent", self.agent)
-        request.add_header("Accept", acceptHeader)
-        if self.user and self.passwd:
-            request.add_header("Authorization", "Basic {0}\n".format(base64.b64encode("{0}:{1}".format(self.user, self.passwd).encode("ascii")).decode("utf-8")))
+            httpRequest.data = data
 
-        return request
+        # read by the pooled handlers: only idempotent requests are sent again when a reused connection fails
+        httpRequest.idempotent = request.queryType not in _updateQueryTypes
+        # read by the HTTPCompressionProcessor
+        httpRequest.compression = self._compression.get(endpoint, self._useCompression)
+        # the timeouts are read by the handlers (see the Deadline module)
+        httpRequest.deadline = deadline
+        httpRequest.connectTimeout = self._connectTimeout
+        httpRequest.timeout = self._readTimeout
+        if deadline is not None :
+            httpRequest.connectTimeout = deadline.socketTimeout(self._connectTimeout)
+            httpRequest.timeout = deadline.socketTimeout(self._readTimeout)
+        if httpRequest.timeout is None :
+            httpRequest.timeout = socket._GLOBAL_DEFAULT_TIMEOUT
+        return httpRequest
 
-    def _query(self):
+    def _query(self, request=None):
         """Internal method to execute the query. Returns the output of the
         C{urllib2.urlopen} method of the standard Python library
 
+        @param request: the request to execute; by default, the one defined by the current settings of this instance
+        @type request: L{QueryRequest}
         @return: tuples with the raw request plus the expected format
         """
-        request = self._createRequest()
+        if request is None :
+            request = self.createQueryRequest()
+        flights = self._singleFlight
+        if flights is not None and request.queryType not in _updateQueryTypes :
+            def fetch() :
+                response = self._sendQuery(request)[0]
+                try :
+                    return CachedResponse.fromResponse(response, response.read())
+                finally :
+                    response.close()
+            # with the timeout in the key, a caller never waits for a request with a later (or without) deadline
+            return (flights.do(self._cacheKey(request) + (request.timeout,), fetch).response(), request.returnFormat)
+        return self._sendQuery(request)
+
+    def _sendQuery(self, request):
+        """Internal method sending a request to the endpoint (or answering it from the cache), see L{_query}.
+
+        @param request: the request to execute
+        @type request: L{QueryRequest}
+        @return: tuples with the raw request plus the expected format
+        """
+        cache = self._cache
+        cacheKey = None
+        # expired response of the cache, to be revalidated
+        stale = None
+        if cache is not None and request.queryType not in _updateQueryTypes :
+            cacheKey = self._cacheKey(request)
+            cached = cache.get(cacheKey)
+            if cached is not None :
+                return (cached.response(), request.returnFormat)
+            if hasattr(cache, "stale") :
+                stale = cache.stale(cacheKey)
+        policy = self._retryPolicy
+        if policy is not None and request.queryType in _updateQueryTypes and not policy.retryUpdates :
+            policy = None
+        balancer = self._loadBalancer
+        if request.queryType in _updateQueryTypes :
+            # updates go to the update endpoint only: they are neither balanced nor duplicated
+            balancer = None
+        deadline = None
+        if request.timeout is not None :
+            deadline = Deadline(request.timeout)
+
+        attempt = 0
+        # replicas that failed (or are refused by their circuit breaker) during the current attempt
+        failed = set()
+        while True :
+            uri = self._chooseEndpoint(request, failed)
+            if uri is None :
+                breakers = [self._getCircuitBreaker(u) for u in failed]
+                retryIn = min([b.retryIn() for b in breakers if b is not None] or [0.0])
+                raise EndPointUnavailable("%s, retry in %.1f seconds" % (", ".join(sorted(failed)), retryIn))
+            breaker = self._getCircuitBreaker(uri)
+            if breaker is not None and not breaker.allow() :
+                failed.add(uri)
+                continue
+            if deadline is not None :
+                deadline.check()
+            httpRequest = self._createRequest(request, uri, deadline)
+            if stale is not None :
+                self._addValidators(httpRequest, stale)
+            try:
+                if self._hedgePercentile is not None and balancer is not None and uri in balancer.endpoints :
+                    response = self._openHedged(request, uri, httpRequest, failed, policy)
+                else :
+                    response = self._openEndpoint(uri, httpRequest, policy, balancer is not None)
+            except (urllib2.URLError, socket.error, httplib.HTTPException), e:
+                if stale is not None and isinstance(e, urllib2.HTTPError) and e.code == 304 :
+                    # not modified: the stored response is still valid
+                    cache.refresh(cacheKey, freshness(e.info(), getattr(cache, "ttl", None)))
+                    e.close()
+                    return (stale.response(), request.returnFormat)
+                if deadline is not None :
+                    deadline.check()
+                transient = (policy or RetryPolicy()).isTransient(e)
+                if transient and balancer is not None and self._chooseEndpoint(request, failed | set([uri])) is not None :
+                    # fail over to another replica right away
+                    failed.add(uri)
+                    if isinstance(e, urllib2.HTTPError) :
+                        e.close()
+                    continue
+                delay = None
+                if policy is not None and transient and attempt < policy.maxRetries :
+                    delay = policy.delay(attempt, e)
+                if delay is not None and deadline is not None and delay >= deadline.remaining() :
+                    # no time left for another attempt
+                    delay = None
+                if delay is None :
+                    if isinstance(e, urllib2.HTTPError) :
+                        self._handleHTTPError(e)
+                    raise
+                if isinstance(e, urllib2.HTTPError) :
+                    e.close()
+                time.sleep(delay)
+                attempt += 1
+                failed = set()
+            else :
+                if deadline is not None :
+                    response = _wrapResponse(response, DeadlineResponse(response, deadline))
+                if cacheKey is not None and getattr(response, "code", 200) == 200 :
+                    response = self._cachingResponse(cache, cacheKey, response)
+                return (response, request.returnFormat)
+
+    def _cacheKey(self, request):
+        """Internal method returning the key of a request in the result cache (see L{setCache}). It includes a digest of
+        the credentials, so that a cache shared by several instances never answers with the results of other credentials."""
+        credentials = None
+        if request.user is not None or request.passwd is not None :
+            credentials = hashlib.sha1(repr((request.user, request.passwd, request.auth_mode, request.realm)).encode("utf-8")).hexdigest()
+        return (self.endpoint, minify(request.queryString), request.returnFormat, request.method, request.parameters, credentials)
+
+    def _cachingResponse(self, cache, key, response):
+        """Internal method returning a view on a response storing its body in the result cache once read (see L{setCache})."""
+        ttl = freshness(response.info(), getattr(cache, "ttl", None))
+        if ttl is None :
+            # Cache-Control: no-store
+            return response
+        def store(body) :
+            cache.put(key, CachedResponse.fromResponse(response, body), ttl)
+        return _wrapResponse(response, CachingResponse(response, store, getattr(cache, "maxBytes", None)))
+
+    def _addValidators(self, httpRequest, stale):
+        """Internal method making a request conditional on the validators (C{ETag}, C{Last-Modified}) of an expired
+        response of the cache, so that the endpoint answers C{304 Not Modified} if it did not change (see L{setCache})."""
+        for name, value in stale.headers :
+            name = name.lower()
+            if name == "etag" :
+                httpRequest.add_header("If-none-match", value)
+            elif name == "last-modified" :
+                httpRequest.add_header("If-modified-since", value)
+
+    def _openEndpoint(self, uri, httpRequest, policy=None, balance=True):
+        """Internal method sending a request to an endpoint, and recording the outcome in the load balancing
+        statistics and the circuit breaker of the endpoint.
+
+        @param uri: the endpoint URI
+        @param httpRequest: the request
+        @type httpRequest: C{urllib2.Request}
+        @param policy: the retry policy deciding which errors are failures of the endpoint
+        @param balance: whether to record the outcome in the load balancing statistics (not for updates)
+        @type balance: boolean
+        @return: the response
+        """
+        balancer = self._loadBalancer
+        if balancer is not None and (not balance or uri not in balancer.endpoints) :
+            balancer = None
+        breaker = self._getCircuitBreaker(uri)
+        if balancer is not None :
+            balancer.begin(uri)
+        start = time.time()
         try:
-            response = urllib2.urlopen(request)
-            return (response, self.returnFormat)
-        except urllib2.HTTPError, e:
-            if e.code == 400:
-                raise QueryBadFormed(e.read())
-            elif e.code == 404:
-                raise EndPointNotFound(e.read())
-            elif e.code == 500:
-                raise EndPointInternalError(e.read())
-            else:
-                raise e
-            return (None, self.returnFormat)
+            response = self._getTransport().open(httpRequest, httpRequest.timeout)
+        except (urllib2.URLError, socket.error, httplib.HTTPException), e:
+            if getattr(getattr(httpRequest, "deadline", None), "aborted", False) :
+                # the loser of hedged requests: neither a failure nor a latency of the endpoint
+                if balancer is not None :
+                    balancer.cancel(uri)
+                if breaker is not None :
+                    breaker.release()
+                raise
+            transient = (policy or RetryPolicy()).isTransient(e)
+            if balancer is not None :
+                balancer.end(uri, time.time() - start, transient)
+            if breaker is not None :
+                if transient :
+                    breaker.recordFailure()
+                else :
+                    breaker.recordSuccess()
+            raise
+        if balancer is not None :
+            balancer.end(uri, time.time() - start)
+        if breaker is not None :
+            breaker.recordSuccess()
+        return response
+
+    def _openHedged(self, request, uri, httpRequest, failed, policy=None):
+        """Internal method sending a request to a replica and, if it is slower than usual, a duplicate to a second
+        replica (see L{setHedging}). The first successful response is returned; the other request is aborted, ie,
+        its connection is shut down, so that it holds neither a thread nor a connection any longer. If both fail, the
+        second replica is added to C{failed} and the error of the first one is raised.
+
+        @param request: the request
+        @type request: L{QueryRequest}
+        @param uri: the replica chosen for the request
+        @param httpRequest: the request for that replica
+        @type httpRequest: C{urllib2.Request}
+        @param failed: replicas that must not be used as second replica
+        @type failed: set
+        @param policy: the retry policy
+        @return: the response
+        """
+        hedgeDelay = self._loadBalancer.percentile(uri, self._hedgePercentile)
+        if hedgeDelay is None :
+            return self._openEndpoint(uri, httpRequest, policy)
+
+        results = Queue.Queue()
+        lock = threading.Lock()
+        decided = []
+        queryDeadline = httpRequest.deadline
+        # the deadline of each attempt, by endpoint
+        deadlines = {}
+
+        def attempt(endpoint, endpointRequest) :
+            try :
+                result = (endpoint, self._openEndpoint(endpoint, endpointRequest, policy), None)
+            except Exception :
+                result = (endpoint, None, sys.exc_info())
+            lock.acquire()
+            try :
+                if not decided :
+                    results.put(result)
+                    return
+            finally :
+                lock.release()
+            # the race is over: this one lost
+            _closeQuietly(result[1] or result[2][1])
+
+        def start(endpoint, endpointRequest) :
+            # a deadline of its own, so that the loser can be aborted without touching the winner
+            endpointRequest.deadline = deadlines[endpoint] = Deadline(queryDeadline.remaining() if queryDeadline is not None else None)
+            thread = threading.Thread(target=attempt, args=(endpoint, endpointRequest))
+            thread.daemon = True
+            thread.start()
+
+        start(uri, httpRequest)
+        pending = 1
+        try :
+            result = results.get(True, hedgeDelay)
+        except Queue.Empty :
+            hedge = self._loadBalancer.choose(failed | set([uri]))
+            breaker = self._getCircuitBreaker(hedge)
+            if hedge is not None and (breaker is None or breaker.allow()) :
+                start(hedge, self._createRequest(request, hedge, queryDeadline))
+                pending += 1
+            result = results.get()
+        pending -= 1
+        errors = []
+        while result[1] is None :
+            errors.append(result)
+            if not pending :
+                break
+            result = results.get()
+            pending -= 1
+
+        lock.acquire()
+        try :
+            decided.append(result[0])
+            if result[1] is not None :
+                for endpoint, deadline in deadlines.items() :
+                    if endpoint != result[0] :
+                        deadline.abort()
+            while True :
+                try :
+                    late = results.get_nowait()
+                except Queue.Empty :
+                    break
+                _closeQuietly(late[1] or late[2][1])
+        finally :
+            lock.release()
+
+        if result[1] is not None :
+            for endpoint, response, error in errors :
+                _closeQuietly(error[1])
+            return result[1]
+        for endpoint, response, error in errors :
+            if endpoint != uri :
+                failed.add(endpoint)
+                _closeQuietly(error[1])
+        error = [error for endpoint, response, error in errors if endpoint == uri][0]
+        raise error[0], error[1], error[2]
+
+    def _handleHTTPError(self, e):
+        """Internal method to translate an HTTP error of the endpoint into the corresponding
+        L{SPARQLWrapperException<SPARQLExceptions.SPARQLWrapperException>}; other errors are re-raised as they are.
+
+        @param e: the error
+        @type e: C{urllib2.HTTPError}
+        """
+        if e.code == 400:
+            raise QueryBadFormed(e.read())
+        elif e.code == 404:
+            raise EndPointNotFound(e.read())
+        elif e.code == 500:
+            raise EndPointInternalError(e.read())
+        else:
+            raise e
     
     def query(self) :
         """
@@ -421,8 +1186,143 @@ class SPARQLWrapper :
         res = self.query()
         return res.convert()
 
+    def createQueryRequest(self, query=None, **settings) :
+        """
+            Create an immutable L{QueryRequest} from the current settings of this instance (query, return format,
+            method, custom parameters and credentials). The request can then be run via L{execute}.
+            @param query: query text; by default, the one set via L{setQuery}
+            @type query: string
+            @keyword settings: values overriding the settings of the instance; see L{QueryRequest} for the possible keywords
+            @return: the request
+            @rtype: L{QueryRequest}
+        """
+        values = dict(queryString=self.queryString, queryType=self.queryType, returnFormat=self.returnFormat,
+                      method=self.method, customParameters=self.customParameters, user=self.user, passwd=self.passwd,
+                      auth_mode=self.auth_mode, realm=self.realm, timeout=self.timeout)
+        if query is not None :
+            values["queryString"] = query
+            values["queryType"] = self._parseQueryType(query)
+        values.update(settings)
+        return QueryRequest(**values)
+
+    def prepare(self, template, **settings) :
+        """
+            Prepare a query template: the template is analysed (placeholders, query type) once, and values are then
+            bound to its placeholders, with the proper escaping, to get the L{QueryRequest} of each query. The
+            placeholders are the variables written with a C{$}, eg::
+
+                prepared = sparql.prepare("SELECT ?label WHERE { $resource rdfs:label ?label }")
+                result = sparql.execute(prepared.bind(resource=IRI("http://dbpedia.org/resource/Asturias")))
+
+            See the L{PreparedQuery<SPARQLWrapper.PreparedQuery>} module for the values that can be bound.
+            @param template: the query template
+            @type template: string
+            @keyword settings: values overriding the settings of the instance; see L{QueryRequest} for the possible keywords
+            @return: the prepared query, whose requests have the current settings of this instance
+            @rtype: L{PreparedQuery<SPARQLWrapper.PreparedQuery.PreparedQuery>}
+        """
+        prototype = self.createQueryRequest(template, **settings)
+        return PreparedQuery(template, prototype, self._minifyQueries)
+
+    def execute(self, request) :
+        """
+            Execute a L{QueryRequest} against the endpoint of this instance. Unlike L{query}, the method does not
+            depend on, nor change, the query settings of the instance; it can be called from several threads at the same time.
+            @param request: the request to execute
+            @type request: L{QueryRequest}
+            @return: query result
+            @rtype: L{QueryResult} instance
+        """
+        return QueryResult(self._query(request))
+
+    def queryMany(self, queries, maxWorkers=4, ordered=True) :
+        """
+            Execute many queries concurrently, on a pool of C{maxWorkers} threads, against the endpoint of this instance.
+            A query can be given as a string, in which case the current settings (return format, method, custom parameters,
+            credentials) of this instance are used, or as a L{QueryRequest}. The query set by L{setQuery} is left untouched.
+
+            The method is a generator yielding C{(index, result)} pairs, C{index} being the position of the query in
+            C{queries}. The result is what L{execute} would have returned, with the response already read, so it
+            can be kept around without holding a connection. Errors of a single query (L{QueryBadFormed},
+            L{EndPointInternalError}, HTTP or network errors) do not stop the others: the exception instance is
+            yielded as the result of that query.
+
+            @param queries: iterable of query strings or L{QueryRequest} instances
+            @param maxWorkers: number of queries running at the same time
+            @type maxWorkers: int
+            @param ordered: if C{True}, the results are yielded in the order of C{queries}, otherwise as soon as they are available
+            @type ordered: bool
+        """
+        # the settings are taken now, later changes of this instance do not affect the running queries
+        prototype = self.createQueryRequest()
+
+        def run(query) :
+            if not isinstance(query, QueryRequest) :
+                query = prototype.replace(queryString=query, queryType=self._parseQueryType(query))
+            try :
+                result = self.execute(query)
+            except (SPARQLWrapperException, IOError, httplib.HTTPException), e :
+                return e
+            if isinstance(result, QueryResult) :
+                result.response = _bufferResponse(result.response)
+            return result
+        return threadedMap(run, queries, maxWorkers, ordered)
+
 #######################################################################################################
 
+def _encodeParameters(parameters) :
+    """Encode request parameters (in UTF-8) for a query string or a form body.
+    @param parameters: dictionary of parameters
+    @rtype: string
+    """
+    return urllib.urlencode(dict([k, v.encode("utf-8")] for k, v in parameters.items()))
+
+def _encodeValue(value) :
+    """Encode a request parameter value (in UTF-8) for a query string or a form body.
+    @param value: the value
+    @rtype: string
+    """
+    return urllib.quote_plus(value.encode("utf-8"))
+
+class _RequestTemplate :
+    """
+    The parts of the HTTP requests of a L{SPARQLWrapper} that do not depend on the query text.
+
+    @ivar parameters: the custom parameters, return format and time limit, encoded for a query string
+    @ivar headers: the headers (user agent, accepted formats, basic authentication), as a dictionary
+    """
+    def __init__(self, parameters, headers) :
+        self.parameters = parameters
+        self.headers = headers
+
+def _wrapResponse(response, fp) :
+    """Return a response object with the headers, URL and status of C{response}, whose body is read from C{fp}.
+    @param response: file-like object as returned by C{urllib2.urlopen}
+    @param fp: file-like object
+    """
+    wrapped = addinfourl(fp, response.info(), response.geturl())
+    wrapped.code = getattr(response, "code", None)
+    wrapped.msg = getattr(response, "msg", None)
+    return wrapped
+
+def _bufferResponse(response) :
+    """Read a response fully and return an equivalent, in-memory, response object.
+    @param response: file-like object as returned by C{urllib2.urlopen}
+    """
+    buffered = _wrapResponse(response, io.BytesIO(response.read()))
+    response.close()
+    return buffered
+
+def _closeQuietly(response) :
+    """Close a response (or an HTTP error, which holds a response) that will not be read, dropping its connection."""
+    close = getattr(response, "close", None)
+    if close is None :
+        return
+    try :
+        close()
+    except (IOError, socket.error, httplib.HTTPException) :
+        pass
+
 class QueryResult :
     """
     Wrapper around an a query result. Users should not create instances of this class, it is
@@ -543,12 +1443,22 @@ class QueryResult :
         """
         return self.response.read()
 
+    def _convertCSV(self) :
+        """
+        Convert a CSV or TSV result into a string. This method can be overwritten in a subclass
+        for a different conversion method; see L{stream} for the parsed results.
+        @return: converted result
+        @rtype: string
+        """
+        return self.response.read()
+
     def convert(self) :
         """
         Encode the return value depending on the return format:
             - in the case of XML, a DOM top element is returned;
             - in the case of JSON, a simplejson conversion will return a dictionary;
-            - in the case of RDF/XML, the value is converted via RDFLib into a Graph instance.
+            - in the case of RDF/XML, the value is converted via RDFLib into a Graph instance;
+            - in the case of CSV or TSV, the text of the results is returned (see L{stream} to parse them).
         In all other cases the input simply returned.
 
         @return: the converted query result. See the conversion methods for more details.
@@ -571,6 +1481,10 @@ class QueryResult :
                 if (self.requestedFormat != N3 and self.requestedFormat != TURTLE):
                     warnings.warn("Format requested was %s, but N3 (%s) has been returned by the endpoint" % (self.requestedFormat.upper(), ct), RuntimeWarning)
                 return self._convertN3()
+            elif True in [ct.find(q) != -1 for q in _SPARQL_CSV + _SPARQL_TSV] :
+                if (self.requestedFormat != CSV and self.requestedFormat != TSV):
+                    warnings.warn("Format requested was %s, but CSV/TSV (%s) has been returned by the endpoint" % (self.requestedFormat.upper(), ct), RuntimeWarning)
+                return self._convertCSV()
             else :
                 warnings.warn("unknown response content type, returning raw response...", RuntimeWarning)
                 return self.response.read()
@@ -578,6 +1492,52 @@ class QueryResult :
             warnings.warn("unknown response content type, returning raw response...", RuntimeWarning)
             return self.response.read()
 
+    def stream(self) :
+        """
+        Return an incremental reader of the results of a SELECT query: iterating over it yields the solutions as they
+        arrive, so that only one of them at a time is in memory, instead of the whole response and its conversion.
+        See the L{Streaming<SPARQLWrapper.Streaming>} module for the details.
+        @return: the reader; its C{variables} attribute holds the variables of the results
+        @rtype: a reader of the L{Streaming<SPARQLWrapper.Streaming>} module, eg, L{JSONResultReader<SPARQLWrapper.Streaming.JSONResultReader>}
+        @raise ValueError: if the results are not in a format that can be streamed (JSON, XML, CSV or TSV), or are not valid
+        """
+        ct = self.info().get("content-type", "")
+        if True in [ct.find(q) != -1 for q in _SPARQL_XML] :
+            if (self.requestedFormat != XML):
+                warnings.warn("Format requested was %s, but XML (%s) has been returned by the endpoint" % (self.requestedFormat.upper(), ct), RuntimeWarning)
+            return XMLResultReader(self.response)
+        elif True in [ct.find(q) != -1 for q in _SPARQL_JSON] :
+            if (self.requestedFormat != JSON):
+                warnings.warn("Format requested was %s, but JSON (%s) has been returned by the endpoint" % (self.requestedFormat.upper(), ct), RuntimeWarning)
+            return JSONResultReader(self.response)
+        elif True in [ct.find(q) != -1 for q in _SPARQL_CSV] :
+            return CSVResultReader(self.response)
+        elif True in [ct.find(q) != -1 for q in _SPARQL_TSV] :
+            return TSVResultReader(self.response)
+        raise ValueError("results of content type %r cannot be streamed" % ct)
+
+    def toColumns(self) :
+        """
+        Read the results of a SELECT query into a column per variable, eg, NumPy arrays for numbers and dates. The
+        columns are built while the results are parsed (see L{stream}); see the L{Columns<SPARQLWrapper.Columns>}
+        module for the details. Requires NumPy.
+        @return: the columns, by variable
+        @rtype: C{OrderedDict}
+        @raise ValueError: if the results are not in a format that can be streamed, or are not valid
+        @raise ImportError: if NumPy is not installed
+        """
+        return Columns.columns(self.stream())
+
+    def toDataFrame(self) :
+        """
+        Read the results of a SELECT query into a pandas data frame, via L{toColumns}: the strings and IRIs become
+        categoricals. Requires NumPy and pandas.
+        @rtype: C{pandas.DataFrame}
+        @raise ValueError: if the results are not in a format that can be streamed, or are not valid
+        @raise ImportError: if NumPy or pandas is not installed
+        """
+        return Columns.dataFrame(self.toColumns())
+
     def print_results(self, minWidth=None):
         results = self._convertJSON()
         if minWidth :
@@ -182,6 +182,7 @@ __date__    = "2012-08-28"
 __agent__   = "sparqlwrapper %s (http://sparql-wrapper.sourceforge.net/)" % __version__
 
 
-from Wrapper      import SPARQLWrapper, XML, JSON, TURTLE, N3, RDF, GET, POST, SELECT, CONSTRUCT, ASK, DESCRIBE
+from Wrapper      import SPARQLWrapper, QueryRequest, XML, JSON, TURTLE, N3, RDF, CSV, TSV, GET, POST, SELECT, CONSTRUCT, ASK, DESCRIBE
 from SmartWrapper import SPARQLWrapper2
+from AsyncWrapper import AsyncSPARQLWrapper, AsyncSPARQLWrapper2
 
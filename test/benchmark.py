@@ -0,0 +1,98 @@
+# -*- coding: utf8 -*-
+#!/usr/bin/python
+
+"""
+Micro benchmarks of the client side overhead of SPARQLWrapper, ie, without network: the queries are answered by the
+in-process transport of a L{FakeEndpoint<SPARQLWrapper.FakeEndpoint.FakeEndpoint>}.
+
+Run with C{python test/benchmark.py} (the C{src} directory being on the C{PYTHONPATH}).
+"""
+
+import io
+import sys
+import itertools
+import timeit
+from SPARQLWrapper import SPARQLWrapper, SPARQLWrapper2, JSON, XML, CSV, TSV
+from SPARQLWrapper import Columns
+from SPARQLWrapper.FakeEndpoint import FakeEndpoint
+from SPARQLWrapper.PreparedQuery import IRI
+from SPARQLWrapper.Tokenizer import _PROLOGUE
+from SPARQLWrapper.Streaming import JSONResultReader, XMLResultReader, CSVResultReader, TSVResultReader
+from xml.dom.minidom import parse
+from SPARQLWrapper import jsonlayer
+
+selectQuery = """
+    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+    SELECT ?label
+    WHERE {
+        <http://dbpedia.org/resource/Asturias> rdfs:label ?label .
+    }
+"""
+
+def report(name, statement, number) :
+    best = min(timeit.repeat(statement, number=number, repeat=5))
+    sys.stdout.write("%-60s %12.1f us\n" % (name, best / number * 1e6))
+
+def benchmarkRequests() :
+    sparql = SPARQLWrapper("http://example.org/sparql", returnFormat=JSON)
+    sparql.setCredentials("user", "secret")
+    sparql.addCustomParameter("default-graph-uri", "http://example.org/graph")
+    sparql.setTransport(FakeEndpoint(rows=1).transport())
+    request = sparql.createQueryRequest(selectQuery)
+    report("request creation", lambda : sparql._createRequest(request), 20000)
+    report("query (in-process transport)", lambda : sparql.execute(request).response.read(), 5000)
+
+    # a different resource for each query, as in actual use
+    resources = ("http://dbpedia.org/resource/%d" % i for i in itertools.count())
+    def formatted() :
+        sparql.setQuery(selectQuery.replace("<http://dbpedia.org/resource/Asturias>", "<%s>" % next(resources)))
+        return sparql._createRequest(sparql.createQueryRequest())
+    report("request creation, formatted query", formatted, 20000)
+    prepared = sparql.prepare(selectQuery.replace("<http://dbpedia.org/resource/Asturias>", "$resource"))
+    report("request creation, prepared query", lambda : sparql._createRequest(prepared.bind(resource=IRI(next(resources)))), 20000)
+
+# queries the former regular expression of SPARQLWrapper.pattern backtracks on
+pathologicalQueries = [
+    ("many prefixes", "".join("PREFIX p%d: <http://example.org/%d#>\n" % (i, i) for i in range(100)) + selectQuery),
+    ("unterminated prefix IRIs", "PREFIX p: <http://example.org/ " * 50),
+    # exponential with the former regex: each additional declaration doubles the time
+    ("no query form", "PREFIX p: <http://example.org/> " * 8 + "{ ?s ?p ?o }"),
+]
+
+def benchmarkQueryTypes() :
+    for name, query in pathologicalQueries :
+        report("query type, %s (former regex)" % name, lambda : SPARQLWrapper.pattern.search(query), 2)
+        # the scan itself, bypassing the memoization
+        report("query type, %s (prologue scan)" % name, lambda : _PROLOGUE.match(query), 1000)
+
+def benchmarkResults() :
+    # the JSON results of a large SELECT query
+    sparql = SPARQLWrapper("http://example.org/sparql", returnFormat=JSON)
+    sparql.setTransport(FakeEndpoint(rows=10000).transport())
+    body = sparql.execute(sparql.createQueryRequest("SELECT ?s ?p ?o WHERE { ?s ?p ?o }")).response.read()
+    report("10000 JSON results, decoded at once", lambda : len(jsonlayer.decode(io.BytesIO(body).read().decode("utf-8"))["results"]["bindings"]), 5)
+    report("10000 JSON results, streamed", lambda : sum(1 for solution in JSONResultReader(io.BytesIO(body))), 5)
+    body = sparql.execute(sparql.createQueryRequest("SELECT ?s ?p ?o WHERE { ?s ?p ?o }", returnFormat=XML)).response.read()
+    report("10000 XML results, minidom", lambda : len(parse(io.BytesIO(body)).getElementsByTagName("result")), 5)
+    report("10000 XML results, streamed", lambda : sum(1 for solution in XMLResultReader(io.BytesIO(body))), 5)
+    for returnFormat, reader in ((CSV, CSVResultReader), (TSV, TSVResultReader)) :
+        body = sparql.execute(sparql.createQueryRequest("SELECT ?s ?p ?o WHERE { ?s ?p ?o }", returnFormat=returnFormat)).response.read()
+        report("10000 %s results, streamed" % returnFormat.upper(), lambda : sum(1 for solution in reader(io.BytesIO(body))), 5)
+
+def benchmarkColumns() :
+    if Columns.numpy is None :
+        sys.stdout.write("columns: NumPy is not installed\n")
+        return
+    sparql = SPARQLWrapper2("http://example.org/sparql")
+    sparql.setTransport(FakeEndpoint(rows=10000).transport())
+    request = sparql.createQueryRequest("SELECT ?s ?p ?o WHERE { ?s ?p ?o }")
+    report("10000 JSON results, Bindings", lambda : len(sparql.execute(request).bindings), 5)
+    report("10000 JSON results, streamed to columns", lambda : len(sparql.streamQuery(request).toColumns()), 5)
+    request = request.replace(returnFormat=TSV)
+    report("10000 TSV results, streamed to columns", lambda : len(sparql.streamQuery(request).toColumns()), 5)
+
+if __name__ == "__main__":
+    benchmarkRequests()
+    benchmarkQueryTypes()
+    benchmarkResults()
+    benchmarkColumns()
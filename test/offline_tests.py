@@ -0,0 +1,757 @@
+# -*- coding: utf8 -*-
+#!/usr/bin/python
+
+"""
+Tests running against the local L{FakeEndpoint<SPARQLWrapper.FakeEndpoint.FakeEndpoint>}, ie, without network access.
+"""
+
+import io
+import gzip
+import zlib
+import os
+import re
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from urllib2 import HTTPError, URLError
+from httplib import HTTPException
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import pandas
+except ImportError:
+    pandas = None
+from SPARQLWrapper import SPARQLWrapper, SPARQLWrapper2, AsyncSPARQLWrapper, QueryRequest, XML, N3, JSON, CSV, TSV, POST, GET, SELECT, ASK
+from SPARQLWrapper.FakeEndpoint import FakeEndpoint
+from SPARQLWrapper.ConnectionPool import ConnectionPool
+from SPARQLWrapper.PreparedQuery import IRI, Literal
+from SPARQLWrapper.Cache import ResultCache, DiskCache
+from SPARQLWrapper.Streaming import JSONResultReader, XMLResultReader, CSVResultReader, TSVResultReader
+from SPARQLWrapper.RetryPolicy import RetryPolicy, CircuitBreaker
+from SPARQLWrapper.SPARQLExceptions import QueryBadFormed, EndPointNotFound, EndPointInternalError, EndPointUnavailable, QueryTimeout
+
+try:
+    bytes   # Python 2.6 and above
+except NameError:
+    bytes = str
+
+selectQuery = """
+    SELECT ?s ?p ?o
+    WHERE { ?s ?p ?o }
+"""
+
+prefixes = """
+    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+"""
+
+askQuery = """
+    ASK { ?s ?p ?o }
+"""
+
+constructQuery = """
+    CONSTRUCT { ?s ?p ?o }
+    WHERE { ?s ?p ?o }
+"""
+
+class FakeEndpointTests(unittest.TestCase):
+
+    def setUp(self):
+        self.endpoint = FakeEndpoint(rows=5)
+        self.endpoint.start()
+
+    def tearDown(self):
+        self.endpoint.stop()
+
+    def __sparql(self, query, returnFormat, method=GET):
+        sparql = SPARQLWrapper(self.endpoint.url)
+        sparql.setQuery(query)
+        sparql.setReturnFormat(returnFormat)
+        sparql.setMethod(method)
+        return sparql
+
+    def testSelectByGETinJSON(self):
+        results = self.__sparql(selectQuery, JSON).query().convert()
+        self.assertEqual(results["head"]["vars"], ["s", "p", "o"])
+        self.assertEqual(len(results["results"]["bindings"]), 5)
+
+    def testSelectByPOSTinXML(self):
+        results = self.__sparql(selectQuery, XML, POST).query().convert()
+        self.assertEqual(len(results.getElementsByTagName("result")), 5)
+        self.assertEqual(self.endpoint.requests[-1].method, "POST")
+        self.assertEqual(self.endpoint.requests[-1].query, selectQuery)
+
+    def testAskByGETinJSON(self):
+        results = self.__sparql(askQuery, JSON).query().convert()
+        self.assertEqual(results["boolean"], True)
+
+    def testConstructByGETinN3(self):
+        results = self.__sparql(constructQuery, N3).query().convert()
+        self.assertEqual(type(results), bytes)
+        self.assertEqual(len(results.splitlines()), 5)
+
+    def testQueryBadFormed(self):
+        self.endpoint.addResponse("BROKEN", "syntax error", "text/plain", 400)
+        self.assertRaises(QueryBadFormed, self.__sparql("SELECT BROKEN", JSON).query)
+
+    def testEndPointInternalError(self):
+        self.endpoint.addResponse("BROKEN", "internal error", "text/plain", 500)
+        self.assertRaises(EndPointInternalError, self.__sparql("SELECT BROKEN", JSON).query)
+
+    def testMinifiedQuery(self):
+        sparql = self.__sparql(prefixes + "# all triples\n" + selectQuery, JSON)
+        sparql.query()
+        self.assertEqual(self.endpoint.requests[-1].query, prefixes + "# all triples\n" + selectQuery)
+        sparql.setMinifyQueries(True)
+        sparql.query()
+        self.assertEqual(self.endpoint.requests[-1].query, "SELECT ?s ?p ?o WHERE{?s ?p ?o}")
+
+    def testQueryType(self):
+        sparql = SPARQLWrapper(self.endpoint.url)
+        self.assertEqual(sparql._parseQueryType("# SELECT\nBASE <http://example.org/>" + prefixes + constructQuery), "CONSTRUCT")
+        self.assertEqual(sparql._parseQueryType("prefix select: <http://example.org/> ask {}"), ASK)
+        self.assertEqual(sparql._parseQueryType("WITH <http://example.org/g> DELETE { ?s ?p ?o } WHERE { ?s ?p ?o }"), "DELETE")
+        self.assertEqual(sparql._parseQueryType("CLEAR GRAPH <http://example.org/g>"), "CLEAR")
+        self.assertEqual(sparql._parseQueryType("LOAD <http://example.org/data.ttl>"), "LOAD")
+        self.assertEqual(sparql._parseQueryType('DEFINE input:inference "x" CONSTRUCT { ?s ?p ?o } WHERE { ?s ?p ?o }'), "CONSTRUCT")
+        self.assertEqual(sparql._parseQueryType("define sql:log-enable 3\ndefine input:default-graph-uri <http://example.org/g>\n" + prefixes + askQuery), ASK)
+
+    def testPreparedQuery(self):
+        sparql = self.__sparql(selectQuery, JSON)
+        sparql.setMinifyQueries(True)
+        prepared = sparql.prepare(prefixes + "SELECT ?label WHERE { $resource rdfs:label ?label FILTER(?label != $label) } LIMIT $limit")
+        self.assertEqual(prepared.queryType, SELECT)
+        self.assertEqual(prepared.placeholders, frozenset(["resource", "label", "limit"]))
+        request = prepared.bind(resource=IRI("http://example.org/a"), label=Literal('say "hi"', lang="en"), limit=10)
+        self.assertEqual(request.returnFormat, JSON)
+        sparql.execute(request).convert()
+        self.assertEqual(self.endpoint.requests[-1].query, 'PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#> '
+                         'SELECT ?label WHERE{<http://example.org/a> rdfs:label ?label FILTER(?label != "say \\"hi\\""@en)}LIMIT 10')
+        self.assertRaises(ValueError, IRI, "http://example.org/a> } ; DROP ALL ; {")
+        self.assertRaises(ValueError, prepared.bind, resource=IRI("http://example.org/a"))
+
+    def testBatchLookup(self):
+        sparql = SPARQLWrapper2(self.endpoint.url)
+        sparql.setMinifyQueries(True)
+        keys = [IRI("http://example.org/s/%d" % i) for i in range(8)]
+        results = list(sparql.batchLookup(selectQuery, "s", keys + keys[:2], batchSize=3))
+        self.assertEqual(len(self.endpoint.requests), 3)
+        self.assertTrue(self.endpoint.requests[0].query.startswith(
+            "SELECT ?s ?p ?o WHERE{VALUES ?s{<http://example.org/s/0> <http://example.org/s/1> <http://example.org/s/2>}"))
+        self.assertEqual([key for key, bindings in results], keys)
+        self.assertEqual([len(bindings) for key, bindings in results], [1, 1, 1, 1, 1, 0, 0, 0])
+        self.assertEqual(results[4][1][0]["o"].value, "value 4")
+        self.assertRaises(ValueError, list, sparql.batchLookup(selectQuery, "x", keys))
+
+    def testIterate(self):
+        sparql = SPARQLWrapper2(self.endpoint.url)
+        sparql.setMinifyQueries(True)
+        values = [binding["o"].value for binding in sparql.iterate(selectQuery, pageSize=2)]
+        self.assertEqual(values, ["value %d" % i for i in range(5)])
+        self.assertEqual([request.query for request in self.endpoint.requests],
+                         ["SELECT ?s ?p ?o WHERE{?s ?p ?o} ORDER BY ?s ?p ?o LIMIT 2 OFFSET %d" % offset for offset in (0, 2, 4)])
+        values = [binding["o"].value for binding in sparql.iterate(selectQuery + "ORDER BY ?o LIMIT 3 OFFSET 1", pageSize=2, prefetch=False)]
+        self.assertEqual(values, ["value 1", "value 2", "value 3"])
+        self.assertEqual(self.endpoint.requests[-1].query, "SELECT ?s ?p ?o WHERE{?s ?p ?o}ORDER BY ?o LIMIT 1 OFFSET 3")
+
+    def testIterateCapped(self):
+        self.endpoint.maxRows = 2
+        sparql = SPARQLWrapper2(self.endpoint.url)
+        sparql.setMinifyQueries(True)
+        values = [binding["o"].value for binding in sparql.iterate(selectQuery, pageSize=4)]
+        self.assertEqual(values, ["value %d" % i for i in range(5)])
+        # the rest of a capped page is asked for; a response shorter than the cap is the last one
+        self.assertEqual([request.query[-16:] for request in self.endpoint.requests],
+                         ["LIMIT 4 OFFSET 0", "LIMIT 2 OFFSET 2", "LIMIT 4 OFFSET 4"])
+
+    def testScan(self):
+        sparql = SPARQLWrapper2(self.endpoint.url)
+        sparql.setMinifyQueries(True)
+        values = [binding["o"].value for binding in sparql.scan(selectQuery, partitions=3, pageSize=2)]
+        self.assertEqual(values, ["value %d" % i for i in range(5)])
+        for bucket in ("0", "1") :
+            self.endpoint.addResponse('IN\\("%s".*OFFSET 0$' % bucket, '{"head": {"vars": ["s"]}, "results": {"bindings": ['
+                                      '{"s": {"type": "uri", "value": "http://example.org/%s"}}]}}' % bucket)
+        self.endpoint.addResponse("MD5", '{"head": {"vars": ["s"]}, "results": {"bindings": []}}')
+        values = sorted(binding["s"].value for binding in sparql.scan(selectQuery, partitions=2, variable="s"))
+        self.assertEqual(values, ["http://example.org/0", "http://example.org/1"])
+        queries = sorted(request.query for request in self.endpoint.requests if "MD5" in request.query)
+        self.assertEqual(queries[0], 'SELECT ?s ?p ?o WHERE{FILTER(SUBSTR(MD5(STR(?s)),1,1)IN("0","2","4","6","8","a","c","e"))?s ?p ?o} '
+                                     'ORDER BY ?s ?p ?o LIMIT 1000 OFFSET 0')
+
+    def testResultCache(self):
+        sparql = self.__sparql(selectQuery, JSON)
+        cache = ResultCache(maxEntries=2)
+        sparql.setCache(cache)
+        results = sparql.query().convert()
+        sparql.setQuery("# same query\n" + selectQuery)
+        self.assertEqual(sparql.query().convert(), results)
+        self.assertEqual(len(self.endpoint.requests), 1)
+        sparql.setReturnFormat(XML)
+        sparql.query().convert()
+        sparql.setQuery(askQuery)
+        sparql.query().convert()
+        self.assertEqual(len(self.endpoint.requests), 3)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"], stats["entries"]), (1, 3, 1, 2))
+        # the results of other credentials are not shared
+        sparql.setCredentials("user", "secret")
+        sparql.query().convert()
+        other = self.__sparql(askQuery, XML)
+        other.setCache(cache)
+        other.setCredentials("user", "wrong")
+        other.query().convert()
+        self.assertEqual(len(self.endpoint.requests), 5)
+        other.setCredentials("user", "secret")
+        other.query().convert()
+        self.assertEqual(len(self.endpoint.requests), 5)
+
+    def testDiskCache(self):
+        self.endpoint.addResponse("ASK", '{"head" : {}, "boolean" : true}', headers={"ETag" : '"v1"', "Cache-Control" : "max-age=0"})
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "cache.db")
+            sparql = self.__sparql(askQuery, JSON)
+            sparql.setCache(DiskCache(path))
+            self.assertEqual(sparql.query().convert()["boolean"], True)
+            # another cache on the same file: expired, hence revalidated
+            cache = DiskCache(path)
+            sparql.setCache(cache)
+            self.assertEqual(sparql.query().convert()["boolean"], True)
+            self.assertEqual(len(self.endpoint.requests), 2)
+            self.assertEqual(self.endpoint.requests[-1].headers.get("if-none-match"), '"v1"')
+            self.assertEqual(cache.stats()["revalidations"], 1)
+            # renewed for the default time to live
+            self.assertEqual(sparql.query().convert()["boolean"], True)
+            self.assertEqual(len(self.endpoint.requests), 2)
+        finally:
+            shutil.rmtree(directory)
+
+    def testCoalescing(self):
+        self.endpoint.latency = 0.3
+        sparql = self.__sparql(selectQuery, JSON)
+        sparql.setCoalescing()
+        results = []
+        def query():
+            results.append(sparql.query().convert())
+        threads = [threading.Thread(target=query) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.endpoint.requests), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result == results[0] for result in results))
+        # no coalescing once the first request is over
+        sparql.query().convert()
+        self.assertEqual(len(self.endpoint.requests), 2)
+        # a query with a timeout does not wait for one without
+        self.endpoint.latency = 1.0
+        thread = threading.Thread(target=query)
+        thread.start()
+        time.sleep(0.1)
+        sparql = self.__sparql(selectQuery, JSON)
+        sparql.setCoalescing()
+        sparql.setTimeout(0.2)
+        start = time.time()
+        self.assertRaises(QueryTimeout, sparql.query)
+        self.assertTrue(time.time() - start < 0.8)
+        thread.join()
+        self.assertEqual(len(self.endpoint.requests), 4)
+        # nor does a query with other credentials
+        self.endpoint.latency = 0.3
+        instances = []
+        for passwd in ("secret", "wrong", "secret"):
+            instance = self.__sparql(selectQuery, JSON)
+            instance.setCoalescing()
+            instance.setCredentials("user", passwd)
+            instances.append(instance)
+        threads = [threading.Thread(target=instance.query) for instance in instances]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.endpoint.requests), 6)
+
+    def testStreamJSON(self):
+        sparql = SPARQLWrapper2(self.endpoint.url)
+        sparql.setQuery(selectQuery)
+        results = sparql.streamQuery()
+        self.assertEqual(results.variables, ["s", "p", "o"])
+        self.assertEqual([binding["o"].value for binding in results.bindings], ["value %d" % i for i in range(5)])
+        # solutions split across blocks, head after the results
+        body = u'{"results" : {"bindings" : [{"x" : {"type" : "literal", "value" : "caf\u00e9 \\"1\\""}}, ' \
+               u'{"x" : {"type" : "typed-literal", "datatype" : "http://www.w3.org/2001/XMLSchema#integer", "value" : "12"}}]}, ' \
+               u'"head" : {"vars" : ["x"]}, "extra" : 12345}'
+        reader = JSONResultReader(io.BytesIO(body.encode("utf-8")), chunkSize=7)
+        self.assertEqual(reader.variables, None)
+        self.assertEqual([solution["x"]["value"] for solution in reader], [u"caf\u00e9 \"1\"", u"12"])
+        self.assertEqual((reader.variables, reader.members), ([u"x"], {u"extra" : 12345}))
+        self.assertEqual(JSONResultReader(io.BytesIO(b'{"head" : {}, "boolean" : true}')).boolean, True)
+        self.assertRaises(ValueError, list, JSONResultReader(io.BytesIO(b'{"head" : {}, "results" : {"bindings" : [{}, {"x')))
+
+    def testStreamXML(self):
+        sparql = SPARQLWrapper2(self.endpoint.url)
+        sparql.setQuery(selectQuery)
+        expected = [dict((variable, (value.type, value.value)) for variable, value in binding.items()) for binding in sparql.query().bindings]
+        results = sparql.streamQuery(sparql.createQueryRequest(returnFormat=XML))
+        self.assertEqual(results.variables, ["s", "p", "o"])
+        self.assertEqual([dict((variable, (value.type, value.value)) for variable, value in binding.items()) for binding in results.bindings], expected)
+        self.assertEqual(self.endpoint.requests[-1].parameters["format"], ["xml"])
+        body = b"""<?xml version="1.0"?>
+<sparql xmlns="http://www.w3.org/2005/sparql-results#"><head><variable name="x"/><link href="meta.rdf"/></head>
+<results><result><binding name="x"><literal xml:lang="fr">caf\xc3\xa9</literal></binding></result>
+<result><binding name="x"><literal datatype="http://www.w3.org/2001/XMLSchema#integer">12</literal></binding></result>
+<result/></results></sparql>"""
+        reader = XMLResultReader(io.BytesIO(body))
+        self.assertEqual(reader.head, {"vars" : ["x"], "link" : ["meta.rdf"]})
+        self.assertEqual(list(reader), [{"x" : {"type" : "literal", "value" : u"caf\u00e9", "xml:lang" : "fr"}},
+                                        {"x" : {"type" : "typed-literal", "value" : u"12", "datatype" : "http://www.w3.org/2001/XMLSchema#integer"}},
+                                        {}])
+        sparql.setQuery(askQuery)
+        self.assertEqual(sparql.execute(sparql.createQueryRequest(returnFormat=XML)).stream().boolean, True)
+        self.assertRaises(ValueError, list, XMLResultReader(io.BytesIO(body[:-30])))
+
+    def testCSVAndTSV(self):
+        sparql = self.__sparql(selectQuery, CSV)
+        result = sparql.query()
+        self.assertEqual(result.info()["content-type"], "text/csv; charset=utf-8")
+        self.assertTrue(result.convert().startswith(b"s,p,o\r\nhttp://example.org/s/0,"))
+        self.assertEqual(self.endpoint.requests[-1].headers["accept"], "text/csv")
+        solutions = list(sparql.query().stream())
+        self.assertEqual(solutions[1]["o"], {"type" : "literal", "value" : "value 1"})
+        sparql.setReturnFormat(TSV)
+        solutions = list(sparql.query().stream())
+        self.assertEqual(len(solutions), 5)
+        self.assertEqual(solutions[1]["s"], {"type" : "uri", "value" : "http://example.org/s/1"})
+        self.assertEqual(self.endpoint.requests[-1].headers["accept"], "text/tab-separated-values")
+
+        body = u'a,b\r\n"caf\u00e9, ""au lait""",_:b0\r\n,"two\nlines"\r\n'.encode("utf-8")
+        self.assertEqual(list(CSVResultReader(io.BytesIO(body))),
+                         [{"a" : {"type" : "literal", "value" : u'caf\u00e9, "au lait"'}, "b" : {"type" : "bnode", "value" : "b0"}},
+                          {"b" : {"type" : "literal", "value" : "two\nlines"}}])
+        body = u'?a\t?b\n"caf\u00e9\\t\\"x\\""@fr\t12\n_:b0\t\n\t"1"^^<http://www.w3.org/2001/XMLSchema#byte>\n'.encode("utf-8")
+        reader = TSVResultReader(io.BytesIO(body))
+        self.assertEqual(reader.variables, ["a", "b"])
+        self.assertEqual(list(reader),
+                         [{"a" : {"type" : "literal", "value" : u'caf\u00e9\t"x"', "xml:lang" : "fr"},
+                           "b" : {"type" : "typed-literal", "value" : "12", "datatype" : "http://www.w3.org/2001/XMLSchema#integer"}},
+                          {"a" : {"type" : "bnode", "value" : "b0"}},
+                          {"b" : {"type" : "typed-literal", "value" : "1", "datatype" : "http://www.w3.org/2001/XMLSchema#byte"}}])
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def testToColumns(self):
+        xsd = "http://www.w3.org/2001/XMLSchema#"
+        rows = [u'<http://example.org/a>\t1\t"2.5"^^<%sdouble>\ttrue\t"2012-08-28"^^<%sdate>\t"2012-08-28T10:00:00+02:00"^^<%sdateTime>\t"x"@en' % (xsd, xsd, xsd),
+                u'<http://example.org/b>\t2\t\tfalse\t\t"2012-08-28T08:30:00Z"^^<%sdateTime>\t"x"' % xsd,
+                u'<http://example.org/a>\t3\t"-INF"^^<%sdouble>\tfalse\t"2012-08-29"^^<%sdate>\t\t"y"' % (xsd, xsd)]
+        self.endpoint.addResponse("SELECT", u"?iri\t?n\t?x\t?flag\t?day\t?time\t?label\n" + u"\n".join(rows) + u"\n",
+                                  "text/tab-separated-values")
+        sparql = SPARQLWrapper2(self.endpoint.url)
+        sparql.setQuery(selectQuery)
+        columns = sparql.streamQuery(sparql.createQueryRequest(returnFormat=TSV)).toColumns()
+        self.assertEqual(list(columns), ["iri", "n", "x", "flag", "day", "time", "label"])
+        self.assertEqual((list(columns["iri"].codes), columns["iri"].categories), ([0, 1, 0], ["http://example.org/a", "http://example.org/b"]))
+        self.assertEqual((columns["n"].dtype, list(columns["n"])), (numpy.int64, [1, 2, 3]))
+        self.assertEqual(columns["x"][0], 2.5)
+        self.assertTrue(numpy.isnan(columns["x"][1]) and numpy.isneginf(columns["x"][2]))
+        self.assertEqual((columns["flag"].dtype, list(columns["flag"])), (numpy.bool_, [True, False, False]))
+        self.assertEqual(list(columns["day"].astype(str)), ["2012-08-28", "NaT", "2012-08-29"])
+        self.assertEqual(list(columns["time"].astype(str)), ["2012-08-28T08:00:00.000000", "2012-08-28T08:30:00.000000", "NaT"])
+        self.assertEqual(list(columns["label"]), ["x", "x", "y"])
+        # the same, from JSON results converted at once
+        self.endpoint._responses = []
+        columns = sparql.query().toColumns()
+        self.assertEqual(list(columns["o"]), ["value %d" % i for i in range(5)])
+        if pandas is not None:
+            frame = sparql.query().toDataFrame()
+            self.assertEqual(list(frame.columns), ["s", "p", "o"])
+            self.assertEqual(str(frame["o"].dtype), "category")
+
+    def testLongQueryByPOST(self):
+        values = " ".join("<http://example.org/%d>" % i for i in range(200))
+        sparql = self.__sparql("SELECT ?s WHERE { VALUES ?s { %s } }" % values, JSON)
+        sparql.addCustomParameter("default-graph-uri", "http://example.org/graph")
+        sparql.query().convert()
+        request = self.endpoint.requests[-1]
+        self.assertEqual(request.method, "POST")
+        self.assertEqual(request.parameters["default-graph-uri"], ["http://example.org/graph"])
+        self.assertEqual(request.parameters["format"], ["json"])
+        sparql.setMaxURILength(None)
+        sparql.query().convert()
+        self.assertEqual(self.endpoint.requests[-1].method, "GET")
+
+    def testConnectionPool(self):
+        sparql = self.__sparql(selectQuery, JSON)
+        sparql.setUseConnectionPool(healthCheck=False)
+        for i in range(5):
+            self.assertEqual(len(sparql.query().convert()["results"]["bindings"]), 5)
+        # the sequential queries share a single connection
+        self.assertEqual(self.endpoint.connections, 1)
+
+        # a query on a connection closed by the server is sent again on a new one
+        self.endpoint.closeConnections()
+        self.assertEqual(len(sparql.query().convert()["results"]["bindings"]), 5)
+        self.assertEqual(self.endpoint.connections, 2)
+
+        # but not an update, which may have been run
+        sparql.setQuery("INSERT DATA { <http://example.org/s> <http://example.org/p> 1 }")
+        sparql.setMethod(POST)
+        self.endpoint.closeConnections()
+        self.assertRaises((URLError, HTTPException, socket.error), sparql.query)
+        self.assertEqual(self.endpoint.connections, 2)
+        self.assertFalse([request for request in self.endpoint.requests if request.method == "POST"])
+        sparql.close()
+
+        # with the health check, the closed connection is not even used
+        sparql.setUseConnectionPool(idleTimeout=0.2)
+        sparql.setQuery(selectQuery)
+        sparql.query().convert()
+        self.endpoint.closeConnections()
+        sparql.setQuery("INSERT DATA { <http://example.org/s> <http://example.org/p> 1 }")
+        sparql.setMethod(POST)
+        sparql.query().response.read()
+        self.assertEqual(self.endpoint.connections, 4)
+        # an idle connection is closed after the idle timeout
+        time.sleep(0.3)
+        sparql.setQuery(selectQuery)
+        sparql.query().convert()
+        self.assertEqual(self.endpoint.connections, 5)
+        sparql.close()
+
+    def testConnectionPoolWaiters(self):
+        pool = ConnectionPool(maxConnections=1)
+        hostA, hostB = ("http", "a.example.org"), ("http", "b.example.org")
+        pool.acquire(hostA, lambda: None)
+        pool.acquire(hostB, lambda: None)
+        waiters = []
+        for host in (hostA, hostB):
+            waiter = threading.Thread(target=pool.acquire, args=(host, lambda: None))
+            waiter.daemon = True
+            waiter.start()
+            waiters.append(waiter)
+            time.sleep(0.05)
+        # the waiter of host B gets the connection released for it, although the one of host A waits too
+        pool.release(hostB, None)
+        waiters[1].join(1.0)
+        self.assertFalse(waiters[1].is_alive())
+        pool.release(hostA, None)
+        waiters[0].join(1.0)
+        self.assertFalse(waiters[0].is_alive())
+        # no connection becomes free within the block timeout
+        pool.blockTimeout = 0.1
+        start = time.time()
+        self.assertRaises(URLError, pool.acquire, hostA, lambda: None)
+        self.assertTrue(0.1 <= time.time() - start < 0.5)
+
+    def testCompression(self):
+        body = b'{"head" : {}, "boolean" : true}'
+        compressed = io.BytesIO()
+        stream = gzip.GzipFile(fileobj=compressed, mode="wb")
+        stream.write(body)
+        stream.close()
+        deflater = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.endpoint.addResponse("GZIP", compressed.getvalue(), headers={"Content-Encoding" : "gzip"})
+        self.endpoint.addResponse("ZLIB", zlib.compress(body), headers={"Content-Encoding" : "deflate"})
+        self.endpoint.addResponse("RAW", deflater.compress(body) + deflater.flush(), headers={"Content-Encoding" : "deflate"})
+        sparql = self.__sparql(askQuery, JSON)
+        for name in ("GZIP", "ZLIB", "RAW"):
+            sparql.setQuery("ASK { ?%s ?p ?o }" % name)
+            self.assertEqual(sparql.query().convert()["boolean"], True)
+            self.assertTrue(self.endpoint.requests[-1].headers["accept-encoding"].startswith("gzip, deflate"))
+        # opting out for another endpoint, then for this one
+        sparql.setUseCompression(False, "http://example.org/sparql")
+        sparql.setQuery("ASK { ?GZIP ?p ?o }")
+        self.assertEqual(sparql.query().convert()["boolean"], True)
+        sparql.setUseCompression(False, self.endpoint.url)
+        self.assertEqual(sparql.query().response.read(), compressed.getvalue())
+        self.assertEqual(self.endpoint.requests[-1].headers.get("accept-encoding", "identity"), "identity")
+        sparql.setUseCompression(True)
+        self.assertEqual(sparql.query().convert()["boolean"], True)
+
+    def testExecuteAndQueryMany(self):
+        sparql = SPARQLWrapper(self.endpoint.url, returnFormat=JSON)
+        request = sparql.createQueryRequest(askQuery)
+        self.assertEqual(request.queryType, ASK)
+        self.assertEqual(sparql.execute(request).convert()["boolean"], True)
+        results = dict(sparql.queryMany([selectQuery, askQuery, request]))
+        self.assertEqual(sorted(results.keys()), [0, 1, 2])
+        self.assertEqual(results[2].convert()["boolean"], True)
+
+    def testFailover(self):
+        broken = FakeEndpoint()
+        broken.addResponse(".", "unavailable", "text/plain", 503)
+        broken.start()
+        try:
+            sparql = SPARQLWrapper([broken.url, self.endpoint.url], returnFormat=JSON)
+            sparql.setQuery(askQuery)
+            for i in range(4):
+                self.assertEqual(sparql.query().convert()["boolean"], True)
+        finally:
+            broken.stop()
+
+    def testDigestAuth(self):
+        self.endpoint.setDigestAuth("user", "secret")
+        sparql = self.__sparql(askQuery, JSON)
+        sparql.setCredentials("user", "secret", mode="digest")
+        # the first query is challenged, the next ones are authenticated right away
+        for i in range(3):
+            self.assertEqual(sparql.query().convert()["boolean"], True)
+        self.assertEqual([request.headers.get("authorization", "")[:6] for request in self.endpoint.requests], ["", "Digest", "Digest", "Digest"])
+        # a stale nonce: a new challenge, remembered for the next queries
+        self.endpoint.renewNonce()
+        for i in range(2):
+            self.assertEqual(sparql.query().convert()["boolean"], True)
+        nonces = [re.search('nonce="(.*?)"', request.headers["authorization"]).group(1) for request in self.endpoint.requests[3:]]
+        self.assertEqual(len(nonces), 4)
+        self.assertTrue(nonces[0] == nonces[1] != nonces[2] == nonces[3])
+        other = self.__sparql(askQuery, JSON)
+        other.setCredentials("user", "wrong", mode="digest")
+        self.assertRaises(HTTPError, other.query)
+
+    def testRetryPolicy(self):
+        policy = RetryPolicy(backoffFactor=0.1, maxBackoff=0.3, jitter=False)
+        self.assertEqual([policy.delay(attempt) for attempt in range(4)], [0.1, 0.2, 0.3, 0.3])
+        policy.jitter = True
+        for attempt in range(4):
+            delays = [policy.delay(attempt) for i in range(100)]
+            self.assertTrue(0 <= min(delays) and max(delays) <= min(0.3, 0.1 * 2 ** attempt))
+        sparql = self.__sparql(askQuery, JSON)
+        sparql.setRetryPolicy(RetryPolicy(backoffFactor=0.05, jitter=False))
+        # two failures, then the result, after 0.05 and 0.1 seconds
+        self.endpoint.addResponse(".", "unavailable", "text/plain", 503, times=2)
+        start = time.time()
+        self.assertEqual(sparql.query().convert()["boolean"], True)
+        self.assertTrue(time.time() - start >= 0.15)
+        self.assertEqual(len(self.endpoint.requests), 3)
+        # the delay asked for by the endpoint
+        self.endpoint.addResponse(".", "unavailable", "text/plain", 503, {"Retry-After" : "1"}, times=1)
+        start = time.time()
+        self.assertEqual(sparql.query().convert()["boolean"], True)
+        self.assertTrue(time.time() - start >= 1.0)
+        self.assertEqual(len(self.endpoint.requests), 5)
+        # ... unless it is too long
+        self.endpoint.addResponse(".", "unavailable", "text/plain", 503, {"Retry-After" : "60"}, times=1)
+        self.assertRaises(HTTPError, sparql.query)
+        self.assertEqual(len(self.endpoint.requests), 6)
+        # no retry of a request the endpoint rejects
+        self.endpoint.addResponse(".", "syntax error", "text/plain", 400, times=1)
+        self.assertRaises(QueryBadFormed, sparql.query)
+        self.assertEqual(len(self.endpoint.requests), 7)
+
+    def testCircuitBreaker(self):
+        breaker = CircuitBreaker(failureThreshold=2, recoveryTimeout=0.2)
+        sparql = self.__sparql(askQuery, JSON)
+        sparql.setCircuitBreaker(breaker.failureThreshold, breaker.recoveryTimeout)
+        self.endpoint.addResponse(".", "unavailable", "text/plain", 503, times=3)
+        self.assertRaises(HTTPError, sparql.query)
+        self.assertRaises(HTTPError, sparql.query)
+        # open: the endpoint is spared
+        self.assertRaises(EndPointUnavailable, sparql.query)
+        self.assertEqual(len(self.endpoint.requests), 2)
+        # half open: a single trial query, failing
+        time.sleep(0.25)
+        self.assertRaises(HTTPError, sparql.query)
+        self.assertRaises(EndPointUnavailable, sparql.query)
+        self.assertEqual(len(self.endpoint.requests), 3)
+        # half open, then closed by a successful trial
+        time.sleep(0.25)
+        self.assertEqual(sparql.query().convert()["boolean"], True)
+        self.assertEqual(sparql.query().convert()["boolean"], True)
+        self.assertEqual(len(self.endpoint.requests), 5)
+        # the transitions, one by one
+        breaker.recordFailure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.recordFailure()
+        self.assertEqual((breaker.state, breaker.allow()), (CircuitBreaker.OPEN, False))
+        time.sleep(0.25)
+        self.assertEqual((breaker.allow(), breaker.state), (True, CircuitBreaker.HALF_OPEN))
+        self.assertFalse(breaker.allow())
+        breaker.recordSuccess()
+        self.assertEqual((breaker.state, breaker.allow()), (CircuitBreaker.CLOSED, True))
+
+    def testHedging(self):
+        replica = FakeEndpoint()
+        replica.start()
+        try:
+            for pooled in (False, True):
+                sparql = SPARQLWrapper([self.endpoint.url, replica.url], returnFormat=JSON)
+                if pooled:
+                    sparql.setUseConnectionPool()
+                sparql.setHedging(50)
+                # the first replica is chosen, and hedged after 0.2 seconds
+                self.__warmUp(sparql, 0.2, 0.3)
+                self.endpoint.latency = 2.0
+                sparql.setQuery(askQuery)
+                start = time.time()
+                self.assertEqual(sparql.query().convert()["boolean"], True)
+                self.assertTrue(0.2 <= time.time() - start < 1.0)
+                self.assertEqual(len(self.endpoint.requests), 1)
+                self.assertEqual(len(replica.requests), 1)
+                # the loser is aborted, not waited for
+                statistics = sparql._loadBalancer.statistics(self.endpoint.url)
+                while statistics.outstanding and time.time() - start < 1.0:
+                    time.sleep(0.01)
+                self.assertEqual(statistics.outstanding, 0)
+                sparql.close()
+                self.endpoint.requests = []
+                replica.requests = []
+        finally:
+            replica.stop()
+
+    def testHedgedTrialRequest(self):
+        replica = FakeEndpoint()
+        replica.start()
+        try:
+            sparql = SPARQLWrapper([self.endpoint.url, replica.url], returnFormat=JSON)
+            sparql.setHedging(50)
+            sparql.setCircuitBreaker(1, 0.1)
+            self.__warmUp(sparql, 0.2, 0.3)
+            statistics = sparql._loadBalancer.statistics(self.endpoint.url)
+            statistics.failures = 2
+            # the trial request of a half open circuit loses the hedge
+            breaker = sparql._getCircuitBreaker(self.endpoint.url)
+            breaker.recordFailure()
+            self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+            time.sleep(0.15)
+            self.endpoint.latency = 2.0
+            sparql.setQuery(askQuery)
+            start = time.time()
+            self.assertEqual(sparql.query().convert()["boolean"], True)
+            self.assertEqual(len(replica.requests), 1)
+            while statistics.outstanding and time.time() - start < 1.0:
+                time.sleep(0.01)
+            self.assertEqual(statistics.outstanding, 0)
+            # undecided: the next request is the trial, and the statistics of the endpoint are unchanged
+            self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+            self.assertTrue(breaker.allow())
+            self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+            self.assertEqual(statistics.failures, 2)
+            self.assertAlmostEqual(statistics.latency, 0.2)
+        finally:
+            replica.stop()
+
+    def testHedgedUpdate(self):
+        replica = FakeEndpoint()
+        replica.start()
+        try:
+            sparql = SPARQLWrapper([self.endpoint.url, replica.url], returnFormat=JSON)
+            sparql.setHedging(50)
+            self.__warmUp(sparql, 0.01, 0.01)
+            self.endpoint.latency = 0.3
+            sparql.setQuery("INSERT DATA { <http://example.org/s> <http://example.org/p> 1 }")
+            sparql.setMethod(POST)
+            sparql.query().response.read()
+            self.assertEqual([request.method for request in self.endpoint.requests], ["POST"])
+            self.assertEqual(replica.requests, [])
+        finally:
+            replica.stop()
+
+    def __warmUp(self, sparql, *latencies):
+        """Feed the load balancer of an instance with a latency per replica, so that hedging can kick in."""
+        balancer = sparql._loadBalancer
+        for uri, latency in zip(balancer.endpoints, latencies):
+            for i in range(10):
+                balancer.begin(uri)
+                balancer.end(uri, latency)
+
+    def testTimeout(self):
+        self.endpoint.latency = 1.0
+        sparql = self.__sparql(askQuery, JSON)
+        sparql.setTimeout(0.2, "timeout", 1000)
+        self.assertRaises(QueryTimeout, sparql.query)
+        self.assertEqual(self.endpoint.requests[-1].parameters["timeout"], ["200"])
+        # a stalled endpoint hits the read timeout
+        sparql = self.__sparql(askQuery, JSON)
+        sparql.setSocketTimeouts(readTimeout=0.2)
+        start = time.time()
+        self.assertRaises(socket.timeout, sparql.query)
+        self.assertTrue(time.time() - start < 0.8)
+        # a response trickling slowly does not, but the deadline is checked while it is converted
+        self.endpoint.latency = 0.0
+        self.endpoint.chunked = True
+        self.endpoint.trickle = 0.1
+        self.endpoint.rows = 100
+        sparql = self.__sparql(selectQuery, JSON)
+        sparql.setSocketTimeouts(readTimeout=0.3)
+        sparql.setTimeout(0.5)
+        result = sparql.query()
+        start = time.time()
+        self.assertRaises(QueryTimeout, result.convert)
+        self.assertTrue(time.time() - start < 0.8)
+        # let the endpoint finish the responses nobody reads any longer
+        self.endpoint.trickle = 0.0
+        while self.endpoint._connections and time.time() - start < 2.0:
+            time.sleep(0.01)
+
+    def testInProcessTransport(self):
+        sparql = SPARQLWrapper("http://example.org/sparql", returnFormat=JSON)
+        sparql.setTransport(self.endpoint.transport())
+        sparql.setQuery(selectQuery)
+        self.assertEqual(len(sparql.query().convert()["results"]["bindings"]), 5)
+        self.endpoint.addResponse("BROKEN", "syntax error", "text/plain", 400)
+        sparql.setQuery("SELECT BROKEN")
+        self.assertRaises(QueryBadFormed, sparql.query)
+
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def testAsyncWrapper(self):
+        loop = asyncio.new_event_loop()
+        sparql = AsyncSPARQLWrapper(self.endpoint.url, returnFormat=JSON, loop=loop)
+        try:
+            # GET, then POST, through a single persistent connection
+            sparql.setQuery(selectQuery)
+            self.assertEqual(len(loop.run_until_complete(sparql.queryAndConvert())["results"]["bindings"]), 5)
+            sparql.setMethod(POST)
+            self.assertEqual(len(loop.run_until_complete(sparql.queryAndConvert())["results"]["bindings"]), 5)
+            self.assertEqual([request.method for request in self.endpoint.requests], ["GET", "POST"])
+            self.assertEqual(self.endpoint.connections, 1)
+            # a chunked body, of several chunks
+            self.endpoint.chunked = True
+            self.endpoint.rows = 100
+            sparql.setQuery(selectQuery)
+            self.assertEqual(len(loop.run_until_complete(sparql.queryAndConvert())["results"]["bindings"]), 100)
+            self.assertEqual(self.endpoint.connections, 1)
+            # errors
+            self.endpoint.addResponse("BROKEN", "syntax error", "text/plain", 400)
+            self.endpoint.addResponse("MISSING", "no such endpoint", "text/plain", 404)
+            sparql.setQuery("SELECT BROKEN")
+            self.assertRaises(QueryBadFormed, loop.run_until_complete, sparql.query())
+            sparql.setQuery("SELECT MISSING")
+            self.assertRaises(EndPointNotFound, loop.run_until_complete, sparql.query())
+            # concurrent queries
+            self.endpoint.latency = 0.2
+            sparql.setQuery(selectQuery)
+            start = time.time()
+            results = loop.run_until_complete(asyncio.gather(*[sparql.queryAndConvert() for i in range(10)]))
+            self.assertTrue(time.time() - start < 1.0)
+            self.assertEqual([len(result["results"]["bindings"]) for result in results], [100] * 10)
+            # the idle connections are bounded in number and in time
+            sparql.setUseConnectionPool(maxConnections=3, idleTimeout=0.3)
+            self.endpoint.latency = 0.0
+            connections = self.endpoint.connections
+            loop.run_until_complete(asyncio.gather(*[sparql.queryAndConvert() for i in range(10)]))
+            self.assertEqual(self.endpoint.connections, connections + 10)
+            self.assertEqual([len(transports) for transports in sparql._idle.values()], [3])
+            loop.run_until_complete(asyncio.sleep(0.4))
+            loop.run_until_complete(sparql.queryAndConvert())
+            self.assertEqual(self.endpoint.connections, connections + 11)
+            self.assertEqual([len(transports) for transports in sparql._idle.values()], [1])
+        finally:
+            sparql.close()
+            # let the closed connections go
+            loop.run_until_complete(asyncio.sleep(0.01))
+            loop.close()
+
+
+if __name__ == "__main__":
+    unittest.main()